@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmark for the queue of the elastic scheduler with the SIZE policy.
+
+Compares the sorted Python list used before with ExecutionQueue on the operations done by the scheduler: a pass (size
+refresh, pop of all executions, re-queue of those that did not start), terminations of queued executions and the
+stats() dump of the queue.
+Run from the root of the repository: python3 scripts/bench_scheduler_queue.py [executions]
+"""
+
+import importlib.util
+import os
+import random
+import sys
+import time
+
+
+def _load_execution_queue():
+    """Load the queue module by path, importing zoe_master.scheduler would need a Docker back-end."""
+    path = os.path.join(os.path.dirname(__file__), '..', 'zoe_master', 'scheduler', 'execution_queue.py')
+    spec = importlib.util.spec_from_file_location('execution_queue', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ExecutionQueue
+
+
+class FakeExecution:
+    """Just what the queue needs."""
+    def __init__(self, execution_id, size):
+        self.id = execution_id
+        self.size = size
+
+
+def new_size(execution):
+    """Simulate the progress-based size refresh."""
+    return execution.size * 0.99
+
+
+def bench_list(executions, terminations):
+    """The list-based queue, returns the time of a pass, of the terminations and of a stats dump in ms."""
+    queue = list(executions)
+
+    time_start = time.perf_counter()
+    for execution in queue:
+        execution.size = new_size(execution)
+    queue.sort(key=lambda e: e.size)
+    popped = []
+    while len(queue) > 0:
+        popped.append(queue.pop(0))
+    queue = popped + queue
+    pass_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    for execution in terminations:
+        queue.remove(execution)
+    remove_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    [e.id for e in sorted(queue, key=lambda e: e.size)]  # pylint: disable=expression-not-assigned
+    stats_time = time.perf_counter() - time_start
+    return pass_time * 1000, remove_time * 1000, stats_time * 1000
+
+
+def bench_heap(execution_queue_class, executions, terminations):
+    """The heap-based queue, returns the time of a pass, of the terminations and of a stats dump in ms."""
+    queue = execution_queue_class('SIZE')
+    for execution in executions:
+        queue.push(execution)
+
+    time_start = time.perf_counter()
+    queue.refresh(new_size)
+    popped = queue.pop_all()
+    queue.push_front_all(popped)
+    pass_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    for execution in terminations:
+        queue.remove(execution)
+    remove_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    [e.id for e in queue.ordered()]  # pylint: disable=expression-not-assigned
+    stats_time = time.perf_counter() - time_start
+    return pass_time * 1000, remove_time * 1000, stats_time * 1000
+
+
+def main():
+    """Benchmark entrypoint."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    random.seed(1)
+    execution_queue_class = _load_execution_queue()
+    executions = [FakeExecution(execution_id, random.randint(1, 10000)) for execution_id in range(count)]
+    terminations = random.sample(executions, count // 10)
+
+    print('{} queued executions, {} terminations'.format(count, len(terminations)))
+    print('{:<8} {:>10} {:>18} {:>10}'.format('queue', 'pass ms', 'terminations ms', 'stats ms'))
+    print('{:<8} {:>10.2f} {:>18.2f} {:>10.2f}'.format('list', *bench_list(executions, terminations)))
+    print('{:<8} {:>10.2f} {:>18.2f} {:>10.2f}'.format('heap', *bench_heap(execution_queue_class, executions, terminations)))
+
+
+if __name__ == '__main__':
+    main()
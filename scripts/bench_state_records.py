@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmark for the construction of state records from DB rows.
+
+Measures the time and the memory needed to build Execution, Service and Port objects, as done for each row returned by a
+select. The JSON descriptions are shared by all rows, so that only the cost of the record objects is measured.
+Run from the root of the repository: python3 scripts/bench_state_records.py [rows]
+"""
+
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zoe_lib.state.execution import Execution  # pylint: disable=wrong-import-position
+from zoe_lib.state.port import Port  # pylint: disable=wrong-import-position
+from zoe_lib.state.service import Service  # pylint: disable=wrong-import-position
+
+SERVICE_DESCRIPTION = {
+    'image': 'zapps/jupyter:latest',
+    'monitor': True,
+    'startup_order': 0,
+    'environment': [['NB_USER', 'zoe']],
+    'command': None,
+    'resources': {'memory': {'min': 4294967296, 'max': 4294967296}, 'cores': {'min': 2, 'max': 2}},
+    'volumes': [{'name': 'workspace', 'path': '/mnt/workspace', 'read_only': False}],
+    'ports': [{'name': 'Notebook', 'port_number': 8888, 'protocol': 'tcp', 'url_template': 'http://{ip_port}/'}],
+    'labels': ['notebook'],
+    'work_dir': '/mnt/workspace'
+}
+
+EXECUTION_DESCRIPTION = {'name': 'notebook', 'size': 512, 'services': [SERVICE_DESCRIPTION]}
+
+
+def service_row(row_id):
+    """A row of the service table."""
+    return {
+        'id': row_id, 'name': 'jupyter', 'status': 'active', 'error_message': None, 'execution_id': row_id,
+        'description': SERVICE_DESCRIPTION, 'service_group': 'jupyter', 'backend_id': 'container-{}'.format(row_id),
+        'backend_status': 'started', 'backend_host': 'node1', 'restart_count': 0, 'ip_address': '10.0.0.1/32', 'essential': True
+    }
+
+
+def execution_row(row_id):
+    """A row of the execution table."""
+    return {
+        'id': row_id, 'name': 'notebook', 'user_id': 'user', 'description': EXECUTION_DESCRIPTION, 'status': 'running',
+        'execution_manager_id': None, 'time_submit': datetime.datetime.utcnow(), 'time_start': None, 'time_end': None,
+        'error_message': None
+    }
+
+
+def port_row(row_id):
+    """A row of the port table."""
+    return {
+        'id': row_id, 'service_id': row_id, 'internal_name': '8888/tcp', 'external_ip': None, 'external_port': None,
+        'description': SERVICE_DESCRIPTION['ports'][0]
+    }
+
+
+def bench(record_class, make_row, rows):
+    """Build rows records, returns the time per record in microseconds and the memory per record in bytes."""
+    data = [make_row(row_id) for row_id in range(rows)]
+
+    time_start = time.perf_counter()
+    records = [record_class(row, None) for row in data]
+    elapsed = time.perf_counter() - time_start
+    del records
+
+    tracemalloc.start()  # tracing slows down allocations, so memory is measured on a separate run
+    records = [record_class(row, None) for row in data]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(records) == rows
+    return elapsed / rows * 1e6, memory / rows
+
+
+def main():
+    """Benchmark entrypoint."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('{:<10} {:>12} {:>14}'.format('record', 'us/record', 'bytes/record'))
+    for record_class, make_row in [(Execution, execution_row), (Service, service_row), (Port, port_row)]:
+        per_record_time, per_record_memory = bench(record_class, make_row, rows)
+        print('{:<10} {:>12.2f} {:>14.0f}'.format(record_class.__name__, per_record_time, per_record_memory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Replay a workload trace against the elastic scheduler on a simulated cluster, without a container back-end or a database.
+
+Run from the root of the repository: python3 scripts/replay_trace.py contrib/traces/sample-trace.jsonl
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zoe_master.simulator.replay import main  # pylint: disable=wrong-import-position
+
+if __name__ == '__main__':
+    sys.exit(main())
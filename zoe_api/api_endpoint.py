@@ -42,8 +42,8 @@ class APIEndpoint:
         self.sql = sql_manager
 
     def execution_by_id(self, uid, role, execution_id) -> zoe_lib.state.Execution:
-        """Lookup an execution by its ID."""
-        e = self.sql.executions.select(id=execution_id, only_one=True)
+        """Lookup an execution by its ID, its services and ports are loaded too."""
+        e = self.sql.executions.select_tree(execution_id)
         if e is None:
             raise zoe_api.exceptions.ZoeNotFoundException('No such execution')
         assert isinstance(e, zoe_lib.state.Execution)
@@ -51,11 +51,27 @@ class APIEndpoint:
             raise zoe_api.exceptions.ZoeAuthException()
         return e
 
+    @staticmethod
+    def _restrict_to_owner(uid, role, filters):
+        """Non-admin users can see only their own executions and services, returns False if the filters cannot match anything."""
+        if role == 'admin':
+            return True
+        if filters.get('user_id', uid) != uid:
+            return False
+        filters['user_id'] = uid
+        return True
+
     def execution_list(self, uid, role, **filters):
         """Generate a optionally filtered list of executions."""
-        execs = self.sql.executions.select(**filters)
-        ret = [e for e in execs if e.user_id == uid or role == 'admin']
-        return ret
+        if not self._restrict_to_owner(uid, role, filters):
+            return []
+        return self.sql.executions.select(**filters)
+
+    def execution_list_chunks(self, uid, role, chunk_size, **filters):
+        """Generator returning the optionally filtered list of executions in chunks, using keyset pagination."""
+        if not self._restrict_to_owner(uid, role, filters):
+            return
+        yield from self.sql.executions.select_chunks(chunk_size, **filters)
 
     def zapp_validate(self, application_description):
         """Validates the passed ZApp description against the supported schema."""
@@ -137,9 +153,9 @@ class APIEndpoint:
 
     def service_list(self, uid, role, **filters):
         """Generate a optionally filtered list of services."""
-        services = self.sql.services.select(**filters)
-        ret = [s for s in services if s.user_id == uid or role == 'admin']
-        return ret
+        if not self._restrict_to_owner(uid, role, filters):
+            return []
+        return self.sql.services.select(**filters)
 
     def service_logs(self, uid, role, service_id):
         """Retrieve the logs for the given service.
@@ -170,13 +186,16 @@ class APIEndpoint:
 
     def execution_endpoints(self, uid: str, role: str, execution: zoe_lib.state.Execution):
         """Return a list of the services and public endpoints available for a certain execution."""
-        services_info = []
+        if execution.user_id != uid and role != 'admin':
+            raise zoe_api.exceptions.ZoeAuthException()
+
+        services_info = execution.services
         endpoints = []
-        for service in execution.services:
-            services_info.append(self.service_by_id(uid, role, service.id))
+        for service in services_info:
+            backend_ports = dict((port.internal_name, port) for port in service.ports)
             for port in service.description['ports']:
                 port_key = str(port['port_number']) + "/" + port['protocol']
-                backend_port = self.sql.ports.select(only_one=True, service_id=service.id, internal_name=port_key)
+                backend_port = backend_ports.get(port_key)
                 if backend_port is not None and backend_port.external_ip is not None:
                     endpoint = port['url_template'].format(**{"ip_port": backend_port.external_ip + ":" + str(backend_port.external_port)})
                     endpoints.append((port['name'], endpoint))
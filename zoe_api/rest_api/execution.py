@@ -22,6 +22,8 @@ from zoe_api.rest_api.utils import catch_exceptions, get_auth, manage_cors_heade
 import zoe_api.exceptions
 from zoe_api.api_endpoint import APIEndpoint  # pylint: disable=unused-import
 
+LIST_CHUNK_SIZE = 100  # executions loaded from the database and serialized at a time
+
 
 class ExecutionAPI(RequestHandler):
     """The Execution API endpoint."""
@@ -133,6 +135,8 @@ class ExecutionCollectionAPI(RequestHandler):
         * name: execution mane
         * user_id: user_id owning the execution (admin only)
         * limit: limit the number of returned entries
+        * after_id: return only the executions that come after this ID, to fetch the next page pass the last ID received
+        * order: asc or desc (default), executions are sorted by ID
         * earlier_than_submit: all execution that where submitted earlier than this timestamp
         * earlier_than_start: all execution that started earlier than this timestamp
         * earlier_than_end: all execution that ended earlier than this timestamp
@@ -155,6 +159,8 @@ class ExecutionCollectionAPI(RequestHandler):
             ('name', str),
             ('user_id', str),
             ('limit', int),
+            ('after_id', int),
+            ('order', str),
             ('earlier_than_submit', int),
             ('earlier_than_start', int),
             ('earlier_than_end', int),
@@ -169,9 +175,16 @@ class ExecutionCollectionAPI(RequestHandler):
                 else:
                     filt_dict[filt[0]] = filt[1](self.request.arguments[filt[0]][0])
 
-        execs = self.api_endpoint.execution_list(uid, role, **filt_dict)
+        if filt_dict.get('order', 'desc') not in ('asc', 'desc'):
+            raise zoe_api.exceptions.ZoeRestAPIException('Invalid order, use asc or desc')
 
-        self.write(dict([(e.id, e.serialize()) for e in execs]))
+        # Executions are loaded and serialized in chunks, so that only one chunk of records is in memory at the same time.
+        # The response is written once all the queries have succeeded, an error never leaves a truncated JSON document.
+        serialized = []
+        for chunk in self.api_endpoint.execution_list_chunks(uid, role, LIST_CHUNK_SIZE, **filt_dict):
+            serialized += ['"{}": {}'.format(e.id, tornado.escape.json_encode(e.serialize())) for e in chunk]
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.write('{' + ', '.join(serialized) + '}')
 
     @catch_exceptions
     def post(self):
@@ -20,6 +20,7 @@ import pytest
 from zoe_api.api_endpoint import APIEndpoint
 from zoe_api.exceptions import ZoeException
 from zoe_api.tests.mock_master_api import MockAPIManager
+from zoe_lib.state.execution import ExecutionTable
 from zoe_lib.state.tests.mock_sql_manager import MockSQLManager
 
 
@@ -47,3 +48,19 @@ class TestAPIEndpoint:
         else:
             ret = api.statistics_scheduler('nouser', 'norole')
             assert isinstance(ret, dict)
+
+    def test_execution_list_chunks(self, master_api, sql_manager, monkeypatch):
+        """Pagination filters are passed to the chunked selection, non-admin users see only their own executions."""
+        calls = []
+
+        def select_chunks(table, chunk_size, **filters):  # pylint: disable=unused-argument
+            calls.append(dict(filters, chunk_size=chunk_size))
+            yield ['chunk']
+
+        monkeypatch.setattr(ExecutionTable, 'select_chunks', select_chunks)
+        api = APIEndpoint(master_api, sql_manager)
+        assert list(api.execution_list_chunks('user', 'user', 10, after_id=42, order='asc')) == [['chunk']]
+        assert calls == [{'chunk_size': 10, 'after_id': 42, 'order': 'asc', 'user_id': 'user'}]
+        assert len(list(api.execution_list_chunks('user', 'user', 10, user_id='other'))) == 0
+        assert list(api.execution_list_chunks('admin', 'admin', 10, user_id='other')) == [['chunk']]
+        assert calls[-1] == {'chunk_size': 10, 'user_id': 'other'}
@@ -129,8 +129,6 @@ class ExecutionInspectWeb(ZoeRequestHandler):
 
         services_info, endpoints = self.api_endpoint.execution_endpoints(uid, role, e)
 
-        endpoints = self.api_endpoint.execution_endpoints(uid, role, e)[1]
-
         template_vars = {
             "uid": uid,
             "role": role,
@@ -33,6 +33,10 @@ _CONFIG_PATHS = [
 
 _CONF = None
 
+# threads of the master that hold a DB connection for their whole life, besides the dispatch workers: the main thread, the
+# scheduler loop, the resource limit updater and at least one back-end synchronizer
+DBPOOL_LONG_LIVED_THREADS = 4
+
 
 def get_conf() -> Namespace:
     """Returns the conf singleton."""
@@ -58,6 +62,8 @@ def load_configuration(test_conf=None):
         argparser.add_argument('--dbpass', help='DB password', default='')
         argparser.add_argument('--dbhost', help='DB hostname', default='localhost')
         argparser.add_argument('--dbport', type=int, help='DB port', default=5432)
+        argparser.add_argument('--dbpool-min', type=int, help='Number of DB connections kept open by the connection pool', default=1)
+        argparser.add_argument('--dbpool-max', type=int, help='Maximum number of DB connections, one per thread, set to 0 to share a single connection. Must be at least scheduler-dispatch-workers + {}, plus one for each additional Docker Engine host'.format(DBPOOL_LONG_LIVED_THREADS), default=0)
 
         # Master options
         argparser.add_argument('--api-listen-uri', help='ZMQ API listen address', default='tcp://*:4850')
@@ -99,9 +105,16 @@ def load_configuration(test_conf=None):
 
         # Scheduler
         argparser.add_argument('--scheduler-class', help='Scheduler class to use for scheduling ZApps', choices=['ZoeSimpleScheduler', 'ZoeElasticScheduler'], default='ZoeElasticScheduler')
-        argparser.add_argument('--scheduler-policy', help='Scheduler policy to use for scheduling ZApps', choices=['FIFO', 'SIZE'], default='FIFO')
+        argparser.add_argument('--scheduler-policy', help='Scheduler policy to use for scheduling ZApps', choices=['FIFO', 'SIZE', 'BACKFILL', 'FAIRSHARE'], default='FIFO')
+        argparser.add_argument('--placement-strategy', help='How the elastic scheduler chooses the node for each service', choices=['spread', 'best-fit', 'worst-fit', 'first-fit-decreasing', 'dot-product'], default='spread')
+        argparser.add_argument('--scheduler-preemption', action='store_true', help='Let executions that do not fit take the place of elastic services of running executions with a lower priority')
+        argparser.add_argument('--scheduler-preemption-budget', help='Maximum number of elastic services preempted in one scheduler pass', type=int, default=8)
+        argparser.add_argument('--scheduler-fairshare-half-life', help='Time in seconds after which past usage counts half, with the FAIRSHARE policy', type=int, default=86400)
+        argparser.add_argument('--scheduler-fairshare-weights', help='Weights of the users with the FAIRSHARE policy, users not listed have weight 1 (ex: alice:2,bob:0.5)', default='')
+        argparser.add_argument('--scheduler-dispatch-workers', help='Maximum number of executions whose services are started in parallel by the elastic scheduler', type=int, default=4)
 
         argparser.add_argument('--backend', choices=['Swarm', 'Kubernetes', 'DockerEngine'], default='DockerEngine', help='Which backend to enable')
+        argparser.add_argument('--service-startup-workers', help='Maximum number of services of the same execution and startup order that are spawned in parallel', type=int, default=8)
 
         # Docker Swarm backend options
         argparser.add_argument('--backend-swarm-url', help='Swarm/Docker API endpoint (ex.: zk://zk1:2181,zk2:2181 or http://swarm:2380)', default='http://localhost:2375')
@@ -141,6 +154,23 @@ def load_configuration(test_conf=None):
         else:
             opts.additional_volumes = []
 
+        weights = {}
+        if len(opts.scheduler_fairshare_weights) > 0:
+            for user_weight in str(opts.scheduler_fairshare_weights).split(','):
+                try:
+                    user, weight = user_weight.rsplit(':', 1)
+                    weights[user] = float(weight)
+                except ValueError:
+                    argparser.error('scheduler-fairshare-weights: invalid entry "{}", expected user:weight'.format(user_weight))  # pylint: disable=not-callable
+                if weights[user] <= 0:
+                    argparser.error('scheduler-fairshare-weights: the weight of user {} must be positive'.format(user))  # pylint: disable=not-callable
+        opts.scheduler_fairshare_weights = weights
+
+        # long-lived threads keep their connection, with a smaller pool the other threads would time out waiting for one
+        dbpool_needed = opts.scheduler_dispatch_workers + DBPOOL_LONG_LIVED_THREADS
+        if 0 < opts.dbpool_max < dbpool_needed:
+            argparser.error('dbpool-max: at least {} connections are needed with {} dispatch workers'.format(dbpool_needed, opts.scheduler_dispatch_workers))  # pylint: disable=not-callable
+
         _CONF = opts
     else:
         _CONF = test_conf
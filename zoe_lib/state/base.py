@@ -19,11 +19,15 @@ import logging
 
 log = logging.getLogger(__name__)
 
+CACHE_MISS = object()
+
 
 class BaseRecord:
     """
     :type sql_manager: SQLManager
     """
+    __slots__ = ('sql_manager', 'id')
+
     def __init__(self, d, sql_manager):
         """
         :type sql_manager: SQLManager
@@ -35,9 +39,17 @@ class BaseRecord:
         """Generates a dictionary that can be serialized in JSON."""
         raise NotImplementedError
 
+    def apply_update(self, fields):
+        """Copy the column values written by an UPDATE into this object, used by the state cache."""
+        for key, value in fields.items():
+            setattr(self, key, value)
+
 
 class BaseTable:
     """Common abstraction for all tables."""
+    record_class = BaseRecord
+    parent_key = None  # column referencing the parent record, if any
+
     def __init__(self, sql_manager, table_name):
         self.table_name = table_name
         self.sql_manager = sql_manager
@@ -56,12 +68,24 @@ class BaseTable:
         query = "DELETE FROM {} WHERE id = %s".format(self.table_name)
         self.cursor.execute(query, (record_id,))
         self.sql_manager.commit()
+        self.sql_manager.cache.remove(self.table_name, record_id)
+
+    def evict(self, record_id):
+        """Drop a record from the state cache, to be used when the row has been deleted by another process."""
+        self.sql_manager.cache.remove(self.table_name, record_id)
 
     def update(self, record_id, **kwargs):
-        """Update the state of an execution."""
+        """Update the state of a record. Inside a transaction the update is queued and merged with other updates to the same row."""
+        if not self.sql_manager.defer_update(self.table_name, record_id, kwargs):
+            self.execute_update(record_id, kwargs)
+            self.sql_manager.commit()
+        self.sql_manager.cache.update(self.table_name, record_id, kwargs)
+
+    def execute_update(self, record_id, fields):
+        """Run the UPDATE query, without committing."""
         arg_list = []
         value_list = []
-        for key, value in kwargs.items():
+        for key, value in fields.items():
             arg_list.append('{} = %s'.format(key))
             value_list.append(value)
         set_q = ", ".join(arg_list)
@@ -69,8 +93,117 @@ class BaseTable:
         q_base = 'UPDATE {} SET '.format(self.table_name) + set_q + ' WHERE id=%s'
         query = self.cursor.mogrify(q_base, value_list)
         self.cursor.execute(query)
-        self.sql_manager.commit()
 
     def select(self, only_one=False, limit=-1, **kwargs):
         """Select records."""
         raise NotImplementedError
+
+    def select_by_parents(self, parent_ids):
+        """Return all the records belonging to any of the given parent records, with a single query."""
+        compiled = self.sql_manager.compile_query((self.table_name, 'parents'), lambda: 'SELECT * FROM {} WHERE {} = ANY($1) ORDER BY id'.format(self.table_name, self.parent_key))
+        return self._fetch_records(compiled, [list(parent_ids)], False, -1, {})
+
+    def _filter_sql(self, key, placeholder):
+        """The SQL condition for a select filter, tables that support special filters override this."""
+        if key.startswith('not_'):
+            return '{}.{} != {}'.format(self.table_name, key[4:], placeholder)
+        return '{}.{} = {}'.format(self.table_name, key, placeholder)
+
+    def _from_sql(self, keys):  # pylint: disable=unused-argument
+        """The FROM clause of a select filtering on keys."""
+        return self.table_name
+
+    def _compile_select(self, keys, paged, order, limited):
+        """Generate the SQL of a select, the parameters are the filter values in keys order, then after_id and limit."""
+        filters = [self._filter_sql(key, '${}'.format(idx + 1)) for idx, key in enumerate(keys)]
+        param_count = len(keys)
+        if paged:
+            param_count += 1
+            filters.append('{}.id {} ${}'.format(self.table_name, '<' if order == 'desc' else '>', param_count))
+        sql = 'SELECT {}.* FROM {}'.format(self.table_name, self._from_sql(keys))
+        if len(filters) > 0:
+            sql += ' WHERE ' + ' AND '.join(filters)
+        if order is not None:
+            sql += ' ORDER BY {}.id {}'.format(self.table_name, order.upper())
+        if limited:
+            sql += ' LIMIT ${}'.format(param_count + 1)
+        return sql
+
+    def _select_compiled(self, only_one, limit, kwargs, after_id=None, order=None):
+        """Run a select through the compiled query cache, the SQL is generated only once for each combination of filters."""
+        if order is None and limit > 0:
+            order = 'desc'
+        keys = tuple(sorted(kwargs.keys()))
+        shape = (self.table_name, keys, after_id is not None, order, limit > 0)
+        compiled = self.sql_manager.compile_query(shape, lambda: self._compile_select(keys, after_id is not None, order, limit > 0))
+        args = [kwargs[key] for key in keys]
+        if after_id is not None:
+            args.append(after_id)
+        if limit > 0:
+            args.append(limit)
+        return self._fetch_records(compiled, args, only_one, limit, kwargs)
+
+    def _to_record(self, row):
+        """Build a record object from a DB row, going through the identity map."""
+        record = self.sql_manager.cache.peek(self.table_name, row['id'])
+        if record is None:
+            record = self.record_class(row, self.sql_manager)
+        parent_id = row[self.parent_key] if self.parent_key is not None else None
+        return self.sql_manager.cache.add(self.table_name, record, parent_id)
+
+    def _select_cached(self, only_one, limit, kwargs):
+        """Try to answer a select using only the state cache, returns CACHE_MISS if the DB has to be queried."""
+        cache = self.sql_manager.cache
+        if not cache.enabled or limit > 0 or len(kwargs) == 0:
+            return CACHE_MISS
+
+        if list(kwargs.keys()) == ['id']:
+            record = cache.get(self.table_name, kwargs['id'])
+            records = None if record is None else [record]
+        elif self.parent_key is not None and self.parent_key in kwargs:
+            records = self._filter_cached_children(kwargs)
+        else:
+            records = None
+
+        if records is None:
+            return CACHE_MISS
+        elif only_one:
+            return records[0] if len(records) > 0 else None
+        else:
+            return records
+
+    def _filter_cached_children(self, kwargs):
+        """Filter the cached children of a parent record, returns None if they are not in the cache."""
+        records = self.sql_manager.cache.children(self.table_name, kwargs[self.parent_key])
+        if records is None:
+            return None
+        try:
+            for key, value in kwargs.items():
+                if key.startswith('not_'):
+                    records = [r for r in records if getattr(r, key[4:]) != value]
+                else:
+                    records = [r for r in records if getattr(r, key) == value]
+        except AttributeError:
+            return None
+        return records
+
+    def _fetch_records(self, compiled, args, only_one, limit, kwargs):
+        """Run a compiled select query and convert the returned rows into records."""
+        self.sql_manager.flush()  # the query must see the updates queued by an open transaction
+        self.sql_manager.execute_compiled(self.cursor, compiled, args)
+        if only_one:
+            row = self.cursor.fetchone()
+            if row is None:
+                return None
+            return self._to_record(row)
+
+        records = [self._to_record(row) for row in self.cursor]
+        if limit <= 0 and self.parent_key is not None and list(kwargs.keys()) == [self.parent_key]:
+            records = self.sql_manager.cache.set_children(self.table_name, kwargs[self.parent_key], records)
+        return records
+
+    def _cache_inserted(self, row):
+        """Add a row returned by INSERT ... RETURNING * to the state cache."""
+        if self.sql_manager.cache.enabled:
+            self._to_record(row)
+        return row['id']
@@ -0,0 +1,169 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Identity map for the records loaded from the database."""
+
+import logging
+import threading
+
+from zoe_lib.state.execution import Execution
+
+log = logging.getLogger(__name__)
+
+# child table -> parent table, used to cascade deletes like the ON DELETE CASCADE constraints do in the DB
+_CASCADE = {
+    'service': 'execution',
+    'port': 'service'
+}
+
+# table -> statuses after which a record is not used by the master anymore, it is evicted together with its children
+_TERMINAL = {
+    'execution': (Execution.TERMINATED_STATUS, Execution.ERROR_STATUS)
+}
+
+
+class StateCache:
+    """
+    Write-through identity map for Execution, Service and Port records.
+
+    The same record ID always maps to the same Python object. The tables keep the cached objects up to date on update, insert
+    and delete. The cache is safe only if this process is the only one modifying the rows it holds, this is true for the
+    Zoe master, but not for the API processes.
+
+    To keep the cache bounded by the number of active executions, an execution is evicted with its services and ports when
+    it reaches a terminal status, executions loaded in a terminal status are not cached and children are cached only while
+    their parent is.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._records = {}  # table name -> {record id -> record}
+        self._children = {}  # table name -> {parent id -> set of record ids}, only for fully loaded parents
+        self._parents = {}  # table name -> {record id -> parent id}
+
+    def get(self, table, record_id):
+        """Return the cached record, or None if it has never been loaded."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            record = self._records.get(table, {}).get(record_id)
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return record
+
+    def add(self, table, record, parent_id=None):
+        """Store a record, returns the canonical object for its ID, that may be a different instance loaded earlier."""
+        if not self.enabled or self._is_terminal(table, record):
+            return record
+        with self._lock:
+            if not self._has_parent(table, parent_id):
+                return record
+            record = self._records.setdefault(table, {}).setdefault(record.id, record)
+            if parent_id is not None:
+                self._parents.setdefault(table, {})[record.id] = parent_id
+                children = self._children.get(table, {}).get(parent_id)
+                if children is not None:
+                    children.add(record.id)
+            return record
+
+    def peek(self, table, record_id):
+        """Like get(), but does not count as a cache access."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            return self._records.get(table, {}).get(record_id)
+
+    def children(self, table, parent_id):
+        """Return the list of all records belonging to parent_id, or None if they have not been loaded yet."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            children = self._children.get(table, {}).get(parent_id)
+            if children is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            records = self._records[table]
+            return [records[record_id] for record_id in sorted(children)]
+
+    def set_children(self, table, parent_id, records):
+        """Record the complete list of children of parent_id, as loaded from the database."""
+        if not self.enabled:
+            return records
+        with self._lock:
+            if not self._has_parent(table, parent_id):
+                return records
+            canonical = [self.add(table, record, parent_id) for record in records]
+            self._children.setdefault(table, {})[parent_id] = set(record.id for record in canonical)
+            return canonical
+
+    def update(self, table, record_id, fields):
+        """Apply a write to the cached record, if there is one."""
+        if not self.enabled:
+            return
+        with self._lock:
+            record = self._records.get(table, {}).get(record_id)
+            if record is not None:
+                record.apply_update(fields)
+                if self._is_terminal(table, record):
+                    self.remove(table, record_id)
+
+    def remove(self, table, record_id):
+        """Forget a record and, recursively, all the records that depend on it."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._records.get(table, {}).pop(record_id, None)
+            parent_id = self._parents.get(table, {}).pop(record_id, None)
+            if parent_id is not None:
+                siblings = self._children.get(table, {}).get(parent_id)
+                if siblings is not None:
+                    siblings.discard(record_id)
+            for child_table, parent_table in _CASCADE.items():
+                if parent_table != table:
+                    continue
+                self._children.get(child_table, {}).pop(record_id, None)
+                orphans = [child_id for child_id, child_parent in self._parents.get(child_table, {}).items() if child_parent == record_id]
+                for child_id in orphans:
+                    self.remove(child_table, child_id)
+
+    @staticmethod
+    def _is_terminal(table, record):
+        return table in _TERMINAL and getattr(record, 'status', None) in _TERMINAL[table]
+
+    def _has_parent(self, table, parent_id):
+        """Children of a parent that is not cached (anymore) are not cached, otherwise nothing would evict them."""
+        return parent_id is None or table not in _CASCADE or parent_id in self._records.get(_CASCADE[table], {})
+
+    def clear(self):
+        """Drop all cached records."""
+        with self._lock:
+            self._records = {}
+            self._children = {}
+            self._parents = {}
+
+    def stats(self):
+        """Cache statistics."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'records': dict((table, len(records)) for table, records in self._records.items())
+            }
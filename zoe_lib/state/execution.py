@@ -20,7 +20,8 @@ import logging
 import threading
 import functools
 
-from zoe_lib.state.base import BaseRecord, BaseTable
+from zoe_lib.state.base import BaseRecord, BaseTable, CACHE_MISS
+import zoe_lib.exceptions
 
 log = logging.getLogger(__name__)
 
@@ -42,6 +43,9 @@ class Execution(BaseRecord):
     CLEANING_UP_STATUS = "cleaning up"
     TERMINATED_STATUS = "terminated"
 
+    __slots__ = ('user_id', 'name', 'description', 'time_submit', 'time_start', 'time_end', '_status', 'error_message', '_size',
+                 'termination_lock', '_services')
+
     def __init__(self, d, sql_manager):
         super().__init__(d, sql_manager)
 
@@ -67,13 +71,12 @@ class Execution(BaseRecord):
         self._status = d['status']
         self.error_message = d['error_message']
 
-        try:
-            self.size = self.description['size']
-        except KeyError:
-            self.size = self.description['priority']  # zapp format v2
+        self._size = None  # read from the description on first access
 
         self.termination_lock = threading.Lock()
 
+        self._services = None  # set by ExecutionTable.load_services()
+
     def serialize(self):
         """Generates a dictionary that can be serialized in JSON."""
         return {
@@ -92,6 +95,13 @@ class Execution(BaseRecord):
     def __eq__(self, other):
         return self.id == other.id
 
+    def apply_update(self, fields):
+        """Copy the column values written by an UPDATE into this object, used by the state cache."""
+        fields = dict(fields)
+        if 'status' in fields:
+            fields['_status'] = fields.pop('status')
+        super().apply_update(fields)
+
     def set_scheduled(self):
         """The execution has been added to the scheduler queues."""
         self._status = self.SCHEDULED_STATUS
@@ -148,20 +158,40 @@ class Execution(BaseRecord):
         """Getter for the execution status."""
         return self._status
 
+    @property
+    def size(self):
+        """The execution size used by the scheduler, taken from the description unless the scheduler overrides it."""
+        if self._size is None:
+            try:
+                self._size = self.description['size']
+            except KeyError:
+                self._size = self.description['priority']  # zapp format v2
+        return self._size
+
+    @size.setter
+    def size(self, value):
+        self._size = value
+
     @property
     def services(self):
         """Getter for this execution service list."""
+        if self._services is not None:
+            return self._services
         return self.sql_manager.services.select(execution_id=self.id)
 
     @property
     def essential_services(self):
         """Getter for this execution essential service list."""
-        return self.sql_manager.services.select(execution_id=self.id, essential=True)
+        return [s for s in self.services if s.essential]
 
     @property
     def elastic_services(self):
         """Getter for this execution elastic service list."""
-        return self.sql_manager.services.select(execution_id=self.id, essential=False)
+        return [s for s in self.services if not s.essential]
+
+    def preload_services(self, services):
+        """Keep the service list in memory, for short-lived objects that are not managed by the state cache."""
+        self._services = services
 
     @property
     def essential_services_running(self) -> bool:
@@ -212,6 +242,8 @@ class Execution(BaseRecord):
 
 class ExecutionTable(BaseTable):
     """Abstraction for the execution table in the database."""
+    record_class = Execution
+
     def __init__(self, sql_manager):
         super().__init__(sql_manager, "execution")
 
@@ -234,12 +266,12 @@ class ExecutionTable(BaseTable):
         """Create a new execution in the state."""
         status = Execution.SUBMIT_STATUS
         time_submit = datetime.datetime.utcnow()
-        query = self.cursor.mogrify('INSERT INTO execution (id, name, user_id, description, status, time_submit) VALUES (DEFAULT, %s,%s,%s,%s,%s) RETURNING id', (name, user_id, description, status, time_submit))
+        query = self.cursor.mogrify('INSERT INTO execution (id, name, user_id, description, status, time_submit) VALUES (DEFAULT, %s,%s,%s,%s,%s) RETURNING *', (name, user_id, description, status, time_submit))
         self.cursor.execute(query)
         self.sql_manager.commit()
-        return self.cursor.fetchone()[0]
+        return self._cache_inserted(self.cursor.fetchone())
 
-    def select(self, only_one=False, limit=-1, **kwargs):
+    def select(self, only_one=False, limit=-1, after_id=None, order=None, **kwargs):
         """
         Return a list of executions.
 
@@ -247,44 +279,93 @@ class ExecutionTable(BaseTable):
         :type only_one: bool
         :param limit: limit the result to this number of entries
         :type limit: int
+        :param after_id: keyset pagination, return only the executions that come after this ID in the requested order
+        :type after_id: int
+        :param order: 'asc' or 'desc' order by ID, by default executions are sorted newest first only if limit or after_id are used
+        :type order: str
         :param kwargs: filter executions based on their fields/columns
         :return: one or more executions
         """
-        q_base = 'SELECT * FROM execution'
-        if len(kwargs) > 0:
-            q = q_base + " WHERE "
-            filter_list = []
-            args_list = []
-            for key, value in kwargs.items():
-                if key == 'earlier_than_submit':
-                    filter_list.append('"time_submit" <= to_timestamp(%s)')
-                elif key == 'earlier_than_start':
-                    filter_list.append('"time_start" <= to_timestamp(%s)')
-                elif key == 'earlier_than_end':
-                    filter_list.append('"time_end" <= to_timestamp(%s)')
-                elif key == 'later_than_submit':
-                    filter_list.append('"time_submit" >= to_timestamp(%s)')
-                elif key == 'later_than_start':
-                    filter_list.append('"time_start" >= to_timestamp(%s)')
-                elif key == 'later_than_end':
-                    filter_list.append('"time_end" >= to_timestamp(%s)')
-                else:
-                    filter_list.append('{} = %s'.format(key))
-                args_list.append(value)
-            q += ' AND '.join(filter_list)
-            if limit > 0:
-                q += ' ORDER BY id DESC LIMIT {}'.format(limit)
-            query = self.cursor.mogrify(q, args_list)
-        else:
-            if limit > 0:
-                q_base += ' ORDER BY id DESC LIMIT {}'.format(limit)
-            query = self.cursor.mogrify(q_base)
+        if after_id is None and order is None:
+            cached = self._select_cached(only_one, limit, kwargs)
+            if cached is not CACHE_MISS:
+                return cached
+
+        if order is None and (limit > 0 or after_id is not None):
+            order = 'desc'
+        if order not in (None, 'asc', 'desc'):
+            raise zoe_lib.exceptions.ZoeLibException('Invalid execution order: {}'.format(order))
+
+        return self._select_compiled(only_one, limit, kwargs, after_id, order)
+
+    def _filter_sql(self, key, placeholder):
+        """Time filters take a number of seconds since the epoch."""
+        time_filters = {
+            'earlier_than_submit': 'execution.time_submit <= to_timestamp({})',
+            'earlier_than_start': 'execution.time_start <= to_timestamp({})',
+            'earlier_than_end': 'execution.time_end <= to_timestamp({})',
+            'later_than_submit': 'execution.time_submit >= to_timestamp({})',
+            'later_than_start': 'execution.time_start >= to_timestamp({})',
+            'later_than_end': 'execution.time_end >= to_timestamp({})'
+        }
+        if key in time_filters:
+            return time_filters[key].format(placeholder)
+        return super()._filter_sql(key, placeholder)
 
-        self.cursor.execute(query)
-        if only_one:
-            row = self.cursor.fetchone()
-            if row is None:
-                return None
-            return Execution(row, self.sql_manager)
+    def select_chunks(self, chunk_size, limit=-1, after_id=None, order='desc', **kwargs):
+        """
+        Generator returning the executions matching the filters in lists of at most chunk_size elements.
+
+        Each chunk is loaded with a separate keyset-paginated query, together with the services of its executions, so that
+        only one chunk at a time is kept in memory.
+        """
+        while True:
+            page_size = chunk_size if limit <= 0 else min(chunk_size, limit)
+            chunk = self.select(limit=page_size, after_id=after_id, order=order, **kwargs)
+            if len(chunk) == 0:
+                return
+            self.load_services(chunk)
+            yield chunk
+            if limit > 0:
+                limit -= len(chunk)
+                if limit == 0:
+                    return
+            if len(chunk) < page_size:
+                return
+            after_id = chunk[-1].id
+
+    def select_tree(self, execution_id):
+        """Return an execution with all its services and ports, loaded with three queries in total."""
+        execution = self.select(only_one=True, id=execution_id)
+        if execution is not None:
+            self.load_services([execution])
+        return execution
+
+    def load_services(self, executions):
+        """Load the services and ports of many executions with two queries, so that accessing them later does not hit the DB."""
+        if len(executions) == 0:
+            return
+        services = self.sql_manager.services.select_by_parents([e.id for e in executions])
+        if len(services) > 0:
+            ports = self.sql_manager.ports.select_by_parents([s.id for s in services])
         else:
-            return [Execution(x, self.sql_manager) for x in self.cursor]
+            ports = []
+
+        ports_by_service = {}
+        for port in ports:
+            ports_by_service.setdefault(port.service_id, []).append(port)
+        services_by_execution = {}
+        for service in services:
+            services_by_execution.setdefault(service.execution_id, []).append(service)
+
+        cache = self.sql_manager.cache
+        for service in services:
+            if cache.enabled:
+                cache.set_children('port', service.id, ports_by_service.get(service.id, []))
+            else:
+                service.preload_ports(ports_by_service.get(service.id, []))
+        for execution in executions:
+            if cache.enabled:
+                cache.set_children('service', execution.id, services_by_execution.get(execution.id, []))
+            else:
+                execution.preload_services(services_by_execution.get(execution.id, []))
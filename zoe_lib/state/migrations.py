@@ -0,0 +1,67 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+SQL schema migrations.
+
+The tables are always created with the base schema (BASE_SCHEMA_VERSION), then the migrations are applied in order until
+the schema reaches SQL_SCHEMA_VERSION. To change the schema, append a new migration to MIGRATIONS and increment
+SQL_SCHEMA_VERSION in zoe_lib/version.py, never modify the create() methods of the tables or an existing migration.
+"""
+
+import logging
+
+from zoe_lib.version import SQL_SCHEMA_VERSION
+import zoe_lib.exceptions
+
+log = logging.getLogger(__name__)
+
+BASE_SCHEMA_VERSION = 6  # version of the schema created by the create() methods of the tables
+
+# Each migration brings the schema from version - 1 to version
+MIGRATIONS = [
+    {
+        'version': 7,
+        'description': 'indexes on the columns used by the scheduler and the back-end synchronizers',
+        'statements': [
+            'CREATE INDEX execution_status_idx ON execution (status)',
+            'CREATE INDEX execution_user_id_idx ON execution (user_id)',
+            'CREATE INDEX service_execution_id_idx ON service (execution_id)',
+            'CREATE INDEX service_backend_id_idx ON service (backend_id)',
+            'CREATE INDEX service_backend_host_id_idx ON service (backend_host, backend_id)',
+            'CREATE INDEX service_backend_host_status_idx ON service (backend_host, backend_status)',
+            'CREATE INDEX port_service_id_idx ON port (service_id)'
+        ]
+    },
+]
+
+
+def pending_migrations(current_version):
+    """Return the migrations needed to bring a schema at current_version to SQL_SCHEMA_VERSION."""
+    if current_version > SQL_SCHEMA_VERSION or current_version < BASE_SCHEMA_VERSION:
+        raise zoe_lib.exceptions.ZoeLibException('SQL database schema version mismatch: need {}, found {}'.format(SQL_SCHEMA_VERSION, current_version))
+    migrations = [m for m in MIGRATIONS if current_version < m['version'] <= SQL_SCHEMA_VERSION]
+    if [m['version'] for m in migrations] != list(range(current_version + 1, SQL_SCHEMA_VERSION + 1)):
+        raise zoe_lib.exceptions.ZoeLibException('No migration path from SQL schema version {} to {}'.format(current_version, SQL_SCHEMA_VERSION))
+    return migrations
+
+
+def apply_migrations(cur, deployment_name, current_version):
+    """Apply all pending migrations using the given cursor, the caller is responsible for committing."""
+    for migration in pending_migrations(current_version):
+        log.info('Migrating SQL schema of deployment {} to version {}: {}'.format(deployment_name, migration['version'], migration['description']))
+        for statement in migration['statements']:
+            cur.execute(statement)
+        cur.execute("UPDATE public.versions SET version = %s WHERE deployment = %s", (migration['version'], deployment_name))
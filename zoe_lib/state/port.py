@@ -17,25 +17,40 @@
 
 import logging
 
-from zoe_lib.state.base import BaseRecord, BaseTable
+import psycopg2.extras
+
+from zoe_lib.state.base import BaseRecord, BaseTable, CACHE_MISS
 
 log = logging.getLogger(__name__)
 
 
 class Port(BaseRecord):
     """A tcp or udp port that should be exposed by the backend."""
+    __slots__ = ('service_id', 'internal_name', 'external_ip', 'external_port', 'description')
 
     def __init__(self, d, sql_manager):
         super().__init__(d, sql_manager)
 
+        self.service_id = d['service_id']
         self.internal_name = d['internal_name']
         self.external_ip = d['external_ip']
         self.external_port = d['external_port']
         self.description = d['description']
 
-        self.internal_number = self.description['port_number']
-        self.protocol = self.description['protocol']
-        self.url_template = self.description['url_template']
+    @property
+    def internal_number(self):
+        """The port number inside the container."""
+        return self.description['port_number']
+
+    @property
+    def protocol(self):
+        """The port protocol, tcp or udp."""
+        return self.description['protocol']
+
+    @property
+    def url_template(self):
+        """The template used to build the endpoint URL."""
+        return self.description['url_template']
 
     def serialize(self):
         """Generates a dictionary that can be serialized in JSON."""
@@ -65,6 +80,9 @@ class Port(BaseRecord):
 
 class PortTable(BaseTable):
     """Abstraction for the port table in the database."""
+    record_class = Port
+    parent_key = 'service_id'
+
     def __init__(self, sql_manager):
         super().__init__(sql_manager, "port")
 
@@ -81,10 +99,24 @@ class PortTable(BaseTable):
 
     def insert(self, service_id, internal_name, description):
         """Adds a new port to the state."""
-        query = self.cursor.mogrify('INSERT INTO port (id, service_id, internal_name, external_ip, external_port, description) VALUES (DEFAULT, %s, %s, NULL, NULL, %s) RETURNING id', (service_id, internal_name, description))
+        query = self.cursor.mogrify('INSERT INTO port (id, service_id, internal_name, external_ip, external_port, description) VALUES (DEFAULT, %s, %s, NULL, NULL, %s) RETURNING *', (service_id, internal_name, description))
         self.cursor.execute(query)
         self.sql_manager.commit()
-        return self.cursor.fetchone()[0]
+        return self._cache_inserted(self.cursor.fetchone())
+
+    def insert_many(self, ports):
+        """
+        Adds many ports to the state with a single query.
+
+        :param ports: a list of (service_id, internal_name, description) tuples
+        :return: the new port IDs, in the same order
+        """
+        if len(ports) == 0:
+            return []
+        rows = psycopg2.extras.execute_values(self.cursor, 'INSERT INTO port (service_id, internal_name, description) VALUES %s RETURNING *', ports, fetch=True)
+        self.sql_manager.commit()
+        ids_by_key = dict(((row['service_id'], row['internal_name']), self._cache_inserted(row)) for row in rows)
+        return [ids_by_key[(service_id, internal_name)] for service_id, internal_name, _ in ports]
 
     def select(self, only_one=False, limit=-1, **kwargs):
         """
@@ -97,28 +129,8 @@ class PortTable(BaseTable):
         :param kwargs: filter services based on their fields/columns
         :return: one or more ports
         """
-        q_base = 'SELECT * FROM port'
-        if len(kwargs) > 0:
-            q = q_base + " WHERE "
-            filter_list = []
-            args_list = []
-            for key, value in kwargs.items():
-                filter_list.append('{} = %s'.format(key))
-                args_list.append(value)
-            q += ' AND '.join(filter_list)
-            if limit > 0:
-                q += ' ORDER BY id DESC LIMIT {}'.format(limit)
-            query = self.cursor.mogrify(q, args_list)
-        else:
-            if limit > 0:
-                q_base += ' ORDER BY id DESC LIMIT {}'.format(limit)
-            query = self.cursor.mogrify(q_base)
+        cached = self._select_cached(only_one, limit, kwargs)
+        if cached is not CACHE_MISS:
+            return cached
 
-        self.cursor.execute(query)
-        if only_one:
-            row = self.cursor.fetchone()
-            if row is None:
-                return None
-            return Port(row, self.sql_manager)
-        else:
-            return [Port(x, self.sql_manager) for x in self.cursor]
+        return self._select_compiled(only_one, limit, kwargs)
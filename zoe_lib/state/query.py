@@ -0,0 +1,54 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compiled select queries, executed as server-side prepared statements."""
+
+import threading
+
+
+class CompiledQuery:
+    """
+    The SQL text of a select for one filter shape, generated once and run with PREPARE/EXECUTE.
+
+    The SQL uses the $1, $2... placeholders of PostgresQL prepared statements. Execution times are accumulated, so that
+    the most expensive query shapes can be identified.
+    """
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self._lock = threading.Lock()
+
+    def record_time(self, elapsed):
+        """Account for one execution of this query."""
+        with self._lock:
+            self.count += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
+
+    def stats(self):
+        """Timing statistics."""
+        with self._lock:
+            return {
+                'name': self.name,
+                'sql': self.sql,
+                'count': self.count,
+                'total_time': self.total_time,
+                'avg_time': self.total_time / self.count if self.count > 0 else 0,
+                'max_time': self.max_time
+            }
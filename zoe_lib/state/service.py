@@ -17,15 +17,19 @@
 
 import logging
 
+import psycopg2.extras
+
 from zoe_lib.config import get_conf
 
-from zoe_lib.state.base import BaseTable, BaseRecord
+from zoe_lib.state.base import BaseTable, BaseRecord, CACHE_MISS
 
 log = logging.getLogger(__name__)
 
 
 class ResourceLimits:
     """A resource limits description."""
+    __slots__ = ('min', 'max', 'unit')
+
     def __init__(self, data, unit):
         if isinstance(data, dict):
             self.min = data['min']
@@ -58,6 +62,8 @@ class ResourceLimits:
 
 class ResourceReservation:
     """The resources reserved by a Service."""
+    __slots__ = ('memory', 'cores')
+
     def __init__(self, data):
         self.memory = ResourceLimits(data['memory'], "bytes")
         self.cores = ResourceLimits(data['cores'], 'units')
@@ -106,6 +112,9 @@ class Service(BaseRecord):
     BACKEND_DESTROY_STATUS = 'destroyed'
     BACKEND_OOM_STATUS = 'oom-killed'
 
+    __slots__ = ('name', 'status', 'error_message', 'execution_id', 'description', 'service_group', 'backend_id', 'backend_status',
+                 'backend_host', 'restart_count', 'ip_address', 'essential', '_resource_reservation', '_volumes', '_ports')
+
     def __init__(self, d, sql_manager):
         super().__init__(d, sql_manager)
 
@@ -126,25 +135,11 @@ class Service(BaseRecord):
 
         self.essential = d['essential']
 
-        # Fields parsed from the JSON description
-        self.image_name = self.description['image']
-        self.is_monitor = self.description['monitor']
-        self.startup_order = self.description['startup_order']
-        self.environment = self.description['environment']
-        self.command = self.description['command']
-        self.resource_reservation = ResourceReservation(self.description['resources'])
-        self.volumes = [VolumeDescriptionHostPath(v['name'], v['path'], v['read_only']) for v in self.description['volumes']]
-
-        # Optional zapp fields
-        try:
-            self.work_dir = self.description['work_dir']
-        except KeyError:
-            self.work_dir = None
-
-        try:
-            self.labels = self.description['labels']
-        except KeyError:
-            self.labels = []
+        # Objects built from the JSON description the first time they are needed
+        self._resource_reservation = None
+        self._volumes = None
+
+        self._ports = None  # set by ExecutionTable.load_services()
 
     def serialize(self):
         """Generates a dictionary that can be serialized in JSON."""
@@ -168,6 +163,55 @@ class Service(BaseRecord):
     def __eq__(self, other):
         return self.id == other.id
 
+    @property
+    def image_name(self):
+        """The container image, from the JSON description."""
+        return self.description['image']
+
+    @property
+    def is_monitor(self):
+        """True if the execution terminates when this service terminates."""
+        return self.description['monitor']
+
+    @property
+    def startup_order(self):
+        """The position of this service in the startup sequence of the execution."""
+        return self.description['startup_order']
+
+    @property
+    def environment(self):
+        """The environment variables, from the JSON description."""
+        return self.description['environment']
+
+    @property
+    def command(self):
+        """The command to run, from the JSON description."""
+        return self.description['command']
+
+    @property
+    def work_dir(self):
+        """The optional working directory, from the JSON description."""
+        return self.description.get('work_dir')
+
+    @property
+    def labels(self):
+        """The optional labels, from the JSON description."""
+        return self.description.get('labels', [])
+
+    @property
+    def resource_reservation(self) -> ResourceReservation:
+        """The resources reserved by this service, parsed on first access."""
+        if self._resource_reservation is None:
+            self._resource_reservation = ResourceReservation(self.description['resources'])
+        return self._resource_reservation
+
+    @property
+    def volumes(self):
+        """The volumes to mount, parsed on first access."""
+        if self._volumes is None:
+            self._volumes = [VolumeDescriptionHostPath(v['name'], v['path'], v['read_only']) for v in self.description['volumes']]
+        return self._volumes
+
     def set_terminating(self):
         """The service is being terminated."""
         self.sql_manager.services.update(self.id, status=self.TERMINATING_STATUS)
@@ -190,17 +234,18 @@ class Service(BaseRecord):
 
     def set_active(self, backend_id, ip_address, ports):
         """The service is running and has a valid backend_id."""
-        self.sql_manager.services.update(self.id, status=self.ACTIVE_STATUS, backend_id=backend_id, error_message=None, ip_address=ip_address, backend_status=self.BACKEND_START_STATUS)
-        self.error_message = None
-        self.ip_address = ip_address
-        self.backend_id = backend_id
-        self.status = self.ACTIVE_STATUS
-        self.backend_status = self.BACKEND_START_STATUS
-        for port in self.ports:
-            if port.internal_name in ports and ports[port.internal_name] is not None:
-                port.activate(ip_address, ports[port.internal_name])
-            else:
-                port.reset()
+        with self.sql_manager.transaction():
+            self.sql_manager.services.update(self.id, status=self.ACTIVE_STATUS, backend_id=backend_id, error_message=None, ip_address=ip_address, backend_status=self.BACKEND_START_STATUS)
+            self.error_message = None
+            self.ip_address = ip_address
+            self.backend_id = backend_id
+            self.status = self.ACTIVE_STATUS
+            self.backend_status = self.BACKEND_START_STATUS
+            for port in self.ports:
+                if port.internal_name in ports and ports[port.internal_name] is not None:
+                    port.activate(ip_address, ports[port.internal_name])
+                else:
+                    port.reset()
 
     def set_error(self, error_message):
         """The service could not be created/started."""
@@ -213,15 +258,15 @@ class Service(BaseRecord):
         log.debug("service {}, backend status updated to {}".format(self.id, new_status))
         self.backend_status = new_status
         if self.is_dead():
-            for port in self.ports:
-                port.reset()
-            self.ip_address = None
-            self.sql_manager.services.update(self.id, backend_status=new_status, ip_address=None)
-            if new_status == self.BACKEND_DESTROY_STATUS:
-                self.backend_id = None
-                self.sql_manager.services.update(self.id, backend_status=new_status, backend_id=None, ip_address=None)
-            else:
-                self.sql_manager.services.update(self.id, backend_status=new_status, ip_address=None)
+            with self.sql_manager.transaction():
+                for port in self.ports:
+                    port.reset()
+                self.ip_address = None
+                if new_status == self.BACKEND_DESTROY_STATUS:
+                    self.backend_id = None
+                    self.sql_manager.services.update(self.id, backend_status=new_status, backend_id=None, ip_address=None)
+                else:
+                    self.sql_manager.services.update(self.id, backend_status=new_status, ip_address=None)
         else:
             self.sql_manager.services.update(self.id, backend_status=new_status)
 
@@ -244,8 +289,14 @@ class Service(BaseRecord):
     @property
     def ports(self):
         """Getter for the ports exposed by this service."""
+        if self._ports is not None:
+            return self._ports
         return self.sql_manager.ports.select(service_id=self.id)
 
+    def preload_ports(self, ports):
+        """Keep the port list in memory, for short-lived objects that are not managed by the state cache."""
+        self._ports = ports
+
     @property
     def proxy_address(self):
         """Get proxy address path"""
@@ -276,6 +327,9 @@ class Service(BaseRecord):
 
 class ServiceTable(BaseTable):
     """Abstraction for the service table in the database."""
+    record_class = Service
+    parent_key = 'execution_id'
+
     def __init__(self, sql_manager):
         super().__init__(sql_manager, "service")
 
@@ -300,10 +354,26 @@ class ServiceTable(BaseTable):
     def insert(self, execution_id, name, service_group, description, is_essential):
         """Adds a new service to the state."""
         status = Service.CREATED_STATUS
-        query = self.cursor.mogrify('INSERT INTO service (id, status, execution_id, name, service_group, description, essential) VALUES (DEFAULT,%s,%s,%s,%s,%s,%s) RETURNING id', (status, execution_id, name, service_group, description, is_essential))
+        query = self.cursor.mogrify('INSERT INTO service (id, status, execution_id, name, service_group, description, essential) VALUES (DEFAULT,%s,%s,%s,%s,%s,%s) RETURNING *', (status, execution_id, name, service_group, description, is_essential))
         self.cursor.execute(query)
         self.sql_manager.commit()
-        return self.cursor.fetchone()[0]
+        return self._cache_inserted(self.cursor.fetchone())
+
+    def insert_many(self, execution_id, services):
+        """
+        Adds many services of the same execution to the state with a single query.
+
+        :param services: a list of (name, service_group, description, is_essential) tuples, names must be unique in the execution
+        :return: the new service IDs, in the same order
+        """
+        if len(services) == 0:
+            return []
+        status = Service.CREATED_STATUS
+        values = [(status, execution_id, name, service_group, description, is_essential) for name, service_group, description, is_essential in services]
+        rows = psycopg2.extras.execute_values(self.cursor, 'INSERT INTO service (status, execution_id, name, service_group, description, essential) VALUES %s RETURNING *', values, fetch=True)
+        self.sql_manager.commit()
+        ids_by_name = dict((row['name'], self._cache_inserted(row)) for row in rows)
+        return [ids_by_name[name] for name, _, _, _ in services]
 
     def select(self, only_one=False, limit=-1, **kwargs):
         """
@@ -313,34 +383,24 @@ class ServiceTable(BaseTable):
         :type only_one: bool
         :param limit: limit the result to this number of entries
         :type limit: int
-        :param kwargs: filter services based on their fields/columns
+        :param kwargs: filter services based on their fields/columns, user_id filters on the owner of the execution
         :return: one or more services
         """
-        q_base = 'SELECT * FROM service'
-        if len(kwargs) > 0:
-            q = q_base + " WHERE "
-            filter_list = []
-            args_list = []
-            for key, value in kwargs.items():
-                if key.startswith('not_'):
-                    filter_list.append('{} != %s'.format(key[4:]))
-                else:
-                    filter_list.append('{} = %s'.format(key))
-                args_list.append(value)
-            q += ' AND '.join(filter_list)
-            if limit > 0:
-                q += ' ORDER BY id DESC LIMIT {}'.format(limit)
-            query = self.cursor.mogrify(q, args_list)
-        else:
-            if limit > 0:
-                q_base += ' ORDER BY id DESC LIMIT {}'.format(limit)
-            query = self.cursor.mogrify(q_base)
-
-        self.cursor.execute(query)
-        if only_one:
-            row = self.cursor.fetchone()
-            if row is None:
-                return None
-            return Service(row, self.sql_manager)
-        else:
-            return [Service(x, self.sql_manager) for x in self.cursor]
+        if 'user_id' not in kwargs:
+            cached = self._select_cached(only_one, limit, kwargs)
+            if cached is not CACHE_MISS:
+                return cached
+
+        return self._select_compiled(only_one, limit, kwargs)
+
+    def _filter_sql(self, key, placeholder):
+        """The user_id filter applies to the execution the service belongs to."""
+        if key == 'user_id':
+            return 'execution.user_id = {}'.format(placeholder)
+        return super()._filter_sql(key, placeholder)
+
+    def _from_sql(self, keys):
+        """Join with the execution table to filter on its owner."""
+        if 'user_id' in keys:
+            return 'service JOIN execution ON execution.id = service.execution_id'
+        return 'service'
@@ -15,58 +15,246 @@
 
 """Interface to PostgresQL for Zoe state."""
 
+from collections import OrderedDict
+import contextlib
 import logging
+import threading
+import time
+import weakref
 
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 
 from zoe_lib.config import get_conf
-from zoe_lib.version import SQL_SCHEMA_VERSION
 import zoe_lib.exceptions
 
+from .cache import StateCache
+from .query import CompiledQuery
 from .service import ServiceTable
 from .execution import ExecutionTable
 from .port import PortTable
+from .migrations import BASE_SCHEMA_VERSION, apply_migrations
 
 log = logging.getLogger(__name__)
 
 psycopg2.extensions.register_adapter(dict, psycopg2.extras.Json)
 
+POOL_CHECKOUT_TIMEOUT = 10  # seconds a thread waits for a free connection when the pool is exhausted
+
 
 class SQLManager:
-    """The SQLManager class, should be used as a singleton."""
-    def __init__(self, conf):
+    """
+    The SQLManager class, should be used as a singleton.
+
+    If cache is True, records are kept in an identity map and selects by ID or by parent are served from memory, see StateCache.
+
+    If conf.dbpool_max is greater than zero, each thread checks out its own connection from a pool of at most dbpool_max
+    connections and keeps it until it terminates. Otherwise all threads share a single connection, and a transaction() block
+    holds it for its whole duration: commits of other threads wait until the block exits.
+    """
+    def __init__(self, conf, cache=False):
         self.user = conf.dbuser
         self.password = conf.dbpass
         self.host = conf.dbhost
         self.port = conf.dbport
         self.dbname = conf.dbname
         self.schema = conf.deployment_name
+        self.pool_min = conf.dbpool_min
+        self.pool_max = conf.dbpool_max
         self.conn = None
-        self._connect()
+        self.pool = None
+        self.cache = StateCache(enabled=cache)
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._pool_owners = {}  # thread ident -> (thread, connection), for connections checked out from the pool
+        self._compiled_queries = {}  # query shape -> CompiledQuery
+        self._prepared = weakref.WeakKeyDictionary()  # connection -> names of the statements prepared on it
+        self._query_lock = threading.Lock()
+        self._conn_lock = threading.RLock()  # held by transactions on the shared connection, when there is no pool
+        if self.pool_max > 0:
+            self._create_pool()
+        else:
+            self._connect()
+
+    def _dsn(self):
+        """The search_path is set by the server when the connection is established, not at every cursor."""
+        return 'dbname=' + self.dbname + \
+               ' user=' + self.user + \
+               ' password=' + self.password + \
+               ' host=' + self.host + \
+               ' port=' + str(self.port) + \
+               " options='-c search_path={},public'".format(self.schema)
 
     def _connect(self):
-        dsn = 'dbname=' + self.dbname + \
-              ' user=' + self.user + \
-              ' password=' + self.password + \
-              ' host=' + self.host + \
-              ' port=' + str(self.port)
+        self.conn = psycopg2.connect(self._dsn())
+
+    def _create_pool(self):
+        log.info('Using a pool of {} to {} DB connections'.format(self.pool_min, self.pool_max))
+        self.pool = psycopg2.pool.ThreadedConnectionPool(self.pool_min, self.pool_max, self._dsn())
 
-        self.conn = psycopg2.connect(dsn)
+    def _reclaim_connections(self):
+        """Give back to the pool the connections held by threads that have terminated, must be called with the pool lock held."""
+        for ident, (thread, conn) in list(self._pool_owners.items()):
+            if not thread.is_alive():
+                self.pool.putconn(conn, key=ident)
+                del self._pool_owners[ident]
+
+    def _checkout(self, broken_conn=None):
+        """Get a connection from the pool for the calling thread."""
+        ident = threading.get_ident()
+        time_start = time.time()
+        while True:
+            with self._pool_lock:
+                if broken_conn is not None:
+                    self.pool.putconn(broken_conn, key=ident, close=True)
+                    del self._pool_owners[ident]
+                    broken_conn = None
+                self._reclaim_connections()
+                try:
+                    conn = self.pool.getconn(key=ident)
+                except psycopg2.pool.PoolError:
+                    conn = None
+                else:
+                    self._pool_owners[ident] = (threading.current_thread(), conn)
+            if conn is not None:
+                break
+            if time.time() - time_start > POOL_CHECKOUT_TIMEOUT:
+                raise zoe_lib.exceptions.ZoeLibException('DB connection pool exhausted ({} connections in use)'.format(self.pool_max))
+            time.sleep(0.1)
+        self._local.conn = conn
+        return conn
+
+    def connection(self):
+        """Get the DB connection to be used by the calling thread."""
+        if self.pool is None:
+            return self.conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._checkout()
+        return conn
+
+    def _reconnect(self):
+        if self.pool is None:
+            self._connect()
+            return self.conn
+        else:
+            return self._checkout(broken_conn=self.connection())
 
     def cursor(self):
-        """Get a cursor, making sure the connection to the database is established."""
+        """Get the cursor of the calling thread, making sure the connection to the database is established."""
+        cur = getattr(self._local, 'cursor', None)
+        conn = self.connection()
+        if cur is not None and not cur.closed and cur.connection is conn:
+            return cur
         try:
-            cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         except psycopg2.InterfaceError:
-            self._connect()
-            cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute('SET search_path TO {},public'.format(self.schema))
+            conn = self._reconnect()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        self._local.cursor = cur
         return cur
 
     def commit(self):
-        """Commit a transaction."""
-        self.conn.commit()
+        """Commit a transaction. Inside a transaction() block the commit is postponed until the block exits."""
+        if self.in_transaction():
+            return
+        if self.pool is None:
+            with self._conn_lock:
+                self.conn.commit()
+        else:
+            self.connection().commit()
+
+    def in_transaction(self) -> bool:
+        """Returns True if the calling thread is inside a transaction() block."""
+        return getattr(self._local, 'transaction_depth', 0) > 0
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group all the writes done by the calling thread in a single DB transaction.
+
+        Updates are not executed immediately: updates to the same row are merged and sent to the DB just before the next
+        select or when the outermost block exits, followed by a single commit. If the flush or the commit fail the
+        transaction is rolled back. Blocks can be nested. Without the connection pool the shared connection is locked until
+        the outermost block exits, so that other threads cannot commit or roll back half of the transaction.
+        """
+        depth = getattr(self._local, 'transaction_depth', 0)
+        if depth == 0:
+            if self.pool is None:
+                self._conn_lock.acquire()
+            self._local.pending_updates = OrderedDict()
+        self._local.transaction_depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.transaction_depth = depth
+            if depth == 0:
+                # Writes reflect actions already taken on the back-end, they are committed even if the block raised an exception
+                try:
+                    self.flush()
+                    self.connection().commit()
+                except psycopg2.Error:
+                    self.connection().rollback()
+                    raise
+                finally:
+                    if self.pool is None:
+                        self._conn_lock.release()
+
+    def compile_query(self, shape, builder) -> CompiledQuery:
+        """Return the compiled query for a shape, the builder function is called to generate the SQL only the first time."""
+        compiled = self._compiled_queries.get(shape)
+        if compiled is None:
+            with self._query_lock:
+                compiled = self._compiled_queries.get(shape)
+                if compiled is None:
+                    compiled = CompiledQuery('zoe_query_{}'.format(len(self._compiled_queries)), builder())
+                    self._compiled_queries[shape] = compiled
+        return compiled
+
+    def execute_compiled(self, cur, compiled: CompiledQuery, args):
+        """Run a compiled query as a prepared statement, preparing it first if this connection has not seen it yet."""
+        time_start = time.time()
+        with self._query_lock:
+            prepared = self._prepared.setdefault(cur.connection, set())
+            if compiled.name not in prepared:
+                cur.execute('PREPARE {} AS {}'.format(compiled.name, compiled.sql))
+                prepared.add(compiled.name)
+        if len(args) > 0:
+            cur.execute('EXECUTE {} ({})'.format(compiled.name, ', '.join(['%s'] * len(args))), args)
+        else:
+            cur.execute('EXECUTE {}'.format(compiled.name))
+        compiled.record_time(time.time() - time_start)
+
+    def query_stats(self):
+        """Timing statistics of the compiled queries, the most expensive first."""
+        with self._query_lock:
+            compiled_queries = list(self._compiled_queries.values())
+        return sorted([c.stats() for c in compiled_queries], key=lambda stats: stats['total_time'], reverse=True)
+
+    def defer_update(self, table_name, record_id, fields) -> bool:
+        """Queue an update for the current transaction, returns False if there is no transaction and it must be executed immediately."""
+        if not self.in_transaction():
+            return False
+        key = (table_name, record_id)
+        if key not in self._local.pending_updates:
+            self._local.pending_updates[key] = {}
+        self._local.pending_updates[key].update(fields)
+        return True
+
+    def flush(self):
+        """Execute the updates queued by the current transaction, without committing."""
+        pending = getattr(self._local, 'pending_updates', None)
+        if not pending:
+            return
+        self._local.pending_updates = OrderedDict()
+        tables = {
+            'execution': self.executions,
+            'service': self.services,
+            'port': self.ports
+        }
+        for (table_name, record_id), fields in pending.items():
+            tables[table_name].execute_update(record_id, fields)
 
     @property
     def executions(self) -> ExecutionTable:
@@ -89,10 +277,13 @@ class SQLManager:
         self.ports.create()
 
     def init_db(self, force=False):
-        """DB init entrypoint."""
-        cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        """DB init entrypoint, creates the tables or migrates them to the current schema version."""
+        cur = self.connection().cursor(cursor_factory=psycopg2.extras.DictCursor)
 
         cur.execute("CREATE TABLE IF NOT EXISTS public.versions (deployment text, version integer)")
+        self.commit()
+        # zoe-api and zoe-master may start at the same time, only one of them creates or migrates the schema
+        cur.execute("LOCK TABLE public.versions IN EXCLUSIVE MODE")
 
         cur.execute('SET search_path TO {},public'.format(get_conf().deployment_name))
 
@@ -100,24 +291,24 @@ class SQLManager:
             cur.execute("DELETE FROM public.versions WHERE deployment = %s", (get_conf().deployment_name,))
             cur.execute('DROP SCHEMA IF EXISTS {} CASCADE'.format(get_conf().deployment_name))
 
-        if not self._check_schema_version(cur, get_conf().deployment_name):
+        version = self._check_schema_version(cur, get_conf().deployment_name)
+        if version is None:
             self._create_tables()
+            version = BASE_SCHEMA_VERSION
+        apply_migrations(cur, get_conf().deployment_name, version)
 
         self.commit()
         cur.close()
 
     def _check_schema_version(self, cur, deployment_name):
-        """Check if the schema version matches this source code version."""
+        """Return the schema version of the deployment, or None if the tables need to be created."""
         cur.execute("SELECT version FROM public.versions WHERE deployment = %s", (deployment_name,))
         row = cur.fetchone()
         if row is None:
-            cur.execute("INSERT INTO public.versions (deployment, version) VALUES (%s, %s)", (deployment_name, SQL_SCHEMA_VERSION))
+            cur.execute("INSERT INTO public.versions (deployment, version) VALUES (%s, %s)", (deployment_name, BASE_SCHEMA_VERSION))
             cur.execute("SELECT EXISTS(SELECT 1 FROM pg_catalog.pg_namespace WHERE nspname = %s)", (deployment_name,))
             if not cur.fetchone()[0]:
                 cur.execute('CREATE SCHEMA {}'.format(deployment_name))
-            return False  # Tables need to be created
+            return None  # Tables need to be created
         else:
-            if row[0] == SQL_SCHEMA_VERSION:
-                return True
-            else:
-                raise zoe_lib.exceptions.ZoeLibException('SQL database schema version mismatch: need {}, found {}'.format(SQL_SCHEMA_VERSION, row[0]))
+            return row[0]
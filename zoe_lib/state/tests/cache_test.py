@@ -0,0 +1,100 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the state identity map."""
+
+from zoe_lib.state.base import BaseRecord
+from zoe_lib.state.cache import StateCache
+
+
+class MockRecord(BaseRecord):
+    """A minimal record."""
+    def __init__(self, record_id):
+        super().__init__({'id': record_id}, None)
+        self.status = 'created'
+
+    def serialize(self):
+        """Not needed."""
+        return {'id': self.id}
+
+
+class TestStateCache:
+    """Identity map tests."""
+
+    def test_identity(self):
+        """The same ID always maps to the first object that has been added."""
+        cache = StateCache()
+        first = cache.add('execution', MockRecord(1))
+        second = cache.add('execution', MockRecord(1))
+        assert first is second
+        assert cache.get('execution', 1) is first
+        assert cache.get('execution', 2) is None
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_children_and_update(self):
+        """Loaded children are returned from memory and kept up to date."""
+        cache = StateCache()
+        cache.add('execution', MockRecord(1))
+        assert cache.children('service', 1) is None
+        cache.set_children('service', 1, [MockRecord(10), MockRecord(11)])
+        cache.add('service', MockRecord(12), parent_id=1)
+        assert [s.id for s in cache.children('service', 1)] == [10, 11, 12]
+        cache.update('service', 11, {'status': 'active'})
+        assert cache.peek('service', 11).status == 'active'
+
+    def test_cascade_remove(self):
+        """Removing an execution forgets its services and their ports."""
+        cache = StateCache()
+        cache.add('execution', MockRecord(1))
+        cache.set_children('service', 1, [MockRecord(10)])
+        cache.set_children('port', 10, [MockRecord(100)])
+        cache.remove('execution', 1)
+        assert cache.peek('service', 10) is None
+        assert cache.peek('port', 100) is None
+        assert cache.children('service', 1) is None
+
+    def test_terminal_eviction(self):
+        """An execution that reaches a terminal status is forgotten with its services and ports."""
+        cache = StateCache()
+        cache.add('execution', MockRecord(1))
+        cache.set_children('service', 1, [MockRecord(10)])
+        cache.set_children('port', 10, [MockRecord(100)])
+        cache.update('execution', 1, {'status': 'running'})
+        assert cache.peek('execution', 1).status == 'running'
+        cache.update('execution', 1, {'status': 'terminated'})
+        assert cache.peek('execution', 1) is None
+        assert cache.peek('service', 10) is None
+        assert cache.peek('port', 100) is None
+
+    def test_terminal_not_cached(self):
+        """Terminated executions and the children of executions that are not cached are not kept in memory."""
+        cache = StateCache()
+        terminated = MockRecord(1)
+        terminated.status = 'error'
+        assert cache.add('execution', terminated) is terminated
+        assert cache.peek('execution', 1) is None
+        cache.add('service', MockRecord(10), parent_id=1)
+        cache.set_children('service', 1, [MockRecord(11)])
+        assert cache.peek('service', 10) is None
+        assert cache.children('service', 1) is None
+
+    def test_disabled(self):
+        """A disabled cache never returns records."""
+        cache = StateCache(enabled=False)
+        record = MockRecord(1)
+        assert cache.add('execution', record) is record
+        assert cache.get('execution', 1) is None
+        assert cache.stats()['hits'] == 0
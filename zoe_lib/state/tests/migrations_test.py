@@ -0,0 +1,42 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the SQL schema migrations."""
+
+import pytest
+
+from zoe_lib.exceptions import ZoeLibException
+from zoe_lib.state.migrations import BASE_SCHEMA_VERSION, pending_migrations
+from zoe_lib.version import SQL_SCHEMA_VERSION
+
+
+class TestMigrations:
+    """Migration path tests."""
+
+    def test_full_path(self):
+        """A schema created from scratch is migrated through every version."""
+        versions = [m['version'] for m in pending_migrations(BASE_SCHEMA_VERSION)]
+        assert versions == list(range(BASE_SCHEMA_VERSION + 1, SQL_SCHEMA_VERSION + 1))
+
+    def test_up_to_date(self):
+        """Nothing to do on a current schema."""
+        assert pending_migrations(SQL_SCHEMA_VERSION) == []
+
+    def test_unknown_version(self):
+        """Schemas too old or newer than the code are refused."""
+        with pytest.raises(ZoeLibException):
+            pending_migrations(BASE_SCHEMA_VERSION - 1)
+        with pytest.raises(ZoeLibException):
+            pending_migrations(SQL_SCHEMA_VERSION + 1)
@@ -21,17 +21,17 @@ from collections import namedtuple
 from zoe_lib.state.sql_manager import SQLManager
 
 
-Conf = namedtuple('Conf', ['dbuser', 'dbpass', 'dbhost', 'dbport', 'dbname', 'deployment_name'])
+Conf = namedtuple('Conf', ['dbuser', 'dbpass', 'dbhost', 'dbport', 'dbname', 'dbpool_min', 'dbpool_max', 'deployment_name'])
 
 
 class MockSQLManager(SQLManager):
     """A mock SQL manager."""
     def __init__(self):
-        fake_conf = Conf(dbuser='', dbpass='', dbhost='', dbport=5432, dbname='', deployment_name='test')
+        fake_conf = Conf(dbuser='', dbpass='', dbhost='', dbport=5432, dbname='', dbpool_min=1, dbpool_max=0, deployment_name='test')
         super().__init__(fake_conf)
 
     def _connect(self):
-        self.conn = sqlite3.connect(':memory:')
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)  # like psycopg2 connections, shared by all threads
 
-    def _cursor(self):
+    def cursor(self):
         return self.conn.cursor()
@@ -0,0 +1,92 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the compiled select queries and the keyset pagination."""
+
+from zoe_lib.state.tests.mock_sql_manager import MockSQLManager
+
+
+class MockRecord:
+    """A record with only an ID."""
+    def __init__(self, record_id):
+        self.id = record_id
+
+
+def _mock_execution_table(count):
+    """An execution table with count executions, whose select() implements the keyset pagination in memory and records its arguments."""
+    table = MockSQLManager().executions
+    table.selects = []
+
+    def select(limit=-1, after_id=None, order=None, **kwargs):
+        table.selects.append(dict(kwargs, limit=limit, after_id=after_id, order=order))
+        ids = range(1, count + 1) if order == 'asc' else range(count, 0, -1)
+        if after_id is not None:
+            ids = [record_id for record_id in ids if (record_id > after_id if order == 'asc' else record_id < after_id)]
+        return [MockRecord(record_id) for record_id in ids][:limit]
+
+    table.select = select
+    table.load_services = lambda executions: None
+    return table
+
+
+def _chunk_ids(chunks):
+    return [[record.id for record in chunk] for chunk in chunks]
+
+
+class TestCompiledQueries:
+    """Query compilation tests."""
+
+    def test_compile_select(self):
+        """Filters, pagination and limit become numbered parameters in a fixed order."""
+        sql_manager = MockSQLManager()
+        sql = sql_manager.executions._compile_select(('later_than_submit', 'status'), True, 'desc', True)  # pylint: disable=protected-access
+        assert sql == 'SELECT execution.* FROM execution WHERE execution.time_submit >= to_timestamp($1) AND execution.status = $2 AND execution.id < $3 ORDER BY execution.id DESC LIMIT $4'
+        sql = sql_manager.services._compile_select(('not_status', 'user_id'), False, None, False)  # pylint: disable=protected-access
+        assert sql == 'SELECT service.* FROM service JOIN execution ON execution.id = service.execution_id WHERE service.status != $1 AND execution.user_id = $2'
+
+    def test_compile_once(self):
+        """Each shape is compiled once and gets its own statement name."""
+        sql_manager = MockSQLManager()
+        first = sql_manager.compile_query(('port', ('id',)), lambda: 'SELECT 1')
+        second = sql_manager.compile_query(('port', ('id',)), lambda: 'SELECT 2')
+        other = sql_manager.compile_query(('port', ('service_id',)), lambda: 'SELECT 3')
+        assert first is second
+        assert first.sql == 'SELECT 1'
+        assert other.name != first.name
+        first.record_time(0.5)
+        assert sql_manager.query_stats()[0]['count'] == 1
+
+
+class TestSelectChunks:
+    """Keyset pagination of the execution list."""
+
+    def test_desc(self):
+        """By default the newest executions come first, each chunk starts after the last ID of the previous one."""
+        table = _mock_execution_table(5)
+        assert _chunk_ids(table.select_chunks(2, status='running')) == [[5, 4], [3, 2], [1]]
+        assert [select['after_id'] for select in table.selects] == [None, 4, 2]
+        assert all(select['status'] == 'running' and select['order'] == 'desc' for select in table.selects)
+
+    def test_asc_after_id_and_limit(self):
+        """The first page can start after a given ID, the last chunk is shortened to respect the limit."""
+        table = _mock_execution_table(10)
+        assert _chunk_ids(table.select_chunks(2, limit=5, after_id=3, order='asc')) == [[4, 5], [6, 7], [8]]
+        assert [select['limit'] for select in table.selects] == [2, 2, 1]
+
+    def test_exact_multiple(self):
+        """When the last chunk is full one more query finds out that there is nothing left."""
+        table = _mock_execution_table(4)
+        assert _chunk_ids(table.select_chunks(2)) == [[4, 3], [2, 1]]
+        assert len(table.selects) == 3
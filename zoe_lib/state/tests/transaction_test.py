@@ -0,0 +1,92 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the DB transactions of the SQL manager."""
+
+import threading
+
+import psycopg2
+import pytest
+
+from zoe_lib.state.tests.mock_sql_manager import MockSQLManager
+
+
+def _mock_sql_manager():
+    sql_manager = MockSQLManager()
+    sql_manager.cursor().execute('CREATE TABLE test (value integer)')
+    sql_manager.commit()
+    return sql_manager
+
+
+def _values(sql_manager):
+    cur = sql_manager.cursor()
+    cur.execute('SELECT value FROM test ORDER BY value')
+    return [row[0] for row in cur.fetchall()]
+
+
+class TestTransaction:
+    """Transactions on the connection shared by all threads."""
+
+    def test_commit_on_exit(self):
+        """Nested blocks are committed once, when the outermost block exits, even if it raised an exception."""
+        sql_manager = _mock_sql_manager()
+        with sql_manager.transaction():
+            sql_manager.cursor().execute('INSERT INTO test VALUES (1)')
+            with sql_manager.transaction():
+                sql_manager.cursor().execute('INSERT INTO test VALUES (2)')
+            sql_manager.commit()
+            assert sql_manager.in_transaction()
+            assert sql_manager.conn.in_transaction
+        assert not sql_manager.in_transaction()
+        assert not sql_manager.conn.in_transaction
+        with pytest.raises(RuntimeError):
+            with sql_manager.transaction():
+                sql_manager.cursor().execute('INSERT INTO test VALUES (3)')
+                raise RuntimeError('back-end failure')
+        assert not sql_manager.conn.in_transaction
+        assert _values(sql_manager) == [1, 2, 3]
+
+    def test_rollback_on_exception(self, monkeypatch):
+        """If the DB refuses the writes the whole transaction is rolled back."""
+        sql_manager = _mock_sql_manager()
+
+        def failing_flush():
+            raise psycopg2.OperationalError('connection lost')
+
+        with pytest.raises(psycopg2.OperationalError):
+            with sql_manager.transaction():
+                sql_manager.cursor().execute('INSERT INTO test VALUES (1)')
+                monkeypatch.setattr(sql_manager, 'flush', failing_flush)
+        assert not sql_manager.conn.in_transaction
+        assert _values(sql_manager) == []
+
+    def test_isolation(self):
+        """Other threads cannot commit the shared connection while a transaction is open."""
+        sql_manager = _mock_sql_manager()
+        committed = threading.Event()
+
+        def other_thread():
+            sql_manager.commit()
+            committed.set()
+
+        with sql_manager.transaction():
+            sql_manager.cursor().execute('INSERT INTO test VALUES (1)')
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            assert not committed.wait(0.2)
+            assert sql_manager.conn.in_transaction
+        thread.join()
+        assert committed.is_set()
+        assert _values(sql_manager) == [1]
@@ -31,6 +31,8 @@ def zoe_configuration():
     zoe_api_args.dbuser = 'zoeuser'
     zoe_api_args.dbpass = 'zoepass'
     zoe_api_args.dbname = 'zoe'
+    zoe_api_args.dbpool_min = 1
+    zoe_api_args.dbpool_max = 0
     zoe_api_args.api_listen_uri = 'tcp://*:4850'
     zoe_api_args.kairosdb_enable = False
     zoe_api_args.workspace_base_path = '/tmp'
@@ -45,7 +47,14 @@ def zoe_configuration():
     zoe_api_args.auth_file = 'zoepass.csv'
     zoe_api_args.scheduler_class = 'ZoeElasticScheduler'
     zoe_api_args.scheduler_policy = 'FIFO'
+    zoe_api_args.placement_strategy = 'spread'
+    zoe_api_args.scheduler_preemption = False
+    zoe_api_args.scheduler_preemption_budget = 8
+    zoe_api_args.scheduler_fairshare_half_life = 86400
+    zoe_api_args.scheduler_fairshare_weights = {}
+    zoe_api_args.scheduler_dispatch_workers = 4
     zoe_api_args.backend = 'DockerEngine'
+    zoe_api_args.service_startup_workers = 8
     zoe_api_args.backend_docker_config_file = 'integration_tests/sample_docker.conf'
     zoe_api_args.zapp_shop_path = 'contrib/zapp-shop-sample'
     zoe_api_args.log_file = 'stderr'
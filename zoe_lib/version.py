@@ -18,4 +18,4 @@
 ZOE_VERSION = '2017.12'
 ZOE_API_VERSION = '0.7'
 ZOE_APPLICATION_FORMAT_VERSION = 3
-SQL_SCHEMA_VERSION = 6  # ---> Increment this value every time the SQL schema changes !!! <---
+SQL_SCHEMA_VERSION = 7  # ---> Increment this value every time the SQL schema changes and add a migration in zoe_lib/state/migrations.py !!! <---
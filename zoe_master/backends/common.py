@@ -50,7 +50,7 @@ def gen_environment(execution: Execution, service: Service, env_subst_dict: Dict
 
 def gen_volumes(service: Service, execution: Execution) -> List[VolumeDescription]:
     """Return the list of default volumes to be added to all containers."""
-    vol_list = service.volumes
+    vol_list = list(service.volumes)  # do not modify the list held by the service record
 
     fswk = ZoeFSWorkspace()
     wk_vol = fswk.get(execution.user_id)
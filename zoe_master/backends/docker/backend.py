@@ -185,6 +185,7 @@ class DockerEngineBackend(zoe_master.backends.base.BaseBackend):
                 continue
             else:
                 one_success = True
+                _checker.image_pulled(host_conf.name, image_name)
             log.debug('Image {} pre-loaded on host {} in {:.2f}s'.format(image_name, host_conf.name, time.time() - time_start))
         if not one_success:
             raise ZoeException('Cannot pull image {}'.format(image_name))
@@ -226,7 +227,7 @@ class DockerEngineBackend(zoe_master.backends.base.BaseBackend):
                 cores = info['NCPU']
             if memory is not None and memory > info['MemTotal']:
                 memory = info['MemTotal']
-            cpu_quota = int(cores * 100000)
+            cpu_quota = int(cores * 100000) if cores is not None else None
             engine.update(service.backend_id, cpu_quota=cpu_quota, mem_reservation=memory)
         else:
             log.error('Cannot update service {} ({}), since it has no backend ID'.format(service.name, service.id))
@@ -15,6 +15,7 @@
 
 """Monitor for the Swarm event stream."""
 
+from copy import copy
 import logging
 import threading
 import time
@@ -29,6 +30,18 @@ from zoe_master.stats import NodeStats
 log = logging.getLogger(__name__)
 
 CHECK_INTERVAL = 10
+IMAGE_REFRESH_INTERVAL = 60  # seconds between two refreshes of the list of images available on a host
+
+
+def available_image_names(engine: DockerClient):
+    """The names of the images available on a Docker engine, names with the latest tag are also listed without tag."""
+    names = set()
+    for dk_image in engine.list_images():
+        for name in dk_image.tags:
+            names.add(name)
+            if name.endswith(':latest'):
+                names.add(name[:-7])
+    return frozenset(names)
 
 
 class DockerStateSynchronizer(threading.Thread):
@@ -42,7 +55,9 @@ class DockerStateSynchronizer(threading.Thread):
         self.state = state
         self.setDaemon(True)
         self.host_checkers = []
-        self.host_stats = {}
+        self.host_stats = {}  # host name -> NodeStats, replaced with a new object at every update
+        self.host_images = {}  # host name -> frozenset of image names
+        self.images_lock = threading.Lock()
         for docker_host in DockerConfig(get_conf().backend_docker_config_file).read_config():
             th = threading.Thread(target=self._host_subthread, args=(docker_host,), name='synchro_' + docker_host.name, daemon=True)
             th.start()
@@ -54,51 +69,63 @@ class DockerStateSynchronizer(threading.Thread):
         log.info("Synchro thread for host {} started".format(host_config.name))
 
         self.host_stats[host_config.name] = NodeStats(host_config.name)
+        last_image_refresh = 0
 
         while True:
             time_start = time.time()
+            # Copy-on-write: readers always see a complete NodeStats object, the new one is published at the end of the pass
+            node_stats = copy(self.host_stats[host_config.name])
+            node_stats.timestamp = time_start
             try:
                 my_engine = DockerClient(host_config)
                 container_list = my_engine.list(only_label={'zoe_deployment_name': get_conf().deployment_name})
                 info = my_engine.info()
+                if time_start - last_image_refresh > IMAGE_REFRESH_INTERVAL:
+                    self._set_images(host_config.name, available_image_names(my_engine))
+                    last_image_refresh = time_start
             except ZoeException as e:
-                self.host_stats[host_config.name].status = 'offline'
+                node_stats.status = 'offline'
                 log.error(str(e))
                 log.info('Node {} is offline'.format(host_config.name))
             else:
-                if self.host_stats[host_config.name].status == 'offline':
+                if node_stats.status == 'offline':
                     log.info('Node {} is now online'.format(host_config.name))
-                    self.host_stats[host_config.name].status = 'online'
+                    node_stats.status = 'online'
 
-                self.host_stats[host_config.name].container_count = info['Containers']
-                self.host_stats[host_config.name].cores_total = info['NCPU']
-                self.host_stats[host_config.name].memory_total = info['MemTotal']
-                self.host_stats[host_config.name].labels = host_config.labels
+                node_stats.container_count = info['Containers']
+                node_stats.cores_total = info['NCPU']
+                node_stats.memory_total = info['MemTotal']
+                node_stats.labels = set(host_config.labels)
                 if info['Labels'] is not None:
-                    self.host_stats[host_config.name].labels += set(info['Labels'])
+                    node_stats.labels |= set(info['Labels'])
 
-                self.host_stats[host_config.name].memory_allocated = sum([cont['memory_soft_limit'] for cont in container_list if cont['memory_soft_limit'] != info['MemTotal']])
-                self.host_stats[host_config.name].cores_allocated = sum([cont['cpu_quota'] / cont['cpu_period'] for cont in container_list if cont['cpu_period'] != 0])
+                node_stats.memory_allocated = sum([cont['memory_soft_limit'] for cont in container_list if cont['memory_soft_limit'] != info['MemTotal']])
+                node_stats.cores_allocated = sum([cont['cpu_quota'] / cont['cpu_period'] for cont in container_list if cont['cpu_period'] != 0])
 
                 stats = {}
-                self.host_stats[host_config.name].memory_reserved = 0
-                self.host_stats[host_config.name].cores_reserved = 0
-                for cont in container_list:
-                    service = self.state.services.select(only_one=True, backend_host=host_config.name, backend_id=cont['id'])
-                    if service is None:
-                        log.warning('Container {} on host {} has no corresponding service'.format(cont['name'], host_config.name))
-                        if cont['state'] == Service.BACKEND_DIE_STATUS:
-                            log.warning('Terminating dead and orphan container {}'.format(cont['name']))
-                            my_engine.terminate_container(cont['id'], delete=True)
-                        continue
-                    self._update_service_status(service, cont)
-                    self.host_stats[host_config.name].memory_reserved += service.resource_reservation.memory.min
-                    self.host_stats[host_config.name].cores_reserved += service.resource_reservation.cores.min
-                    stats[service.id] = {
-                        'core_limit': cont['cpu_quota'] / cont['cpu_period'],
-                        'mem_limit': cont['memory_soft_limit']
-                    }
-                self.host_stats[host_config.name].service_stats = stats
+                node_stats.memory_reserved = 0
+                node_stats.cores_reserved = 0
+                with self.state.transaction():
+                    for cont in container_list:
+                        service = self.state.services.select(only_one=True, backend_host=host_config.name, backend_id=cont['id'])
+                        if service is None:
+                            log.warning('Container {} on host {} has no corresponding service'.format(cont['name'], host_config.name))
+                            if cont['state'] == Service.BACKEND_DIE_STATUS:
+                                log.warning('Terminating dead and orphan container {}'.format(cont['name']))
+                                my_engine.terminate_container(cont['id'], delete=True)
+                            continue
+                        self._update_service_status(service, cont)
+                        node_stats.memory_reserved += service.resource_reservation.memory.min
+                        node_stats.cores_reserved += service.resource_reservation.cores.min
+                        stats[service.id] = {
+                            'core_limit': cont['cpu_quota'] / cont['cpu_period'],
+                            'mem_limit': cont['memory_soft_limit']
+                        }
+                node_stats.service_stats = stats
+
+            with self.images_lock:
+                node_stats.images = self.host_images.get(host_config.name)
+                self.host_stats[host_config.name] = node_stats
 
             sleep_time = CHECK_INTERVAL - (time.time() - time_start)
             if sleep_time <= 0:
@@ -109,6 +136,24 @@ class DockerStateSynchronizer(threading.Thread):
 
         log.info("Synchro thread for host {} stopped".format(host_config.name))
 
+    def _set_images(self, host_name, images):
+        """Replace the set of images available on a host, publishing a new NodeStats object."""
+        with self.images_lock:
+            self.host_images[host_name] = images
+            if host_name in self.host_stats:
+                node_stats = copy(self.host_stats[host_name])
+                node_stats.images = images
+                self.host_stats[host_name] = node_stats
+
+    def image_pulled(self, host_name, image_name):
+        """An image has been pulled on a host, make it visible to the scheduler without waiting for the next image refresh."""
+        with self.images_lock:
+            images = self.host_images.get(host_name, frozenset())
+        names = {image_name}
+        if image_name.endswith(':latest'):
+            names.add(image_name[:-7])
+        self._set_images(host_name, images | names)
+
     def _update_service_status(self, service: Service, container):
         """Update the service status."""
         if service.backend_status != container['state']:
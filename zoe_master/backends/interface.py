@@ -15,6 +15,8 @@
 
 """The high-level interface that Zoe uses to talk to the configured container backend."""
 
+from concurrent.futures import ThreadPoolExecutor, wait
+import itertools
 import logging
 import time
 from typing import List
@@ -44,6 +46,13 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+_registered_backends = {}  # name -> back-end class, for back-ends that are not part of a Zoe deployment
+
+
+def register_backend(name, backend_class):
+    """Make an additional back-end selectable with the backend option, used by the offline scheduler simulator."""
+    _registered_backends[name] = backend_class
+
 
 def _get_backend() -> BaseBackend:
     """Return the right backend instance by reading the global configuration."""
@@ -60,6 +69,8 @@ def _get_backend() -> BaseBackend:
         if DockerEngineBackend is None:
             raise ZoeException('The Docker Engine backend requires docker python version >= 2.0.2')
         return DockerEngineBackend(get_conf())
+    elif backend_name in _registered_backends:
+        return _registered_backends[backend_name](get_conf())
     else:
         log.error('Unknown backend selected')
         assert False
@@ -77,6 +88,66 @@ def shutdown_backend():
     backend.shutdown()
 
 
+def _service_started(execution: Execution, service: Service, instance: ServiceInstance, future, result) -> str:
+    """Record the outcome of the spawn of one service, return the result of its group updated with it."""
+    try:
+        backend_id, ip_address, ports = future.result()
+    except ZoeStartExecutionRetryException as ex:
+        log.warning('Temporary failure starting service {} of execution {}: {}'.format(service.id, execution.id, ex.message))
+        service.set_error(ex.message)
+        if result == "ok":
+            execution.set_error_message(ex.message)
+            result = "requeue"
+    except ZoeStartExecutionFatalException as ex:
+        log.error('Fatal error trying to start service {} of execution {}: {}'.format(service.id, execution.id, ex.message))
+        service.set_error(ex.message)
+        if result != "fatal":
+            execution.set_error_message(ex.message)
+            result = "fatal"
+    except Exception as ex:
+        log.error('Fatal error trying to start service {} of execution {}'.format(service.id, execution.id))
+        log.exception('BUG, this error should have been caught earlier')
+        if result != "fatal":
+            execution.set_error_message(str(ex))
+            result = "fatal"
+    else:
+        log.debug('Service {} started'.format(instance.name))
+        service.set_active(backend_id, ip_address, ports)
+    return result
+
+
+def _start_service_group(execution: Execution, service_group: List[Service], env_subst_dict, placement, backend: BaseBackend, pool: ThreadPoolExecutor) -> str:
+    """Spawn a group of services in parallel and wait for all of them, return one of 'ok', 'requeue' and 'fatal' like service_list_to_containers()."""
+    with execution.sql_manager.transaction():
+        instances = []
+        for service in service_group:
+            env_subst_dict['dns_name#self'] = service.dns_name
+            if placement is not None:
+                service.assign_backend_host(placement[service.id])
+            service.set_starting()
+            instances.append(ServiceInstance(execution, service, env_subst_dict))
+
+    futures = [pool.submit(backend.spawn_service, instance) for instance in instances]
+    wait(futures)
+
+    # State changes are written by this thread only, in a single transaction once the whole group has been spawned, so
+    # that the transaction does not keep the DB connection while the back-end is working
+    result = "ok"
+    with execution.sql_manager.transaction():
+        for service, instance, future in zip(service_group, instances, futures):
+            result = _service_started(execution, service, instance, future, result)
+
+        # The services of the group that did start are active at this point, so they are cleaned up too
+        if result != "ok":
+            terminate_execution(execution)
+            if result == "requeue":
+                execution.set_scheduled()
+            else:
+                execution.set_error()
+
+    return result
+
+
 def service_list_to_containers(execution: Execution, service_list: List[Service], placement=None) -> str:
     """Given a subset of services from an execution, tries to start them, return one of 'ok', 'requeue' for temporary failures and 'fatal' for fatal failures."""
     backend = _get_backend()
@@ -93,38 +164,13 @@ def service_list_to_containers(execution: Execution, service_list: List[Service]
     for service in execution.services:
         env_subst_dict['dns_name#' + service.name] = service.dns_name
 
-    for service in ordered_service_list:
-        env_subst_dict['dns_name#self'] = service.dns_name
-        if placement is not None:
-            service.assign_backend_host(placement[service.id])
-        service.set_starting()
-        instance = ServiceInstance(execution, service, env_subst_dict)
-        try:
-            backend_id, ip_address, ports = backend.spawn_service(instance)
-        except ZoeStartExecutionRetryException as ex:
-            log.warning('Temporary failure starting service {} of execution {}: {}'.format(service.id, execution.id, ex.message))
-            service.set_error(ex.message)
-            execution.set_error_message(ex.message)
-            terminate_execution(execution)
-            execution.set_scheduled()
-            return "requeue"
-        except ZoeStartExecutionFatalException as ex:
-            log.error('Fatal error trying to start service {} of execution {}: {}'.format(service.id, execution.id, ex.message))
-            service.set_error(ex.message)
-            execution.set_error_message(ex.message)
-            terminate_execution(execution)
-            execution.set_error()
-            return "fatal"
-        except Exception as ex:
-            log.error('Fatal error trying to start service {} of execution {}'.format(service.id, execution.id))
-            log.exception('BUG, this error should have been caught earlier')
-            execution.set_error_message(str(ex))
-            terminate_execution(execution)
-            execution.set_error()
-            return "fatal"
-        else:
-            log.debug('Service {} started'.format(instance.name))
-            service.set_active(backend_id, ip_address, ports)
+    # Services with the same startup order are spawned concurrently, each group starts only after the previous one is up
+    service_groups = [list(group) for _, group in itertools.groupby(ordered_service_list, key=lambda x: x.startup_order)]
+    with ThreadPoolExecutor(max_workers=max(1, min(get_conf().service_startup_workers, len(ordered_service_list)))) as pool:
+        for service_group in service_groups:
+            result = _start_service_group(execution, service_group, env_subst_dict, placement, backend, pool)
+            if result != "ok":
+                return result
 
     return "ok"
 
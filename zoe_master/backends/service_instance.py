@@ -18,6 +18,7 @@
 import collections
 
 from zoe_lib.state import Service, Execution
+from zoe_lib.state.service import ResourceLimits
 from zoe_lib.config import get_conf
 import zoe_master.backends.common
 
@@ -34,16 +35,12 @@ class ServiceInstance:
         if service.resource_reservation.memory.min is None:
             self.memory_limit = None
         else:
-            self.memory_limit = service.resource_reservation.memory
-            if self.memory_limit.max > get_conf().max_memory_limit * (1024 ** 3):
-                self.memory_limit.max = get_conf().max_memory_limit * (1024 ** 3)
+            self.memory_limit = self._clamp(service.resource_reservation.memory, get_conf().max_memory_limit * (1024 ** 3))
 
         if service.resource_reservation.cores.min is None:
             self.core_limit = None
         else:
-            self.core_limit = service.resource_reservation.cores
-            if self.core_limit.max > get_conf().max_core_limit:
-                self.core_limit = get_conf().max_core_limit
+            self.core_limit = self._clamp(service.resource_reservation.cores, get_conf().max_core_limit)
 
         self.labels = {
             'zoe.execution.name': execution.name,
@@ -73,3 +70,8 @@ class ServiceInstance:
         self.ports = []
         for port in service.ports:
             self.ports.append(BackendPort(port.internal_number, port.protocol))
+
+    @staticmethod
+    def _clamp(limits: ResourceLimits, highest) -> ResourceLimits:
+        """A copy of limits with the maximum lowered to highest, the reservation of the service is shared with the state cache."""
+        return ResourceLimits({'min': limits.min, 'max': min(limits.max, highest)}, limits.unit)
@@ -0,0 +1,162 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Zoe backend that keeps containers in memory, used by the offline scheduler simulator."""
+
+import itertools
+import logging
+import threading
+
+from zoe_lib.state import Service
+import zoe_master.backends.base
+from zoe_master.backends.service_instance import ServiceInstance
+from zoe_master.exceptions import ZoeStartExecutionRetryException, ZoeStartExecutionFatalException, ZoeException
+from zoe_master.stats import ClusterStats, NodeStats
+
+log = logging.getLogger(__name__)
+
+# This module-level variable holds the simulated cluster, it is set by the simulator with set_cluster()
+_cluster = None
+
+
+class SimulatedCluster:
+    """
+    The nodes of a simulated cluster and the containers running on them.
+
+    Containers reserve the minimum memory and cores of their service, like the real back-ends do with soft limits.
+    """
+    def __init__(self, images=None):
+        self.nodes = {}  # node name -> {'cores': total cores, 'memory': total memory, 'labels': set of labels}
+        self.containers = {}  # backend ID -> {'host': node name, 'memory': reserved memory, 'cores': reserved cores, 'core_limit': cores}
+        self.images = set(images) if images is not None else set()
+        self.lock = threading.Lock()
+        self._next_id = itertools.count(1)
+
+    def add_node(self, name, cores, memory, labels=()):
+        """Add a node, memory is in bytes."""
+        self.nodes[name] = {'cores': cores, 'memory': memory, 'labels': set(labels)}
+
+    def reserved(self, host):
+        """The memory and cores reserved by the containers running on a node."""
+        memory = sum(cont['memory'] for cont in self.containers.values() if cont['host'] == host)
+        cores = sum(cont['cores'] for cont in self.containers.values() if cont['host'] == host)
+        return memory, cores
+
+    def total_reserved(self):
+        """The memory and cores reserved by all containers."""
+        return sum(cont['memory'] for cont in self.containers.values()), sum(cont['cores'] for cont in self.containers.values())
+
+    def total_capacity(self):
+        """The memory and cores of all nodes."""
+        return sum(node['memory'] for node in self.nodes.values()), sum(node['cores'] for node in self.nodes.values())
+
+    def spawn(self, host, memory, cores):
+        """Start a container, returns its backend ID or None if it does not fit on the node."""
+        with self.lock:
+            node = self.nodes[host]
+            memory_reserved, cores_reserved = self.reserved(host)
+            if memory_reserved + memory > node['memory'] or cores_reserved + cores > node['cores']:
+                return None
+            backend_id = 'simulated-{}'.format(next(self._next_id))
+            self.containers[backend_id] = {'host': host, 'memory': memory, 'cores': cores, 'core_limit': cores}
+            return backend_id
+
+    def terminate(self, backend_id):
+        """Remove a container."""
+        with self.lock:
+            self.containers.pop(backend_id, None)
+
+    def node_stats(self, name) -> NodeStats:
+        """A new NodeStats object for a node."""
+        node = self.nodes[name]
+        stats = NodeStats(name)
+        stats.status = 'online'
+        stats.labels = node['labels']
+        stats.cores_total = node['cores']
+        stats.memory_total = node['memory']
+        with self.lock:
+            stats.container_count = len([cont for cont in self.containers.values() if cont['host'] == name])
+            stats.memory_reserved, stats.cores_reserved = self.reserved(name)
+        return stats
+
+
+def set_cluster(cluster: SimulatedCluster):
+    """Set the cluster used by all instances of the simulated back-end."""
+    global _cluster
+    _cluster = cluster
+
+
+def get_cluster() -> SimulatedCluster:
+    """Return the simulated cluster."""
+    return _cluster
+
+
+class SimulatedBackend(zoe_master.backends.base.BaseBackend):
+    """Zoe back-end implementation that simulates a cluster in memory, containers start immediately and never fail."""
+    def __init__(self, opts):
+        super().__init__(opts)
+        if _cluster is None:
+            raise ZoeException('The simulated back-end can only be used by the scheduler simulator')
+
+    @classmethod
+    def init(cls, state):
+        """The simulated cluster is created by the simulator, there is nothing to initialize."""
+
+    @classmethod
+    def shutdown(cls):
+        """There are no threads to stop."""
+
+    def spawn_service(self, service_instance: ServiceInstance):
+        """Create a container on the node chosen by the scheduler."""
+        if service_instance.backend_host not in _cluster.nodes:
+            raise ZoeStartExecutionFatalException('Unknown node {} for service {}'.format(service_instance.backend_host, service_instance.name))
+        memory = service_instance.memory_limit.min if service_instance.memory_limit is not None else 0
+        cores = service_instance.core_limit.min if service_instance.core_limit is not None else 0
+        backend_id = _cluster.spawn(service_instance.backend_host, memory, cores)
+        if backend_id is None:
+            raise ZoeStartExecutionRetryException('Not enough free resources to satisfy reservation request for service {}'.format(service_instance.name))
+        return backend_id, None, {}
+
+    def terminate_service(self, service: Service) -> None:
+        """Remove the container of a service."""
+        if service.backend_id is not None:
+            _cluster.terminate(service.backend_id)
+        service.set_backend_status(service.BACKEND_DESTROY_STATUS)
+
+    def platform_state(self) -> ClusterStats:
+        """Get the platform state."""
+        platform_stats = ClusterStats()
+        for name in _cluster.nodes:
+            platform_stats.nodes.append(_cluster.node_stats(name))
+        return platform_stats
+
+    def preload_image(self, image_name: str) -> None:
+        """All nodes have all images."""
+        _cluster.images.add(image_name)
+
+    def update_service(self, service, cores=None, memory=None):
+        """Record the new core limit, memory limits are not simulated."""
+        with _cluster.lock:
+            container = _cluster.containers.get(service.backend_id)
+            if container is not None and cores is not None:
+                container['core_limit'] = cores
+
+    def node_list(self):
+        """List node names."""
+        return list(_cluster.nodes.keys())
+
+    def list_available_images(self, node_name):
+        """List the images available on the specified node."""
+        return [{'id': name, 'size': 0, 'names': [name]} for name in _cluster.images]
@@ -71,15 +71,16 @@ class SwarmStateSynchronizer(threading.Thread):
             for serv in service_list:
                 services[serv.backend_id] = serv
 
-            for service in service_list:
-                assert isinstance(service, Service)
-                if service.backend_id in containers:
-                    self._update_service_status(service, containers[service.backend_id])
-                else:
-                    if service.backend_status == service.BACKEND_DESTROY_STATUS:
-                        continue
+            with self.state.transaction():
+                for service in service_list:
+                    assert isinstance(service, Service)
+                    if service.backend_id in containers:
+                        self._update_service_status(service, containers[service.backend_id])
                     else:
-                        service.set_backend_status(service.BACKEND_DESTROY_STATUS)
+                        if service.backend_status == service.BACKEND_DESTROY_STATUS:
+                            continue
+                        else:
+                            service.set_backend_status(service.BACKEND_DESTROY_STATUS)
 
             time.sleep(CHECK_INTERVAL)
 
@@ -0,0 +1,145 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the start of groups of services in the back-end interface."""
+
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import copy
+import json
+import threading
+import time
+
+import pytest
+
+from zoe_lib.config import load_configuration
+from zoe_lib.state import Execution, Service
+from zoe_lib.tests.config_mock import zoe_configuration  # pylint: disable=unused-import
+from zoe_master.backends.base import BaseBackend
+from zoe_master.backends.interface import _start_service_group, register_backend
+from zoe_master.exceptions import ZoeStartExecutionFatalException, ZoeStartExecutionRetryException
+from zoe_master.simulator.state import MemoryStateManager
+
+
+class MockStateManager(MemoryStateManager):
+    """In-memory state that counts the transactions open at any time, in all threads."""
+    def __init__(self):
+        super().__init__()
+        self.open_transactions = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self._lock:
+            self.open_transactions += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.open_transactions -= 1
+
+
+class StubBackend(BaseBackend):  # pylint: disable=abstract-method
+    """A back-end that starts services successfully or fails with the exception given for their name."""
+    def __init__(self, state, failures=None):
+        super().__init__(None)
+        self.state = state
+        self.failures = failures if failures is not None else {}
+        self.transactions_during_spawn = []
+        self.terminated = []
+
+    def spawn_service(self, service_instance):
+        time.sleep(0.05)
+        self.transactions_during_spawn.append(self.state.open_transactions)
+        if service_instance.name in self.failures:
+            raise self.failures[service_instance.name]
+        return 'id-' + service_instance.name, '10.0.0.1', {}
+
+    def terminate_service(self, service):
+        self.terminated.append(service.name)
+
+
+def _execution(state, count):
+    """An execution with count copies of the service of the integration test ZApp."""
+    with open('integration_tests/zapp.json', 'r') as zapp_file:
+        description = json.load(zapp_file)
+    service_description = copy.deepcopy(description['services'][0])
+    service_description['resources']['cores'] = {'min': 1, 'max': 1}
+    execution_id = state.executions.insert('test', 'user', description)
+    services = [('nginx{}'.format(count), 'nginx', service_description, True) for count in range(count)]
+    state.services.insert_many(execution_id, services)
+    return state.executions.records[execution_id]
+
+
+def _env(execution):
+    env_subst_dict = {'execution_id': execution.id, 'execution_name': execution.name, 'user_name': execution.user_id, 'deployment_name': 'test'}
+    for service in execution.services:
+        env_subst_dict['dns_name#' + service.name] = service.dns_name
+    return env_subst_dict
+
+
+class TestStartServiceGroup:
+    """Spawning the services of a group in parallel and recording the outcome."""
+
+    @pytest.fixture(autouse=True)
+    def mock_config(self, zoe_configuration):  # pylint: disable=redefined-outer-name
+        """Fixture for mock config method."""
+        zoe_configuration.max_core_limit = 2
+        zoe_configuration.max_memory_limit = 64
+        zoe_configuration.additional_volumes = []
+        zoe_configuration.proxy_path = '127.0.0.1'
+        zoe_configuration.backend = 'Stub'
+        load_configuration(zoe_configuration)
+
+    @staticmethod
+    def _start(count, failures=None):
+        """Start a group of count services, failures maps the index of a service to the exception raised by its spawn."""
+        state = MockStateManager()
+        execution = _execution(state, count)
+        failures = failures if failures is not None else {}
+        backend = StubBackend(state, dict((execution.services[index].unique_name, ex) for index, ex in failures.items()))
+        register_backend('Stub', lambda conf: backend)
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            result = _start_service_group(execution, execution.services, _env(execution), None, backend, pool)
+        return result, execution, backend
+
+    def test_spawn_outside_transaction(self):
+        """The outcomes are written in a transaction opened once all services have been spawned."""
+        result, execution, backend = self._start(3)
+        assert result == 'ok'
+        assert backend.transactions_during_spawn == [0, 0, 0]
+        assert all(service.status == Service.ACTIVE_STATUS for service in execution.services)
+        assert all(service.backend_id == 'id-' + service.unique_name for service in execution.services)
+        assert backend.state.open_transactions == 0
+        assert len(backend.terminated) == 0
+
+    def test_requeue(self):
+        """A temporary failure puts the execution back in the queue, the services of the group that started are terminated."""
+        result, execution, backend = self._start(3, {1: ZoeStartExecutionRetryException('no room')})
+        assert result == 'requeue'
+        assert execution.status == Execution.SCHEDULED_STATUS
+        assert execution.error_message == 'no room'
+        assert sorted(backend.terminated) == sorted(service.name for service in execution.services)
+        assert [service.status for service in execution.services] == [Service.INACTIVE_STATUS, Service.ERROR_STATUS, Service.INACTIVE_STATUS]
+
+    def test_fatal(self):
+        """A fatal failure wins over a temporary one and the execution ends in error."""
+        failures = {0: ZoeStartExecutionRetryException('no room'), 2: ZoeStartExecutionFatalException('no such image')}
+        result, execution, backend = self._start(3, failures)
+        assert result == 'fatal'
+        assert execution.status == Execution.ERROR_STATUS
+        assert execution.error_message == 'no such image'
+        assert sorted(backend.terminated) == sorted(service.name for service in execution.services)
+        assert execution.services[1].status == Service.INACTIVE_STATUS
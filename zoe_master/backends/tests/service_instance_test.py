@@ -0,0 +1,72 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the ServiceInstance class."""
+
+import copy
+import json
+
+import pytest
+
+from zoe_lib.config import load_configuration
+from zoe_lib.tests.config_mock import zoe_configuration  # pylint: disable=unused-import
+from zoe_master.backends.service_instance import ServiceInstance, BackendPort
+from zoe_master.simulator.state import MemoryStateManager
+
+
+class TestServiceInstance:
+    """Translation of a service into the description of its container."""
+
+    @pytest.fixture(autouse=True)
+    def mock_config(self, zoe_configuration):  # pylint: disable=redefined-outer-name
+        """Fixture for mock config method."""
+        zoe_configuration.max_core_limit = 2
+        zoe_configuration.max_memory_limit = 64
+        zoe_configuration.additional_volumes = []
+        zoe_configuration.proxy_path = '127.0.0.1'
+        load_configuration(zoe_configuration)
+
+    @staticmethod
+    def _service(state):
+        """The first service of the integration test ZApp, with 1 to 4 cores."""
+        with open('integration_tests/zapp.json', 'r') as zapp_file:
+            description = json.load(zapp_file)
+        service_description = copy.deepcopy(description['services'][0])
+        service_description['resources']['cores'] = {'min': 1, 'max': 4}
+        execution_id = state.executions.insert('test', 'user', description)
+        service_id = state.services.insert_many(execution_id, [('nginx0', 'nginx', service_description, True)])[0]
+        state.ports.insert_many([(service_id, '80/tcp', port) for port in service_description['ports']])
+        return state.executions.records[execution_id], state.services.records[service_id]
+
+    def test_attributes(self):
+        """The container gets the image, the ports and the limits of the service."""
+        state = MemoryStateManager()
+        execution, service = self._service(state)
+        instance = ServiceInstance(execution, service, {'dns_name#self': service.dns_name})
+        assert instance.name == service.unique_name
+        assert instance.image_name == 'nginx:alpine'
+        assert instance.ports == [BackendPort(80, 'tcp')]
+        assert instance.memory_limit.min == 536870912
+        assert instance.memory_limit.max == 536870912
+        assert instance.core_limit.min == 1
+        assert instance.core_limit.max == 2
+
+    def test_limits_not_shared(self):
+        """Clamping the limits to the configured maximum does not modify the reservation of the service."""
+        state = MemoryStateManager()
+        execution, service = self._service(state)
+        instance = ServiceInstance(execution, service, {'dns_name#self': service.dns_name})
+        assert instance.core_limit is not service.resource_reservation.cores
+        assert service.resource_reservation.cores.max == 4
@@ -62,7 +62,7 @@ def main(test_conf=None):
         return ret
 
     log.info("Initializing DB manager")
-    state = SQLManager(args)
+    state = SQLManager(args, cache=True)
 
     try:
         zoe_master.backends.interface.initialize_backend(state)
@@ -82,6 +82,7 @@ class APIManager:
                 execution = self.state.executions.select(id=exec_id, only_one=True)
                 if execution is not None:
                     zoe_master.preprocessing.execution_delete(execution)
+                    self.state.executions.evict(exec_id)  # the API process deletes the row
                 self._reply_ok()
             elif message['command'] == 'scheduler_stats':
                 try:
@@ -90,6 +91,8 @@ class APIManager:
                         data['platform_stats'] = {}
                     else:
                         data['platform_stats'] = self.metrics.current_stats.serialize()
+                    data['state_cache'] = self.state.cache.stats()
+                    data['state_queries'] = self.state.query_stats()
                 except ZoeException as e:
                     log.error(str(e))
                     self._reply_error(str(e))
@@ -18,7 +18,7 @@
 import time
 import logging
 import threading
-from copy import deepcopy
+from copy import copy
 
 from zoe_lib.config import get_conf
 from zoe_master.backends.interface import get_platform_state
@@ -43,6 +43,7 @@ class StatsManager(threading.Thread):
         self.deployment_name = get_conf().deployment_name
         self.stop = threading.Event()
         self._current_platform_stats = None
+        self._platform_stats_version = 0
         if get_conf().kairosdb_enable:
             self.usage_metrics = KairosDBInMetrics()
         else:
@@ -69,9 +70,12 @@ class StatsManager(threading.Thread):
         while True:
             time_start = time.time()
 
-            self._current_platform_stats = get_platform_state()
+            platform_stats = get_platform_state()
             if self.usage_metrics is not None:
-                for node in self._current_platform_stats.nodes:
+                # the node objects may be shared with the back-end, change only copies of them
+                platform_stats.nodes = [copy(node) for node in platform_stats.nodes]
+                for node in platform_stats.nodes:
+                    node.service_stats = dict((service_id, dict(stats)) for service_id, stats in node.service_stats.items())
                     node_cores = 0
                     node_memory = 0
                     for service_id in node.service_stats:
@@ -87,11 +91,15 @@ class StatsManager(threading.Thread):
                     node.cores_in_use = node_cores
                     node.memory_in_use = node_memory
 
+            self._platform_stats_version += 1
+            platform_stats.version = self._platform_stats_version
+            self._current_platform_stats = platform_stats
+
             sleep_time = METRIC_INTERVAL - (time.time() - time_start)
             if sleep_time > 0 and self.stop.wait(timeout=sleep_time):
                 break
 
     @property
     def current_stats(self):
-        """Returns a snapshot of the current metrics."""
-        return deepcopy(self._current_platform_stats)
+        """Returns a snapshot of the current metrics, it is shared by all callers and must not be modified."""
+        return self._current_platform_stats
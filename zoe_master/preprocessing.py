@@ -41,33 +41,19 @@ def _digest_application_description(state: SQLManager, execution: Execution):
             execution.set_error_message('image {} is not available'.format(service_descr['image']))
             return False
 
+    services = []
+    ports = []
     for service_descr in execution.description['services']:
         essential_count = service_descr['essential_count']
         total_count = service_descr['total_count']
-        elastic_count = total_count - essential_count
-        counter = 0
-        for service_n_ in range(essential_count):
+        for counter in range(total_count):
             name = "{}{}".format(service_descr['name'], counter)
-            sid = state.services.insert(execution.id, name, service_descr['name'], service_descr, True)
+            services.append((name, service_descr['name'], service_descr, counter < essential_count))
+            ports.append([(str(port_descr['port_number']) + '/' + port_descr['protocol'], port_descr) for port_descr in service_descr['ports']])
 
-            # Ports
-            for port_descr in service_descr['ports']:
-                port_internal = str(port_descr['port_number']) + '/' + port_descr['protocol']
-                state.ports.insert(sid, port_internal, port_descr)
-
-            counter += 1
-
-        for service_n_ in range(elastic_count):
-            name = "{}{}".format(service_descr['name'], counter)
-            sid = state.services.insert(execution.id, name, service_descr['name'], service_descr, False)
-
-            # Ports
-            for port_descr in service_descr['ports']:
-                port_internal = str(port_descr['port_number']) + '/' + port_descr['protocol']
-                state.ports.insert(sid, port_internal, port_descr)
-
-            counter += 1
-        assert counter == total_count
+    with state.transaction():
+        service_ids = state.services.insert_many(execution.id, services)
+        state.ports.insert_many([(sid, port_internal, port_descr) for sid, service_ports in zip(service_ids, ports) for port_internal, port_descr in service_ports])
 
     return True
 
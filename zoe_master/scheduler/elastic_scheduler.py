@@ -18,15 +18,20 @@ The Elastic scheduler is the implementation of the scheduling algorithm presente
 https://arxiv.org/abs/1611.09528
 """
 
-from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import datetime
 import logging
 import threading
 import time
+from typing import List
 
+from zoe_lib.config import get_conf
 from zoe_lib.state import Execution, SQLManager, Service  # pylint: disable=unused-import
 from zoe_master.exceptions import ZoeException
 
-from zoe_master.backends.interface import terminate_execution, start_elastic, start_essential, update_service_resource_limits
+from zoe_master.backends.interface import terminate_execution, terminate_service, start_elastic, start_essential, update_service_resource_limits
+from zoe_master.scheduler.execution_queue import ExecutionQueue, FairShareQueue
+from zoe_master.scheduler.fair_share import FairShareUsage
 from zoe_master.scheduler.simulated_platform import SimulatedPlatform
 from zoe_master.exceptions import UnsupportedSchedulerPolicyError
 from zoe_master.stats import NodeStats  # pylint: disable=unused-import
@@ -34,8 +39,38 @@ from zoe_master.metrics.base import StatsManager  # pylint: disable=unused-impor
 
 log = logging.getLogger(__name__)
 
-ExecutionProgress = namedtuple('ExecutionProgress', ['last_time_scheduled', 'progress_sequence'])
 SELF_TRIGGER_TIMEOUT = 60  # the scheduler will trigger itself periodically in case platform resources have changed outside its control
+BACKFILL_DEPTH = 50  # maximum number of executions a scheduler pass tries to backfill after the reserved one
+CORE_LIMIT_UPDATE_WORKERS = 8  # nodes whose resource limits are updated in parallel
+MEMORY_PRESSURE_THRESHOLD = 0.9  # services using more than this fraction of their memory soft limit get a higher limit
+MEMORY_IDLE_THRESHOLD = 0.5  # services using less than this fraction of their memory soft limit give memory back
+MEMORY_HEADROOM = 1.25  # new memory soft limits are the memory in use times this factor
+MEMORY_SAFETY_MARGIN = 0.05  # fraction of the memory of each node never given to soft limits above the reservations
+MEMORY_MIN_UPDATE = 64 * (1024 ** 2)  # smaller changes of a memory soft limit are not sent to the back-end
+
+
+class ExecutionProgress:
+    """Progress of a queued execution, used to compute its remaining size. The progress is kept as a running sum."""
+    __slots__ = ('last_time_scheduled', 'progress', 'services_count', 'size_hint', 'memory', 'start_time')
+
+    def __init__(self, execution: Execution):
+        self.last_time_scheduled = None  # when the progress was last accounted, None until the execution is dispatched
+        self.progress = 0  # fraction of the size hint completed while some services were running
+        self.services_count = execution.services_count  # the services of an execution are fixed, count them once
+        self.size_hint = execution.size  # the size from the description, the size of queued executions is replaced by their remaining size
+        self.memory = sum(service.resource_reservation.memory.min for service in execution.services)  # memory reserved by all services
+        self.start_time = None  # when the execution started running, measured with the clock of the scheduler
+
+
+class ExecutionDispatch:
+    """An execution whose services are being started by the dispatcher, with the placements decided by the scheduler."""
+    __slots__ = ('execution', 'reservations', 'future', 'terminated')
+
+    def __init__(self, execution, reservations, future):
+        self.execution = execution
+        self.reservations = reservations  # list of (service, node name) being started
+        self.future = future  # result of the start, one of 'ok', 'requeue' and 'fatal'
+        self.terminated = False  # termination was requested while the services were being started
 
 
 def catch_exceptions_and_retry(func):
@@ -54,44 +89,106 @@ def catch_exceptions_and_retry(func):
 
 
 class ZoeElasticScheduler:
-    """The Scheduler class for size-based scheduling. Policy can be "FIFO" or "SIZE"."""
-    def __init__(self, state: SQLManager, policy, metrics: StatsManager):
-        if policy != 'FIFO' and policy != 'SIZE':
+    """
+    The Scheduler class for size-based scheduling. Policy can be "FIFO", "SIZE", "BACKFILL" or "FAIRSHARE".
+
+    With the BACKFILL policy executions are considered in arrival order. When the first one does not fit, it gets a
+    reservation for the time at which enough memory is expected to be free, and the executions after it are started
+    only if they are expected to end before that time or if they use memory that will not be needed by the reserved
+    execution (EASY backfilling). The execution sizes are used as estimates of their run time. Reservations cover only
+    the essential services, elastic services are placed after backfilling, in queue order. Each pass tries to backfill
+    at most BACKFILL_DEPTH executions.
+
+    With the FAIRSHARE policy the users with the lowest decayed memory usage, divided by their weight, go first, and the
+    executions of each user are considered in arrival order.
+
+    The services of the executions chosen by a scheduler pass are started by a pool of dispatcher threads, so that the
+    scheduler can keep reacting to arrivals and terminations meanwhile. The result of each start is collected at the
+    beginning of the next pass.
+
+    With preemption enabled, an execution whose essential services do not fit can take the place of elastic services of
+    running executions with a lower priority, the executions that lose elastic services go back to the queue. Only the SIZE
+    and FAIRSHARE policies can give a queued execution priority over a running one, with the others preemption is disabled.
+
+    With threaded=False the scheduler and core limit threads are not started, services are started synchronously and
+    scheduler passes are run by calling schedule(), as done by the offline simulator. clock() returns the current time in
+    seconds, the simulator passes its virtual clock.
+    """
+    def __init__(self, state: SQLManager, policy, metrics: StatsManager, threaded=True, clock=time.time):
+        if policy not in ('FIFO', 'SIZE', 'BACKFILL', 'FAIRSHARE'):
             raise UnsupportedSchedulerPolicyError
         self.metrics = metrics
         self.trigger_semaphore = threading.Semaphore(0)
         self.policy = policy
-        self.queue = []
+        self.clock = clock
+        if policy == 'FAIRSHARE':
+            self.fair_share = FairShareUsage(get_conf().scheduler_fairshare_half_life, get_conf().scheduler_fairshare_weights, clock)
+            self.fair_share.load(state)
+            self.queue = FairShareQueue(self.fair_share.usage, self._expected_usage)
+        else:
+            self.fair_share = None
+            self.queue = ExecutionQueue(policy)
         self.queue_running = []
         self.additional_exec_state = {}
         self.async_threads = []
+        self.dispatching = {}  # execution ID -> ExecutionDispatch
+        self.dispatch_lock = threading.Lock()  # protects dispatching and the moves of executions between the queues
+        self.node_checks = 0  # node checks done by the placement simulation during the last scheduler pass
+        self.preemption = get_conf().scheduler_preemption
+        if self.preemption and policy in ('FIFO', 'BACKFILL'):
+            # executions are ordered by arrival, those already running always come before the queued ones
+            log.warning('Preemption has no effect with the {} policy, disabling it'.format(policy))
+            self.preemption = False
+        self.preemption_budget = get_conf().scheduler_preemption_budget  # elastic services that can be preempted in one scheduler pass
+        self.preempted_services = 0
         self.loop_quit = False
         self.loop_th = threading.Thread(target=self.loop_start_th, name='scheduler')
         self.core_limit_recalc_trigger = threading.Event()
-        self.core_limit_th = threading.Thread(target=self._adjust_core_limits, name='adjust_core_limits')
+        self.core_limit_lock = threading.Lock()
+        self.core_limit_nodes = None  # names of the nodes whose core limits need to be recomputed, None for all nodes
+        self.applied_core_limits = {}  # node name -> {(service ID, backend ID): core limit set in the back-end}
+        self.applied_memory_limits = {}  # node name -> {(service ID, backend ID): memory soft limit set in the back-end}
+        self.limit_updates = {'cores_applied': 0, 'cores_skipped': 0, 'memory_applied': 0, 'memory_skipped': 0}
+        self.core_limit_th = threading.Thread(target=self._adjust_resource_limits, name='adjust_resource_limits')
         self.state = state
         for execution in self.state.executions.select(status='running'):
+            self.additional_exec_state[execution.id] = ExecutionProgress(execution)
+            if execution.time_start is not None:
+                self.additional_exec_state[execution.id].start_time = clock() - (datetime.datetime.utcnow() - execution.time_start).total_seconds()
+                self.additional_exec_state[execution.id].last_time_scheduled = self.additional_exec_state[execution.id].start_time
+            self._update_usage(execution)
             if execution.all_services_running:
                 self.queue_running.append(execution)
             else:
-                self.queue.append(execution)
-                self.additional_exec_state[execution.id] = ExecutionProgress(0, [])
-        self.loop_th.start()
-        self.core_limit_th.start()
+                self.queue.push(execution)
+        self.threaded = threaded
+        self.dispatcher = ThreadPoolExecutor(max_workers=get_conf().scheduler_dispatch_workers) if threaded else None
+        self.core_limit_updater = ThreadPoolExecutor(max_workers=CORE_LIMIT_UPDATE_WORKERS) if threaded else None
+        if threaded:
+            self.loop_th.start()
+            self.core_limit_th.start()
 
     def trigger(self):
         """Trigger a scheduler run."""
         self.trigger_semaphore.release()
 
+    def _trigger_resource_limits(self, node_names=None):
+        """Ask for the core and memory limits of the services running on some nodes to be recomputed, on all nodes if node_names is None."""
+        with self.core_limit_lock:
+            if node_names is None:
+                self.core_limit_nodes = None
+            elif self.core_limit_nodes is not None:
+                self.core_limit_nodes.update(node_names)
+        self.core_limit_recalc_trigger.set()
+
     def incoming(self, execution: Execution):
         """
         This method adds the execution to the end of the queue and triggers the scheduler.
         :param execution: The execution
         :return:
         """
-        exec_data = ExecutionProgress(0, [])
-        self.additional_exec_state[execution.id] = exec_data
-        self.queue.append(execution)
+        self.additional_exec_state[execution.id] = ExecutionProgress(execution)
+        self.queue.push(execution)
         self.trigger()
 
     def terminate(self, execution: Execution) -> None:
@@ -108,23 +205,29 @@ class ZoeElasticScheduler:
                 except ZoeException as ex:
                     log.error('Error in termination thread: {}'.format(ex))
                     return
+                self._trigger_resource_limits(set(service.backend_host for service in e.services if service.backend_host is not None))
                 self.trigger()
             log.debug('Execution {} terminated successfully'.format(e.id))
 
-        try:
-            self.queue.remove(execution)
-        except ValueError:
+        with self.dispatch_lock:  # executions are moved between the queues holding this lock
             try:
-                self.queue_running.remove(execution)
+                self.queue.remove(execution)
             except ValueError:
-                log.error('Cannot terminate execution {}, it is not in any queue'.format(execution.id))
-                return
+                try:
+                    self.queue_running.remove(execution)
+                except ValueError:
+                    dispatch = self.dispatching.get(execution.id)
+                    if dispatch is None:
+                        log.error('Cannot terminate execution {}, it is not in any queue'.format(execution.id))
+                        return
+                    dispatch.terminated = True  # the termination thread waits for the dispatcher to release the termination lock
 
         try:
             del self.additional_exec_state[execution.id]
         except KeyError:
             pass
-        self.core_limit_recalc_trigger.set()
+        if self.fair_share is not None:
+            self.fair_share.set_reservation(execution, 0)
 
         th = threading.Thread(target=async_termination, name='termination_{}'.format(execution.id), args=(execution,))
         th.start()
@@ -142,22 +245,170 @@ class ZoeElasticScheduler:
                 self.async_threads.append(th)
             counter -= 1
 
+    def _priority(self, execution: Execution):
+        """Sort key of an execution with the scheduler policy, executions with smaller keys come first."""
+        if self.policy == 'SIZE':
+            return execution.size, execution.id
+        if self.policy == 'FAIRSHARE':
+            return self.fair_share.usage(execution.user_id), execution.id
+        return (execution.id,)
+
+    def _has_priority(self, execution: Execution, other: Execution) -> bool:
+        """True if execution comes before other with the scheduler policy."""
+        return self._priority(execution) < self._priority(other)
+
+    def _simulate_preemption(self, job: Execution, cluster_status_snapshot: SimulatedPlatform, preempted, budget):
+        """
+        Release elastic services of running executions with a lower priority than job, until its essential services fit.
+
+        Executions with the lowest priority lose their elastic services first. Returns the released services, an empty
+        list if job does not fit even after releasing budget services, in which case the snapshot is left unchanged.
+        """
+        victims = [execution for execution in self.queue_running if self._has_priority(job, execution)]
+        victims.sort(key=self._priority, reverse=True)
+        released = []
+        for victim in victims:
+            for service in reversed(victim.elastic_services):
+                if len(released) == budget:
+                    break
+                if service.status != Service.ACTIVE_STATUS or service.backend_status == Service.BACKEND_DIE_STATUS or service in preempted:
+                    continue
+                if not cluster_status_snapshot.release(service):
+                    continue
+                released.append(service)
+                if cluster_status_snapshot.allocate_essential(job):
+                    log.info('Execution {} can start by preempting {} elastic services'.format(job.id, len(released)))
+                    return released
+        for service in released:
+            cluster_status_snapshot.restore(service)
+        return []
+
+    def _preempt(self, services) -> bool:
+        """
+        Terminate preempted elastic services and put the executions they belong to back in the queue.
+
+        Nothing is preempted if one of the executions is being terminated: its services are not free yet, so the placements
+        computed assuming they were released cannot be used. Returns True if the services have been preempted.
+        """
+        victims = {}
+        for service in services:
+            victims.setdefault(service.execution_id, []).append(service)
+        with self.dispatch_lock:
+            locked = [execution for execution in self.queue_running if execution.id in victims and execution.termination_lock.acquire(blocking=False)]
+            if len(locked) < len(victims):
+                for victim in locked:
+                    victim.termination_lock.release()
+                return False
+            for victim in locked:
+                self.queue.push(victim)  # the preempted services will be started again when there is room for them
+                self.queue_running.remove(victim)
+        try:
+            for victim in locked:
+                for service in victims[victim.id]:
+                    log.info('Preempting elastic service {} ({}) of execution {}'.format(service.id, service.name, victim.id))
+                    terminate_service(service)
+                    self.preempted_services += 1
+                self._update_usage(victim)
+        finally:
+            for victim in locked:
+                victim.termination_lock.release()
+        self._trigger_resource_limits(set(service.backend_host for service in services))
+        return True
+
+    def _update_usage(self, execution: Execution):
+        """With the FAIRSHARE policy, account the memory reserved by the active services of execution to its user."""
+        if self.fair_share is not None:
+            self.fair_share.set_reservation(execution, self._reserved_memory(execution, {}))
+
+    def _expected_usage(self, execution: Execution):
+        """Usage an execution is expected to add to the usage of its user, divided by the user weight."""
+        return self.additional_exec_state[execution.id].memory * self._remaining_time(execution) / self.fair_share.weight(execution.user_id)
+
+    def _remaining_time(self, execution: Execution):
+        """Run time left to an execution, estimated from its size."""
+        exec_data = self.additional_exec_state.get(execution.id)
+        if exec_data is None:
+            return execution.size
+        if exec_data.start_time is None or not execution.is_running:
+            return exec_data.size_hint
+        return max(0, exec_data.size_hint - (self.clock() - exec_data.start_time))
+
+    def _essential_memory(self, execution: Execution):
+        """Memory reserved by the essential services of an execution."""
+        return sum(service.resource_reservation.memory.min for service in execution.essential_services)
+
+    def _reserved_memory(self, execution: Execution, placements):
+        """Memory reserved by the active services of an execution and by the ones placed by the current simulation."""
+        return sum(service.resource_reservation.memory.min for service in execution.services if service.status == Service.ACTIVE_STATUS or service.id in placements)
+
+    def _backfill_reservation(self, job: Execution, cluster_status_snapshot: SimulatedPlatform, jobs_to_launch):
+        """
+        Reserve the start of the first execution that does not fit, returns (shadow time, spare memory).
+
+        The shadow time is when the executions running or starting are expected to have freed enough memory for the
+        essential services of job, the spare memory is the memory that will be free at that time and that job does not
+        need. Memory is aggregated over all nodes.
+        """
+        needed = self._essential_memory(job)
+        available = cluster_status_snapshot.aggregated_free_memory()
+        placements = cluster_status_snapshot.get_service_allocation()
+        with self.dispatch_lock:
+            running = self.queue_running + [dispatch.execution for dispatch in self.dispatching.values()] + jobs_to_launch
+        shadow_time = 0
+        for end, memory in sorted((self._remaining_time(execution), self._reserved_memory(execution, placements)) for execution in running):
+            if available >= needed:
+                break
+            available += memory
+            shadow_time = end
+        if available < needed:  # it does not fit even with all running executions gone, do not hold the others back
+            return float('inf'), 0
+        log.debug('Execution {} reserved in {:.0f}s, with {} bytes of spare memory'.format(job.id, shadow_time, available - needed))
+        return shadow_time, available - needed
+
+    def _try_backfill(self, job: Execution, cluster_status_snapshot: SimulatedPlatform, shadow_time, spare_memory):
+        """
+        Try to place the essential services of job without delaying the reserved execution.
+
+        The elastic services of the executions to launch are removed from the snapshot while backfilling and put back
+        afterwards, in queue order. Returns the spare memory used by job, None if job cannot start.
+        """
+        if job.is_running:  # it is waiting only for elastic services
+            return 0
+        essential_memory = self._essential_memory(job)
+        ends_in_time = self._remaining_time(job) <= shadow_time
+        if essential_memory > cluster_status_snapshot.aggregated_free_memory() or (not ends_in_time and essential_memory > spare_memory):
+            return None
+        if not cluster_status_snapshot.allocate_essential(job):
+            return None
+        if ends_in_time:
+            log.debug('Backfilling execution {}, it should end before the reserved one starts'.format(job.id))
+            return 0
+        log.debug('Backfilling execution {} in the spare memory of the reservation'.format(job.id))
+        return essential_memory
+
+    def _execution_size(self, execution: Execution, now):
+        """
+        The remaining size of a queued execution, computed from its size hint and its progress.
+
+        The progress made since the last refresh is added to the running sum, with only some of its services running an
+        execution progresses proportionally slower.
+        """
+        exec_data = self.additional_exec_state[execution.id]
+        if exec_data.last_time_scheduled is not None:
+            running_services = execution.running_services_count
+            if running_services > 0 and exec_data.size_hint > 0:
+                exec_data.progress += (now - exec_data.last_time_scheduled) * running_services / (exec_data.services_count * exec_data.size_hint)
+            exec_data.last_time_scheduled = now
+        remaining_execution_time = max(0, 1 - exec_data.progress) * exec_data.size_hint
+        return remaining_execution_time * exec_data.services_count
+
     def _refresh_execution_sizes(self):
-        for execution in self.queue:  # type: Execution
-            exec_data = self.additional_exec_state[execution.id]
-            if exec_data.last_time_scheduled == 0:
-                progress = 0
-            else:
-                last_progress = (time.time() - exec_data.last_time_scheduled) / ((execution.services_count / execution.running_services_count) * execution.size)
-                exec_data.progress_sequence.append(last_progress)
-                progress = sum(exec_data.progress_sequence)
-            remaining_execution_time = (1 - progress) * execution.size
-            execution.size = remaining_execution_time * execution.services_count
+        now = self.clock()
+        self.queue.refresh(lambda execution: self._execution_size(execution, now))
 
     def _pop_all_with_same_size(self):
         out_list = []
-        while len(self.queue) > 0:
-            execution = self.queue.pop(0)  # type: Execution
+        for execution in self.queue.pop_all():  # type: Execution
             ret = execution.termination_lock.acquire(blocking=False)
             if ret and execution.status != Execution.TERMINATED_STATUS:
                 out_list.append(execution)
@@ -166,6 +417,69 @@ class ZoeElasticScheduler:
 
         return out_list
 
+    def _start_execution(self, job: Execution, placements):
+        """Start the services of an execution, runs in the dispatcher threads."""
+        if not job.essential_services_running:
+            ret = start_essential(job, placements)
+            if ret != "ok":
+                return ret
+            job.set_running()
+        start_elastic(job, placements)
+        return "ok"
+
+    def _dispatch(self, job: Execution, placements):
+        """Hand an execution to the dispatcher, its termination lock stays held until the result is collected."""
+        reservations = [(service, placements[service.id]) for service in job.services if service.id in placements]
+        exec_data = self.additional_exec_state.get(job.id)
+        if exec_data is not None and exec_data.last_time_scheduled is None:
+            exec_data.last_time_scheduled = self.clock()
+        if self.dispatcher is None:
+            future = Future()
+            try:
+                future.set_result(self._start_execution(job, placements))
+            except Exception as ex:  # pylint: disable=broad-except
+                future.set_exception(ex)
+        else:
+            future = self.dispatcher.submit(self._start_execution, job, placements)
+        with self.dispatch_lock:
+            self.dispatching[job.id] = ExecutionDispatch(job, reservations, future)
+        if self.dispatcher is not None:
+            future.add_done_callback(lambda f: self.trigger())
+
+    def _collect_dispatched(self):
+        """Move the executions whose start has completed to the running queue, or back to the queue if they did not start."""
+        requeued = []
+        with self.dispatch_lock:
+            completed = [d for d in self.dispatching.values() if d.future.done()]
+            for dispatch in completed:
+                job = dispatch.execution
+                del self.dispatching[job.id]
+                try:
+                    ret = dispatch.future.result()
+                except Exception:  # pylint: disable=broad-except
+                    log.exception('Unmanaged exception starting execution {}'.format(job.id))
+                    ret = "requeue"
+                if dispatch.terminated:
+                    log.debug('execution {} has been terminated while starting'.format(job.id))
+                    job.termination_lock.release()
+                    continue
+                self._update_usage(job)
+                exec_data = self.additional_exec_state.get(job.id)
+                if exec_data is not None and exec_data.start_time is None and job.is_running:
+                    exec_data.start_time = self.clock()
+                if ret == "fatal":
+                    pass  # trow away the execution
+                elif ret == "requeue" or not job.all_services_active:
+                    requeued.append(job)
+                else:
+                    log.debug('execution {}: all services are active'.format(job.id))
+                    self.queue_running.append(job)
+                job.termination_lock.release()
+            # put back ahead of the others with the same priority, as before they were popped
+            self.queue.push_front_all(requeued)
+        if len(completed) > 0:
+            self._trigger_resource_limits(set(node_name for dispatch in completed for _, node_name in dispatch.reservations))
+
     @catch_exceptions_and_retry
     def loop_start_th(self):
         """The Scheduler thread loop."""
@@ -178,164 +492,335 @@ class ZoeElasticScheduler:
                 if auto_trigger == 0:
                     auto_trigger = SELF_TRIGGER_TIMEOUT
                     self.trigger()
+                    self._trigger_resource_limits()
                 continue
             if self.loop_quit:
                 break
 
-            if len(self.queue) == 0:
-                log.debug("Scheduler loop has been triggered, but the queue is empty")
-                self.core_limit_recalc_trigger.set()
-                self._check_dead_services()
-                continue
-            log.debug("Scheduler loop has been triggered")
+            self.schedule()
+
+    def _simulate(self, jobs_to_attempt_scheduling, cluster_status_snapshot: SimulatedPlatform, preemption_budget):
+        """
+        Place the executions on a snapshot of the platform, in queue order.
 
-            while True:  # Inner loop will run until no new executions can be started or the queue is empty
-                self._refresh_execution_sizes()
+        Returns the executions to launch and the elastic services to preempt to make room for them.
+        """
+        jobs_to_launch = []
+        preempted = []  # elastic services to terminate to make room for the executions to launch
+        free_resources = cluster_status_snapshot.aggregated_free_memory()
+
+        # Try to find a placement solution using a snapshot of the platform status
+        for position, job in enumerate(jobs_to_attempt_scheduling):  # type: Execution
+            jobs_to_launch_copy = jobs_to_launch.copy()
+
+            # remove all elastic services from the previous simulation loop
+            for job_aux in jobs_to_launch:  # type: Execution
+                cluster_status_snapshot.deallocate_elastic(job_aux)
+
+            job_can_start = False
+            job_preempted = []
+            if not job.is_running:
+                job_can_start = cluster_status_snapshot.allocate_essential(job)
+                if not job_can_start and self.preemption and len(preempted) < preemption_budget:
+                    job_preempted = self._simulate_preemption(job, cluster_status_snapshot, preempted, preemption_budget - len(preempted))
+                    job_can_start = len(job_preempted) > 0
+                    preempted += job_preempted
+
+            if job_can_start or job.is_running:
+                jobs_to_launch.append(job)
+
+            # Try to put back the elastic services
+            for job_aux in jobs_to_launch:
+                cluster_status_snapshot.allocate_elastic(job_aux)
+
+            current_free_resources = cluster_status_snapshot.aggregated_free_memory()
+            if current_free_resources >= free_resources and len(job_preempted) == 0:
+                # undo the simulation of this job, so that the placements match the executions that will be launched
+                for job_aux in jobs_to_launch:
+                    cluster_status_snapshot.deallocate_elastic(job_aux)
+                if job_can_start:
+                    cluster_status_snapshot.deallocate_essential(job)
+                jobs_to_launch = jobs_to_launch_copy
+                for job_aux in jobs_to_launch:
+                    cluster_status_snapshot.allocate_elastic(job_aux)
+                if self.policy == 'BACKFILL':
+                    jobs_to_launch = self._backfill(job, jobs_to_attempt_scheduling[position + 1:], cluster_status_snapshot, jobs_to_launch)
+                break
+            free_resources = current_free_resources
+        return jobs_to_launch, preempted
 
-                if self.policy == "SIZE":
-                    self.queue.sort(key=lambda execution: execution.size)
+    def _backfill(self, reserved: Execution, candidates, cluster_status_snapshot: SimulatedPlatform, jobs_to_launch):
+        """
+        Reserve the start of the execution that does not fit and backfill at most BACKFILL_DEPTH of the candidates after it.
 
+        The elastic services of the executions to launch are removed while backfilling and put back afterwards, in queue
+        order. Returns the executions to launch.
+        """
+        shadow_time, spare_memory = self._backfill_reservation(reserved, cluster_status_snapshot, jobs_to_launch)
+        for job in jobs_to_launch:
+            cluster_status_snapshot.deallocate_elastic(job)
+        backfilled = list(jobs_to_launch)
+        for job in candidates[:BACKFILL_DEPTH]:
+            memory_used = self._try_backfill(job, cluster_status_snapshot, shadow_time, spare_memory)
+            if memory_used is not None:
+                spare_memory -= memory_used
+                backfilled.append(job)
+
+        jobs_to_launch = []
+        for job in backfilled:
+            if cluster_status_snapshot.allocate_elastic(job) or not job.is_running:
+                jobs_to_launch.append(job)
+        return jobs_to_launch
+
+    def schedule(self):
+        """Run one scheduler pass, starting executions until the queue is empty or no more executions fit in the platform."""
+        self._collect_dispatched()
+        if len(self.queue) == 0:
+            log.debug("Scheduler loop has been triggered, but the queue is empty")
+            self._check_dead_services()
+            return
+        log.debug("Scheduler loop has been triggered")
+
+        preemption_budget = self.preemption_budget
+        while True:  # Inner loop will run until no new executions can be started or the queue is empty
+            self._refresh_execution_sizes()
+
+            if log.isEnabledFor(logging.DEBUG):
                 log.debug('--> Queue dump after sorting')
-                for j in self.queue:
+                for j in self.queue.ordered():
                     log.debug(str(j))
                 log.debug('--> End dump')
 
-                jobs_to_attempt_scheduling = self._pop_all_with_same_size()
-                log.debug('Scheduler inner loop, jobs to attempt scheduling:')
-                for job in jobs_to_attempt_scheduling:
-                    log.debug("-> {}".format(job))
-
-                try:
-                    platform_state = self.metrics.current_stats
-                except ZoeException:
-                    log.error('Cannot retrieve platform state, cannot schedule')
-                    for job in jobs_to_attempt_scheduling:
-                        job.termination_lock.release()
-                    self.queue = jobs_to_attempt_scheduling + self.queue
-                    break
-
-                cluster_status_snapshot = SimulatedPlatform(platform_state)
-                log.debug(str(cluster_status_snapshot))
-
-                jobs_to_launch = []
-                free_resources = cluster_status_snapshot.aggregated_free_memory()
-
-                # Try to find a placement solution using a snapshot of the platform status
-                for job in jobs_to_attempt_scheduling:  # type: Execution
-                    jobs_to_launch_copy = jobs_to_launch.copy()
-
-                    # remove all elastic services from the previous simulation loop
-                    for job_aux in jobs_to_launch:  # type: Execution
-                        cluster_status_snapshot.deallocate_elastic(job_aux)
-
-                    job_can_start = False
-                    if not job.is_running:
-                        job_can_start = cluster_status_snapshot.allocate_essential(job)
-
-                    if job_can_start or job.is_running:
-                        jobs_to_launch.append(job)
+            jobs_to_attempt_scheduling = self._pop_all_with_same_size()
+            log.debug('Scheduler inner loop, jobs to attempt scheduling:')
+            for job in jobs_to_attempt_scheduling:
+                log.debug("-> {}".format(job))
 
-                    # Try to put back the elastic services
-                    for job_aux in jobs_to_launch:
-                        cluster_status_snapshot.allocate_elastic(job_aux)
+            # Services being started by the dispatcher are not in the platform state yet, the active ones may already be
+            with self.dispatch_lock:
+                starting_services = [(service, node_name) for dispatch in self.dispatching.values() for service, node_name in dispatch.reservations if service.status != Service.ACTIVE_STATUS]
 
-                    current_free_resources = cluster_status_snapshot.aggregated_free_memory()
-                    if current_free_resources >= free_resources:
-                        jobs_to_launch = jobs_to_launch_copy
-                        break
-                    free_resources = current_free_resources
+            try:
+                platform_state = self.metrics.current_stats
+            except ZoeException:
+                log.error('Cannot retrieve platform state, cannot schedule')
+                for job in jobs_to_attempt_scheduling:
+                    job.termination_lock.release()
+                self.queue.push_front_all(jobs_to_attempt_scheduling)
+                break
 
-                placements = cluster_status_snapshot.get_service_allocation()
-                log.debug('Allocation after simulation: {}'.format(placements))
+            cluster_status_snapshot = SimulatedPlatform(platform_state, get_conf().placement_strategy)
+            for service, node_name in starting_services:
+                cluster_status_snapshot.reserve(service, node_name)
+            log.debug(str(cluster_status_snapshot))
 
-                # We port the results of the simulation into the real cluster
-                for job in jobs_to_launch:  # type: Execution
-                    if not job.essential_services_running:
-                        ret = start_essential(job, placements)
-                        if ret == "fatal":
-                            jobs_to_attempt_scheduling.remove(job)
-                            continue  # trow away the execution
-                        elif ret == "requeue":
-                            self.queue.insert(0, job)
-                            continue
-                        elif ret == "ok":
-                            job.set_running()
+            jobs_to_launch, preempted = self._simulate(jobs_to_attempt_scheduling, cluster_status_snapshot, preemption_budget)
 
-                        assert ret == "ok"
+            placements = cluster_status_snapshot.get_service_allocation()
+            log.debug('Allocation after simulation: {}'.format(placements))
+            self.node_checks = cluster_status_snapshot.node_checks
+            log.debug('Placement simulation performed {} node checks'.format(self.node_checks))
 
-                    start_elastic(job, placements)
+            if len(preempted) > 0:
+                if self._preempt(preempted):
+                    preemption_budget -= len(preempted)
+                else:
+                    log.info('Preemption aborted, an execution to preempt is being terminated, retrying when it is gone')
+                    jobs_to_launch = []
 
-                    if job.all_services_active:
-                        log.debug('execution {}: all services are active'.format(job.id))
-                        job.termination_lock.release()
-                        jobs_to_attempt_scheduling.remove(job)
-                        self.queue_running.append(job)
+            # The simulation did not touch the database, save its decisions
+            with self.state.transaction():
+                for job in jobs_to_launch:
+                    cluster_status_snapshot.commit_elastic(job)
 
-                self.core_limit_recalc_trigger.set()
+            # We port the results of the simulation into the real cluster, the dispatcher starts the services
+            for job in jobs_to_launch:  # type: Execution
+                jobs_to_attempt_scheduling.remove(job)
+                self._dispatch(job, placements)
 
-                for job in jobs_to_attempt_scheduling:
-                    job.termination_lock.release()
-                    # self.queue.insert(0, job)
+            for job in jobs_to_attempt_scheduling:
+                job.termination_lock.release()
+            self.queue.push_front_all(jobs_to_attempt_scheduling)
 
-                self.queue = jobs_to_attempt_scheduling + self.queue
+            if self.dispatcher is None:  # services have been started synchronously
+                self._collect_dispatched()
 
-                if len(self.queue) == 0:
-                    log.debug('empty queue, exiting inner loop')
-                    break
-                if len(jobs_to_launch) == 0:
-                    log.debug('No executions could be started, exiting inner loop')
-                    break
+            if len(self.queue) == 0:
+                log.debug('empty queue, exiting inner loop')
+                break
+            if len(jobs_to_launch) == 0:
+                log.debug('No executions could be started, exiting inner loop')
+                break
 
     def quit(self):
         """Stop the scheduler thread."""
         self.loop_quit = True
         self.trigger()
         self.core_limit_recalc_trigger.set()
-        self.loop_th.join()
-        self.core_limit_th.join()
+        if self.threaded:
+            self.loop_th.join()
+            self.core_limit_th.join()
+            self.dispatcher.shutdown()
+            self.core_limit_updater.shutdown()
 
     def stats(self):
         """Scheduler statistics."""
-        if self.policy == "SIZE":
-            queue = sorted(self.queue, key=lambda execution: execution.size)
-        else:
-            queue = self.queue
+        queue = self.queue.ordered()
 
-        return {
+        stats = {
             'queue_length': len(self.queue),
             'running_length': len(self.queue_running),
             'termination_threads_count': len(self.async_threads),
+            'dispatching_length': len(self.dispatching),
+            'node_checks_last_pass': self.node_checks,
+            'preempted_services': self.preempted_services,
+            'core_limit_updates_applied': self.limit_updates['cores_applied'],
+            'core_limit_updates_skipped': self.limit_updates['cores_skipped'],
+            'memory_limit_updates_applied': self.limit_updates['memory_applied'],
+            'memory_limit_updates_skipped': self.limit_updates['memory_skipped'],
             'queue': [s.id for s in queue],
             'running_queue': [s.id for s in self.queue_running]
         }
+        if self.fair_share is not None:
+            stats['fair_share_usage'] = self.fair_share.usages()
+        return stats
 
     @catch_exceptions_and_retry
-    def _adjust_core_limits(self):
-        self.core_limit_recalc_trigger.clear()
+    def _adjust_resource_limits(self):
         while not self.loop_quit:
             self.core_limit_recalc_trigger.wait()
             if self.loop_quit:
                 break
-            stats = self.metrics.current_stats
-            for node in stats.nodes:  # type: NodeStats
-                new_core_allocations = {}
-                node_services = self.state.services.select(backend_host=node.name, backend_status=Service.BACKEND_START_STATUS)
-                if len(node_services) == 0:
-                    continue
+            with self.core_limit_lock:
+                node_names = self.core_limit_nodes
+                self.core_limit_nodes = set()
+                self.core_limit_recalc_trigger.clear()
+            self.adjust_resource_limits(node_names)
 
-                for service in node_services:
-                    new_core_allocations[service.id] = service.resource_reservation.cores.min
+    def adjust_resource_limits(self, node_names=None):
+        """
+        Recompute the core and memory limits of the services running on some nodes, on all nodes if node_names is None.
 
-                if node.cores_reserved < node.cores_total:
-                    cores_free = node.cores_total - node.cores_reserved
-                    cores_to_add = cores_free / len(node_services)
-                else:
-                    cores_to_add = 0
+        Only the limits that differ from the ones set the last time are sent to the back-end, the updates of different nodes
+        are done in parallel.
+        """
+        stats = self.metrics.current_stats
+        nodes = [node for node in stats.nodes if node_names is None or node.name in node_names]  # type: List[NodeStats]
+        if len(nodes) == 0:
+            return
+        services_by_node = {}
+        for service in self.state.services.select(backend_status=Service.BACKEND_START_STATUS):
+            services_by_node.setdefault(service.backend_host, []).append(service)
+
+        node_updates = []
+        for node in nodes:
+            updates = self._node_limit_updates(node, services_by_node.get(node.name, []))
+            if len(updates) > 0:
+                node_updates.append((node.name, updates))
+
+        if self.core_limit_updater is None:
+            results = [self._update_limits(node_name, updates) for node_name, updates in node_updates]
+        else:
+            results = self.core_limit_updater.map(lambda node_update: self._update_limits(*node_update), node_updates)
+        for node_name, applied_cores, applied_memory in results:
+            self.applied_core_limits[node_name].update(applied_cores)
+            self.applied_memory_limits[node_name].update(applied_memory)
+            self.limit_updates['cores_applied'] += len(applied_cores)
+            self.limit_updates['memory_applied'] += len(applied_memory)
+
+    def _node_limit_updates(self, node: NodeStats, node_services):
+        """The (service, cores, memory) limits to send to the back-end for the services of a node, None for the limits that do not change."""
+        applied_cores = self.applied_core_limits.get(node.name, {})
+        applied_memory = self.applied_memory_limits.get(node.name, {})
+        new_cores = self._core_limits(node, node_services)
+        new_memory = self._memory_limits(node, node_services, applied_memory)
+
+        updates = []
+        for service in node_services:
+            cores = new_cores[service.id]
+            if applied_cores.get(self._limit_key(service)) == cores:
+                cores = None
+                self.limit_updates['cores_skipped'] += 1
+            memory = new_memory.get(service.id)
+            if memory is not None and abs(memory - applied_memory.get(self._limit_key(service), service.resource_reservation.memory.min)) < MEMORY_MIN_UPDATE:
+                memory = None
+                self.limit_updates['memory_skipped'] += 1
+            if cores is not None or memory is not None:
+                updates.append((service, cores, memory))
+        # forget the containers that are no longer running, the limits that fail to be applied are sent again the next time
+        running = set(self._limit_key(service) for service in node_services)
+        self.applied_core_limits[node.name] = dict((key, cores) for key, cores in applied_cores.items() if key in running)
+        self.applied_memory_limits[node.name] = dict((key, memory) for key, memory in applied_memory.items() if key in running)
+        return updates
+
+    @staticmethod
+    def _limit_key(service: Service):
+        """Applied limits are tracked per container, a restarted service gets a new container with the default limits."""
+        return service.id, service.backend_id
+
+    def _core_limits(self, node: NodeStats, node_services):
+        """The free cores of a node are given to the services running there, in equal parts."""
+        if node.cores_reserved < node.cores_total and len(node_services) > 0:
+            cores_to_add = (node.cores_total - node.cores_reserved) / len(node_services)
+        else:
+            cores_to_add = 0
+        return dict((service.id, service.resource_reservation.cores.min + cores_to_add) for service in node_services)
 
-                for service in node_services:
-                    update_service_resource_limits(service, cores=new_core_allocations[service.id] + cores_to_add)
+    def _memory_limits(self, node: NodeStats, node_services, applied):
+        """
+        New memory soft limits for the services of a node whose memory usage is known, it is measured only with KairosDB.
 
-            self.core_limit_recalc_trigger.clear()
+        Services using most of their soft limit get more memory, idle ones give it back. Between the two thresholds limits
+        are left alone, so that they do not change at every usage sample. Soft limits stay between the reservation and the
+        hard limit of each service, and the memory above the reservations comes from the memory of the node that is not
+        reserved, since the scheduler places services according to their reservations.
+        """
+        limits = {}
+        under_pressure = []  # (service, memory in use, highest soft limit)
+        for service in node_services:
+            usage = node.service_stats.get(service.id, {}).get('memory_in_use')
+            reservation = service.resource_reservation.memory
+            hard_limit = min(reservation.max, get_conf().max_memory_limit * (1024 ** 3))
+            if usage is None or hard_limit == 0:
+                continue
+            current = applied.get(self._limit_key(service), reservation.min)
+            highest = max(reservation.min, hard_limit - 1)  # the soft limit must be lower than the hard limit
+            if usage > current * MEMORY_PRESSURE_THRESHOLD and current < highest:
+                under_pressure.append((service, usage, highest))
+                limits[service.id] = current
+            elif usage < current * MEMORY_IDLE_THRESHOLD and current > reservation.min:
+                limits[service.id] = max(reservation.min, int(usage * MEMORY_HEADROOM))
+            else:
+                limits[service.id] = current
+
+        spare = node.memory_total * (1 - MEMORY_SAFETY_MARGIN) - node.memory_reserved
+        for service in node_services:
+            spare -= limits.get(service.id, applied.get(self._limit_key(service), service.resource_reservation.memory.min)) - service.resource_reservation.memory.min
+        under_pressure.sort(key=lambda x: x[1] / limits[x[0].id], reverse=True)  # the ones closer to their limit first
+        for service, usage, highest in under_pressure:
+            if spare <= 0:
+                break
+            increase = min(int(usage * MEMORY_HEADROOM), highest) - limits[service.id]
+            increase = min(increase, int(spare))
+            limits[service.id] += increase
+            spare -= increase
+        return limits
+
+    def _update_limits(self, node_name, updates):
+        """Send the limit updates of one node to the back-end, returns the node name and the core and memory limits that have been applied."""
+        applied_cores = {}
+        applied_memory = {}
+        for service, cores, memory in updates:
+            try:
+                update_service_resource_limits(service, cores=cores, memory=memory)
+            except ZoeException as ex:
+                log.error('Cannot update the limits of service {} on node {}: {}'.format(service.id, node_name, ex))
+                continue
+            if cores is not None:
+                applied_cores[self._limit_key(service)] = cores
+            if memory is not None:
+                applied_memory[self._limit_key(service)] = memory
+        return node_name, applied_cores, applied_memory
 
     def _check_dead_services(self):
         # Check for executions that are no longer viable since an essential service died
@@ -354,6 +839,7 @@ class ZoeElasticScheduler:
                 if not service.essential and service.backend_status == service.BACKEND_DIE_STATUS:
                     log.info("Elastic service {} ({}) of execution {} died, rescheduling".format(service.id, service.name, execution.id))
                     service.restarted()
-                    self.queue_running.remove(execution)
-                    self.queue.append(execution)
+                    with self.dispatch_lock:
+                        self.queue_running.remove(execution)
+                        self.queue.push(execution)
                     break
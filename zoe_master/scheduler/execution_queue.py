@@ -0,0 +1,326 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The queue of executions waiting to be scheduled."""
+
+import collections
+import heapq
+import itertools
+import threading
+
+
+class ExecutionQueue:
+    """
+    Priority queue of executions, implemented as a binary heap indexed by execution ID.
+
+    With the FIFO and BACKFILL policies executions are ordered by arrival, with the SIZE policy by size first and by arrival among
+    executions with the same size. The index keeps the position of each execution in the heap, so that an execution can be
+    removed or have its size changed in O(log n). Executions put back with push_front() go before all the others with
+    the same size.
+    """
+    def __init__(self, policy):
+        self.policy = policy
+        self._heap = []  # [key, execution] entries, keys are unique so executions are never compared
+        self._positions = {}  # execution ID -> position in the heap
+        self._back = itertools.count()
+        self._front = itertools.count(-1, -1)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, execution):
+        return execution.id in self._positions
+
+    def _key(self, execution, sequence):
+        if self.policy == 'SIZE':
+            return execution.size, sequence
+        return (sequence,)
+
+    def _sift_up(self, pos):
+        heap = self._heap
+        entry = heap[pos]
+        while pos > 0:
+            parent = (pos - 1) // 2
+            if entry[0] >= heap[parent][0]:
+                break
+            heap[pos] = heap[parent]
+            self._positions[heap[pos][1].id] = pos
+            pos = parent
+        heap[pos] = entry
+        self._positions[entry[1].id] = pos
+
+    def _sift_down(self, pos):
+        heap = self._heap
+        size = len(heap)
+        entry = heap[pos]
+        child = 2 * pos + 1
+        while child < size:
+            if child + 1 < size and heap[child + 1][0] < heap[child][0]:
+                child += 1
+            if entry[0] <= heap[child][0]:
+                break
+            heap[pos] = heap[child]
+            self._positions[heap[pos][1].id] = pos
+            pos = child
+            child = 2 * pos + 1
+        heap[pos] = entry
+        self._positions[entry[1].id] = pos
+
+    def _rebuild(self):
+        heapq.heapify(self._heap)  # keys are unique, so the entries are ordered by their keys only
+        self._positions = dict((entry[1].id, pos) for pos, entry in enumerate(self._heap))
+
+    def _drain(self, heap):
+        return [heapq.heappop(heap)[1] for _ in range(len(heap))]
+
+    def _insert(self, execution, sequence):
+        if execution.id in self._positions:
+            raise ValueError('Execution {} is already queued'.format(execution.id))
+        self._heap.append([self._key(execution, sequence), execution])
+        self._positions[execution.id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def _remove_at(self, pos):
+        removed = self._heap[pos]
+        last = self._heap.pop()
+        del self._positions[removed[1].id]
+        if last is not removed:
+            self._heap[pos] = last
+            self._sift_down(pos)
+            self._sift_up(self._positions[last[1].id])
+        return removed[1]
+
+    def push(self, execution):
+        """Add an execution at the end of the queue."""
+        with self._lock:
+            self._insert(execution, next(self._back))
+
+    def push_front(self, execution):
+        """Put an execution back in the queue, ahead of the others with the same priority."""
+        with self._lock:
+            self._insert(execution, next(self._front))
+
+    def push_front_all(self, executions):
+        """Put back a list of executions, ahead of the others with the same priority and keeping their order."""
+        with self._lock:
+            for execution in reversed(executions):
+                self._insert(execution, next(self._front))
+
+    def pop(self):
+        """Remove and return the first execution, raises IndexError if the queue is empty."""
+        with self._lock:
+            if len(self._heap) == 0:
+                raise IndexError('pop from an empty execution queue')
+            return self._remove_at(0)
+
+    def pop_all(self):
+        """Remove and return all executions, in scheduling order."""
+        with self._lock:
+            heap = self._heap
+            self._heap = []
+            self._positions = {}
+            return self._drain(heap)
+
+    def remove(self, execution):
+        """Remove an execution, raises ValueError if it is not queued."""
+        with self._lock:
+            try:
+                pos = self._positions[execution.id]
+            except KeyError:
+                raise ValueError('Execution {} is not queued'.format(execution.id)) from None
+            self._remove_at(pos)
+
+    def update(self, execution):
+        """The size of a queued execution has changed, move it to its new position."""
+        with self._lock:
+            pos = self._positions[execution.id]
+            entry = self._heap[pos]
+            entry[0] = self._key(execution, entry[0][-1])
+            self._sift_down(pos)
+            self._sift_up(self._positions[execution.id])
+
+    def refresh(self, size_function):
+        """
+        Set the size of all queued executions to size_function(execution) and reorder the queue.
+
+        The heap is rebuilt once instead of moving each execution separately.
+        """
+        with self._lock:
+            for entry in self._heap:
+                execution = entry[1]
+                execution.size = size_function(execution)
+                entry[0] = self._key(execution, entry[0][-1])
+            self._rebuild()
+
+    def executions(self):
+        """The queued executions, in no particular order."""
+        with self._lock:
+            return [entry[1] for entry in self._heap]
+
+    def ordered(self):
+        """The queued executions, in scheduling order."""
+        with self._lock:
+            return self._drain(list(self._heap))  # popping from a copy of a heap is cheaper than sorting it
+
+
+class _UserQueue(ExecutionQueue):
+    """The queued executions of one user, in arrival order. It is an entry of the heap of FairShareQueue."""
+    def __init__(self, user_id, usage):
+        super().__init__('FIFO')
+        self.id = user_id
+        self.usage = usage
+
+
+class FairShareQueue(ExecutionQueue):
+    """
+    Queue of executions for the FAIRSHARE policy.
+
+    Each user with queued executions has a queue in arrival order, the heap orders the users by their usage divided by
+    their weight, so that the user furthest below its fair share comes first. Adding or removing an execution costs
+    O(log n), refresh() recomputes the usages and rebuilds the heap of users. In scheduling order users are
+    interleaved: after each execution of a user, the usage expected for it is added to the usage of the user.
+    usage_function(user ID) and expected_usage_function(execution) return usages already divided by the user weight.
+    """
+    def __init__(self, usage_function, expected_usage_function):
+        super().__init__('FAIRSHARE')
+        self.usage_function = usage_function
+        self.expected_usage_function = expected_usage_function
+        self._users = {}  # user ID -> _UserQueue
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, execution):
+        user_queue = self._users.get(execution.user_id)
+        return user_queue is not None and execution in user_queue
+
+    def _key(self, execution, sequence):
+        return execution.usage, sequence  # the heap entries are user queues
+
+    def _user_queue(self, user_id):
+        user_queue = self._users.get(user_id)
+        if user_queue is None:
+            user_queue = _UserQueue(user_id, self.usage_function(user_id))
+            self._users[user_id] = user_queue
+            self._insert(user_queue, next(self._back))
+        return user_queue
+
+    def _drop_if_empty(self, user_queue):
+        if len(user_queue) == 0:
+            self._remove_at(self._positions[user_queue.id])
+            del self._users[user_queue.id]
+
+    def _merge(self):
+        """All executions in scheduling order, charging users for their executions as they are taken."""
+        heap = [[entry[0], collections.deque(entry[1].ordered())] for entry in self._heap]
+        heapq.heapify(heap)  # keys are unique, so the deques are never compared
+        ordered = []
+        while len(heap) > 0:
+            key, executions = heap[0]
+            execution = executions.popleft()
+            ordered.append(execution)
+            if len(executions) > 0:
+                heapq.heapreplace(heap, [(key[0] + self.expected_usage_function(execution), key[1]), executions])
+            else:
+                heapq.heappop(heap)
+        return ordered
+
+    def push(self, execution):
+        """Add an execution at the end of the queue of its user."""
+        with self._lock:
+            self._user_queue(execution.user_id).push(execution)
+            self._length += 1
+
+    def push_front(self, execution):
+        """Put an execution back at the head of the queue of its user."""
+        with self._lock:
+            self._user_queue(execution.user_id).push_front(execution)
+            self._length += 1
+
+    def push_front_all(self, executions):
+        """Put back a list of executions at the head of the queues of their users, keeping their order."""
+        by_user = collections.OrderedDict()
+        for execution in executions:
+            by_user.setdefault(execution.user_id, []).append(execution)
+        with self._lock:
+            for user_id, user_executions in by_user.items():
+                self._user_queue(user_id).push_front_all(user_executions)
+                self._length += len(user_executions)
+
+    def pop(self):
+        """Remove and return the first execution of the user with the lowest usage, raises IndexError if the queue is empty."""
+        with self._lock:
+            if len(self._heap) == 0:
+                raise IndexError('pop from an empty execution queue')
+            user_queue = self._heap[0][1]
+            execution = user_queue.pop()
+            self._length -= 1
+            if len(user_queue) > 0:
+                user_queue.usage += self.expected_usage_function(execution)
+                ExecutionQueue.update(self, user_queue)
+            else:
+                self._drop_if_empty(user_queue)
+            return execution
+
+    def pop_all(self):
+        """Remove and return all executions, in scheduling order."""
+        with self._lock:
+            ordered = self._merge()
+            self._heap = []
+            self._positions = {}
+            self._users = {}
+            self._length = 0
+            return ordered
+
+    def remove(self, execution):
+        """Remove an execution, raises ValueError if it is not queued."""
+        with self._lock:
+            user_queue = self._users.get(execution.user_id)
+            if user_queue is None:
+                raise ValueError('Execution {} is not queued'.format(execution.id))
+            user_queue.remove(execution)
+            self._length -= 1
+            self._drop_if_empty(user_queue)
+
+    def update(self, execution):
+        """
+        The size of a queued execution has changed, nothing to do.
+
+        Users are ordered by their usage and the executions of a user by arrival, neither depends on the size. The heap
+        holds user queues, so the lookup by execution ID done by ExecutionQueue.update() does not apply here.
+        """
+
+    def refresh(self, size_function):
+        """Set the size of all queued executions to size_function(execution), update the usage of the users and reorder them."""
+        with self._lock:
+            for entry in self._heap:
+                user_queue = entry[1]
+                for execution in user_queue.executions():
+                    execution.size = size_function(execution)
+                user_queue.usage = self.usage_function(user_queue.id)
+                entry[0] = self._key(user_queue, entry[0][-1])
+            self._rebuild()
+
+    def executions(self):
+        """The queued executions, in no particular order."""
+        with self._lock:
+            return [execution for entry in self._heap for execution in entry[1].executions()]
+
+    def ordered(self):
+        """The queued executions, in scheduling order."""
+        with self._lock:
+            return self._merge()
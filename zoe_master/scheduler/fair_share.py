@@ -0,0 +1,120 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Resource usage of the users, for the fair-share scheduler policy."""
+
+import datetime
+import logging
+import math
+import threading
+import time
+
+from zoe_lib.state import Execution
+
+log = logging.getLogger(__name__)
+
+HISTORY_HALF_LIVES = 10  # executions that ended longer than this many half-lives ago are not loaded from the state
+
+
+class UserUsage:
+    """Decayed usage of a user, at the time of its last update."""
+    __slots__ = ('usage', 'rate', 'last_update')
+
+    def __init__(self, now):
+        self.usage = 0
+        self.rate = 0  # memory reserved by the running executions of the user
+        self.last_update = now
+
+
+class FairShareUsage:
+    """
+    Memory used by each user over time, with an exponential decay.
+
+    The usage of a user is the integral over time of the memory reserved by its executions, with the memory reserved at
+    each instant weighted by 2^(-age/half_life). Between changes of the reservations it grows at the rate of the memory
+    currently reserved, so it can be computed at any time in O(1). Usages are divided by the weight of the user, that
+    is 1 for the users not listed in weights.
+    """
+    def __init__(self, half_life, weights, clock=time.time):
+        self.half_life = half_life
+        self.weights = weights  # user ID -> weight
+        self.clock = clock
+        self.users = {}  # user ID -> UserUsage
+        self.reservations = {}  # execution ID -> memory reserved by the execution
+        self.lock = threading.Lock()
+
+    def _decay(self, age):
+        return 2 ** (-age / self.half_life)
+
+    def _decayed_integral(self, start_age, end_age):
+        """Integral of the decay between two ages, in seconds before now."""
+        return self.half_life / math.log(2) * (self._decay(end_age) - self._decay(start_age))
+
+    def _user(self, user_id, now) -> UserUsage:
+        user = self.users.get(user_id)
+        if user is None:
+            user = UserUsage(now)
+            self.users[user_id] = user
+        elif now > user.last_update:
+            elapsed = now - user.last_update
+            user.usage = user.usage * self._decay(elapsed) + user.rate * self._decayed_integral(elapsed, 0)
+            user.last_update = now
+        return user
+
+    def weight(self, user_id):
+        """The weight of a user, users with a higher weight get a larger share of the platform."""
+        return self.weights.get(user_id, 1)
+
+    def load(self, state):
+        """
+        Account for the past usage of the executions that are running or that ended recently.
+
+        The usage is computed from their start and end times and the memory reserved by all their services.
+        """
+        utc_now = datetime.datetime.utcnow()
+        horizon = int(time.time() - HISTORY_HALF_LIVES * self.half_life)
+        executions = state.executions.select(status=Execution.TERMINATED_STATUS, later_than_end=horizon) + state.executions.select(status=Execution.RUNNING_STATUS)
+        executions = [execution for execution in executions if execution.time_start is not None]
+        memory = {}
+        if len(executions) > 0:
+            for service in state.services.select_by_parents([execution.id for execution in executions]):
+                memory[service.execution_id] = memory.get(service.execution_id, 0) + service.resource_reservation.memory.min
+        with self.lock:
+            now = self.clock()
+            for execution in executions:
+                end_age = max(0, (utc_now - (execution.time_end or utc_now)).total_seconds())
+                start_age = max(end_age, (utc_now - execution.time_start).total_seconds())
+                user = self._user(execution.user_id, now)
+                user.usage += memory.get(execution.id, 0) * self._decayed_integral(start_age, end_age)
+        log.debug('Fair-share usage loaded from {} executions'.format(len(executions)))
+
+    def set_reservation(self, execution, memory):
+        """Set the memory reserved by a running execution, 0 when it terminates."""
+        with self.lock:
+            user = self._user(execution.user_id, self.clock())
+            user.rate += memory - self.reservations.pop(execution.id, 0)
+            if memory > 0:
+                self.reservations[execution.id] = memory
+
+    def usage(self, user_id):
+        """The current usage of a user, divided by its weight."""
+        with self.lock:
+            return self._user(user_id, self.clock()).usage / self.weight(user_id)
+
+    def usages(self):
+        """The current usage of all users with some usage, divided by their weights."""
+        with self.lock:
+            now = self.clock()
+            return dict((user_id, self._user(user_id, now).usage / self.weight(user_id)) for user_id in self.users)
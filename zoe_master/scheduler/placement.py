@@ -0,0 +1,221 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Placement strategies, used by the simulated platform to choose the node where each service is allocated."""
+
+import bisect
+import heapq
+
+from zoe_lib.state import Service
+
+
+class PlacementStrategy:
+    """
+    Base class for placement strategies.
+
+    Strategies receive the simulated nodes of a platform snapshot and are notified with update() every time a service is
+    added to or removed from a node. They count how many times a node has been checked for fitting a service.
+    """
+    def __init__(self, nodes):
+        self.nodes = nodes  # node name -> SimulatedNode
+        self.positions = dict((name, position) for position, name in enumerate(nodes))
+        self.checks = 0
+        self._eligible = {}  # label set -> names of the nodes having all those labels, in position order
+
+    def eligible_nodes(self, labels):
+        """The names of the nodes that have all the labels."""
+        labels = frozenset(labels)
+        names = self._eligible.get(labels)
+        if names is None:
+            names = [name for name, node in self.nodes.items() if labels.issubset(node.labels)]
+            self._eligible[labels] = names
+        return names
+
+    def fits(self, node, service: Service) -> bool:
+        """Check if the service fits on the node, counting the check."""
+        self.checks += 1
+        return node.service_fits(service)
+
+    def sort_services(self, services):
+        """The order in which the services of an execution are placed."""
+        return services
+
+    def best_node(self, service: Service):
+        """Return the node where the service should be placed, or None if it does not fit anywhere."""
+        raise NotImplementedError
+
+    def update(self, node):
+        """The services allocated on the node have changed."""
+
+
+class SpreadPlacement(PlacementStrategy):
+    """
+    Place each service on the node with the fewest containers, spreading the load. This is the default.
+
+    Nodes are grouped by the label sets requested by services, each group is a heap of (container count, position, version,
+    name) entries. When the container count of a node changes a new entry is pushed, old entries are recognized by their
+    version and discarded when they reach the top of the heap.
+    """
+    def __init__(self, nodes):
+        super().__init__(nodes)
+        self.versions = dict((name, 0) for name in nodes)
+        self.heaps = {}  # label set -> heap
+        self.node_heaps = dict((name, []) for name in nodes)  # node name -> label sets of the heaps it belongs to
+
+    def _heap(self, labels):
+        labels = frozenset(labels)
+        heap = self.heaps.get(labels)
+        if heap is None:
+            heap = [(self.nodes[name].container_count, self.positions[name], self.versions[name], name) for name in self.eligible_nodes(labels)]
+            heapq.heapify(heap)
+            self.heaps[labels] = heap
+            for entry in heap:
+                self.node_heaps[entry[3]].append(labels)
+        return heap
+
+    def best_node(self, service: Service):
+        """The node with the fewest containers where the service fits."""
+        heap = self._heap(service.labels)
+        checked = []
+        found = None
+        while len(heap) > 0:
+            entry = heapq.heappop(heap)
+            name = entry[3]
+            if entry[2] != self.versions[name]:
+                continue  # outdated entry
+            checked.append(entry)
+            if self.fits(self.nodes[name], service):
+                found = self.nodes[name]
+                break
+        for entry in checked:
+            heapq.heappush(heap, entry)
+        return found
+
+    def update(self, node):
+        """Push a new entry with the current container count."""
+        self.versions[node.name] += 1
+        entry = (node.container_count, self.positions[node.name], self.versions[node.name], node.name)
+        for labels in self.node_heaps[node.name]:
+            heapq.heappush(self.heaps[labels], entry)
+
+
+class MemoryFitPlacement(PlacementStrategy):
+    """
+    Base for strategies choosing nodes by free memory.
+
+    For each label set the nodes are kept in a list of (free memory, position, name) entries sorted by free memory, so that
+    the nodes with just enough memory for a service are found by bisection.
+    """
+    def __init__(self, nodes):
+        super().__init__(nodes)
+        self.keys = dict((name, (node.node_free_memory(), self.positions[name], name)) for name, node in nodes.items())
+        self.sorted_nodes = {}  # label set -> sorted list of keys
+        self.node_lists = dict((name, []) for name in nodes)  # node name -> label sets of the lists it belongs to
+
+    def _sorted(self, labels):
+        labels = frozenset(labels)
+        keys = self.sorted_nodes.get(labels)
+        if keys is None:
+            keys = sorted(self.keys[name] for name in self.eligible_nodes(labels))
+            self.sorted_nodes[labels] = keys
+            for key in keys:
+                self.node_lists[key[2]].append(labels)
+        return keys
+
+    def _candidates(self, keys, memory):
+        """The keys of the nodes with more free memory than requested, in the order they should be tried."""
+        raise NotImplementedError
+
+    def best_node(self, service: Service):
+        """The first node in the strategy order where the service fits."""
+        keys = self._sorted(service.labels)
+        for key in self._candidates(keys, service.resource_reservation.memory.min):
+            if self.fits(self.nodes[key[2]], service):
+                return self.nodes[key[2]]
+        return None
+
+    def update(self, node):
+        """Move the node to its new position in the sorted lists."""
+        old_key = self.keys[node.name]
+        new_key = (node.node_free_memory(), self.positions[node.name], node.name)
+        self.keys[node.name] = new_key
+        for labels in self.node_lists[node.name]:
+            keys = self.sorted_nodes[labels]
+            del keys[bisect.bisect_left(keys, old_key)]
+            bisect.insort(keys, new_key)
+
+
+class BestFitPlacement(MemoryFitPlacement):
+    """Place each service on the node with the least free memory that can hold it, to keep large holes for large services."""
+    def _candidates(self, keys, memory):
+        start = bisect.bisect_right(keys, (memory, float('inf')))
+        return (keys[idx] for idx in range(start, len(keys)))
+
+
+class WorstFitPlacement(MemoryFitPlacement):
+    """Place each service on the node with the most free memory."""
+    def _candidates(self, keys, memory):
+        start = bisect.bisect_right(keys, (memory, float('inf')))
+        return (keys[idx] for idx in range(len(keys) - 1, start - 1, -1))
+
+
+class FirstFitDecreasingPlacement(PlacementStrategy):
+    """Bin-packing: the services of an execution are placed largest first, each on the first node where it fits."""
+    def sort_services(self, services):
+        """Largest memory reservation first."""
+        return sorted(services, key=lambda service: service.resource_reservation.memory.min, reverse=True)
+
+    def best_node(self, service: Service):
+        """The first node, in the platform order, where the service fits."""
+        for name in self.eligible_nodes(service.labels):
+            if self.fits(self.nodes[name], service):
+                return self.nodes[name]
+        return None
+
+
+class DotProductPlacement(PlacementStrategy):
+    """
+    Multi-resource heuristic: place each service on the node maximizing the dot product between the service demand and the
+    free resources of the node, both normalized by the largest node, so that memory and cores weigh the same.
+    """
+    def __init__(self, nodes):
+        super().__init__(nodes)
+        self.memory_scale = max([node.real_free_resources['memory'] for node in nodes.values()] + [1])
+        self.cores_scale = max([node.real_free_resources['cores'] for node in nodes.values()] + [1])
+
+    def best_node(self, service: Service):
+        """The node where the service fits with the highest score."""
+        memory = service.resource_reservation.memory.min / self.memory_scale
+        cores = service.resource_reservation.cores.min / self.cores_scale
+        best = None
+        best_score = None
+        for name in self.eligible_nodes(service.labels):
+            node = self.nodes[name]
+            if not self.fits(node, service):
+                continue
+            score = memory * node.node_free_memory() / self.memory_scale + cores * node.node_free_cores() / self.cores_scale
+            if best_score is None or score > best_score:
+                best = node
+                best_score = score
+        return best
+
+
+PLACEMENT_STRATEGIES = {
+    'spread': SpreadPlacement,
+    'best-fit': BestFitPlacement,
+    'worst-fit': WorstFitPlacement,
+    'first-fit-decreasing': FirstFitDecreasingPlacement,
+    'dot-product': DotProductPlacement
+}
@@ -4,7 +4,7 @@ import logging
 
 from zoe_lib.state import Execution, Service
 from zoe_master.stats import ClusterStats, NodeStats
-from zoe_master.backends.interface import list_available_images
+from zoe_master.scheduler.placement import PLACEMENT_STRATEGIES
 
 
 log = logging.getLogger(__name__)
@@ -23,9 +23,14 @@ class SimulatedNode:
         }
         self.real_active_containers = real_node.container_count
         self.services = []
+        # running totals of the resources reserved by the simulated services, kept up to date by service_add/remove
+        self.simulated_reservations = {
+            "memory": 0,
+            "cores": 0
+        }
         self.name = real_node.name
         self.labels = real_node.labels
-        self.images = list_available_images(self.name)
+        self.images = real_node.images
 
     def service_fits(self, service: Service) -> bool:
         """Checks whether a service can fit in this node"""
@@ -47,26 +52,27 @@ class SimulatedNode:
             return 'image {} is not available on this node'.format(service.image_name)
 
     def _image_is_available(self, image_name) -> bool:
-        for image in self.images:
-            if image_name in image['names']:
-                return True
-        return False
+        return self.images is None or image_name in self.images
 
     def service_add(self, service):
         """Add a service in this node."""
         if self.service_fits(service):
             self.services.append(service)
+            self.simulated_reservations['memory'] += service.resource_reservation.memory.min
+            self.simulated_reservations['cores'] += service.resource_reservation.cores.min
             return True
         else:
             return False
 
     def service_remove(self, service):
-        """Add a service in this node."""
+        """Remove a service from this node."""
         try:
             self.services.remove(service)
         except ValueError:
             return False
         else:
+            self.simulated_reservations['memory'] -= service.resource_reservation.memory.min
+            self.simulated_reservations['cores'] -= service.resource_reservation.cores.min
             return True
 
     @property
@@ -76,20 +82,14 @@ class SimulatedNode:
 
     def node_free_memory(self):
         """Return the amount of free memory for this node"""
-        simulated_reservation = 0
-        for service in self.services:  # type: Service
-            simulated_reservation += service.resource_reservation.memory.min
-        free = self.real_free_resources['memory'] - simulated_reservation
+        free = self.real_free_resources['memory'] - self.simulated_reservations['memory']
         if free < 0:
             log.warning('More memory reserved than there is free on node {}: {}'.format(self.name, free))
         return free
 
     def node_free_cores(self):
         """Return the amount of free cores available in this node."""
-        simulated_reservation = 0
-        for service in self.services:  # type: Service
-            simulated_reservation += service.resource_reservation.cores.min
-        free = self.real_free_resources['cores'] - simulated_reservation
+        free = self.real_free_resources['cores'] - self.simulated_reservations['cores']
         if free < 0:
             log.warning('More cores reserved than there are free on node {}: {}'.format(self.name, free))
         return free
@@ -100,80 +100,149 @@ class SimulatedNode:
 
 
 class SimulatedPlatform:
-    """A simulated cluster, composed by simulated nodes"""
-    def __init__(self, platform_status: ClusterStats):
+    """
+    A simulated cluster, composed by simulated nodes, services are placed according to the placement strategy.
+
+    The simulation works only in memory: the services of each execution are read once, and the state of the elastic
+    services is written to the database only by commit_elastic(), once the scheduler has taken its decisions.
+    """
+    def __init__(self, platform_status: ClusterStats, placement_strategy='spread'):
         self.nodes = {}
         for node in platform_status.nodes:
             if node.status == 'online':
                 self.nodes[node.name] = SimulatedNode(node)
+        self.free_memory = sum(node.real_free_resources['memory'] for node in self.nodes.values())
+        self.placement = PLACEMENT_STRATEGIES[placement_strategy](self.nodes)
+        self.placements = {}  # service ID -> name of the node where it has been allocated
+        self.execution_services = {}  # execution ID -> (essential services, elastic services), in placement order
+
+    @property
+    def node_checks(self):
+        """The number of times a node has been checked for fitting a service, since this snapshot has been created."""
+        return self.placement.checks
+
+    def _service_add(self, node: SimulatedNode, service: Service) -> bool:
+        """Place a service on a node, keeping the aggregated free memory and the placement strategy up to date."""
+        if node.service_add(service):
+            self.free_memory -= service.resource_reservation.memory.min
+            self.placements[service.id] = node.name
+            self.placement.update(node)
+            return True
+        return False
+
+    def _service_remove(self, service: Service) -> bool:
+        """Remove a service from the node it was allocated to, keeping the aggregated free memory and the placement strategy up to date."""
+        node_name = self.placements.pop(service.id, None)
+        if node_name is None:
+            return False
+        node = self.nodes[node_name]
+        node.service_remove(service)
+        self.free_memory += service.resource_reservation.memory.min
+        self.placement.update(node)
+        return True
+
+    def _log_unfit(self, service: Service, kind):
+        """Explain why a service does not fit, this requires checking all the nodes and it is done only when debugging."""
+        if log.isEnabledFor(logging.DEBUG):
+            for node in self.nodes.values():
+                log.debug('Cannot fit {} service {} on node {}: {}'.format(kind, service.id, node.name, node.service_why_unfit(service)))
+
+    def _services(self, execution: Execution):
+        """The essential and elastic services of an execution, loaded only the first time the execution is simulated."""
+        services = self.execution_services.get(execution.id)
+        if services is None:
+            all_services = execution.services
+            essential = self.placement.sort_services([s for s in all_services if s.essential])
+            elastic = self.placement.sort_services([s for s in all_services if not s.essential])
+            services = (essential, elastic)
+            self.execution_services[execution.id] = services
+        return services
+
+    def reserve(self, service: Service, node_name):
+        """Account for a service that is being started on a node chosen by an earlier scheduler pass, but is not in the platform state yet."""
+        node = self.nodes.get(node_name)
+        if node is None:
+            return
+        node.services.append(service)
+        node.simulated_reservations['memory'] += service.resource_reservation.memory.min
+        node.simulated_reservations['cores'] += service.resource_reservation.cores.min
+        self.free_memory -= service.resource_reservation.memory.min
+        self.placement.update(node)
+
+    def release(self, service: Service) -> bool:
+        """Give back the resources of a service running in the real platform, as if it had been terminated."""
+        node = self.nodes.get(service.backend_host)
+        if node is None:
+            return False
+        node.real_free_resources['memory'] += service.resource_reservation.memory.min
+        node.real_free_resources['cores'] += service.resource_reservation.cores.min
+        node.real_active_containers -= 1
+        self.free_memory += service.resource_reservation.memory.min
+        self.placement.update(node)
+        return True
+
+    def restore(self, service: Service):
+        """Undo release()."""
+        node = self.nodes[service.backend_host]
+        node.real_free_resources['memory'] -= service.resource_reservation.memory.min
+        node.real_free_resources['cores'] -= service.resource_reservation.cores.min
+        node.real_active_containers += 1
+        self.free_memory -= service.resource_reservation.memory.min
+        self.placement.update(node)
 
     def allocate_essential(self, execution: Execution) -> bool:
         """Try to find an allocation for essential services"""
-        for service in execution.essential_services:
-            candidate_nodes = []
-            for node_id_, node in self.nodes.items():
-                if node.service_fits(service):
-                    candidate_nodes.append(node)
-                else:
-                    log.debug('Cannot fit essential service {} on node {}: {}'.format(service.id, node.name, node.service_why_unfit(service)))
-            if len(candidate_nodes) == 0:  # this service does not fit anywhere
+        for service in self._services(execution)[0]:
+            node = self.placement.best_node(service)
+            if node is None:  # this service does not fit anywhere
+                self._log_unfit(service, 'essential')
                 self.deallocate_essential(execution)
                 log.info('Cannot fit essential service {} anywhere, bailing out'.format(service.id))
                 return False
-            candidate_nodes.sort(key=lambda n: n.container_count)  # smallest first
-            candidate_nodes[0].service_add(service)
+            self._service_add(node, service)
         return True
 
     def deallocate_essential(self, execution: Execution):
         """Remove all essential services from the simulated cluster"""
-        for service in execution.essential_services:
-            for node_id_, node in self.nodes.items():
-                if node.service_remove(service):
-                    break
+        for service in self._services(execution)[0]:
+            self._service_remove(service)
 
     def allocate_elastic(self, execution: Execution) -> bool:
         """Try to find an allocation for elastic services"""
         at_least_one_allocated = False
-        for service in execution.elastic_services:
+        for service in self._services(execution)[1]:
             if service.status == service.ACTIVE_STATUS and service.backend_status != service.BACKEND_DIE_STATUS:
                 continue
-            candidate_nodes = []
-            for node_id_, node in self.nodes.items():
-                if node.service_fits(service):
-                    candidate_nodes.append(node)
-                else:
-                    log.debug('Cannot fit elastic service {} on node {}: {}'.format(service.id, node.name, node.service_why_unfit(service)))
-            if len(candidate_nodes) == 0:  # this service does not fit anywhere
+            node = self.placement.best_node(service)
+            if node is None:  # this service does not fit anywhere
+                self._log_unfit(service, 'elastic')
                 log.info('Cannot fit elastic service {} anywhere'.format(service.id))
                 continue
-            candidate_nodes.sort(key=lambda n: n.container_count)  # smallest first
-            candidate_nodes[0].service_add(service)
-            service.set_runnable()
+            self._service_add(node, service)
             at_least_one_allocated = True
         return at_least_one_allocated
 
     def deallocate_elastic(self, execution: Execution):
         """Remove all elastic services from the simulated cluster"""
-        for service in execution.elastic_services:
-            for node_id_, node in self.nodes.items():
-                if node.service_remove(service):
-                    service.set_inactive()
-                    break
+        for service in self._services(execution)[1]:
+            self._service_remove(service)
+
+    def commit_elastic(self, execution: Execution):
+        """Save the result of the simulation for the elastic services: the allocated ones become runnable, the others inactive."""
+        for service in self._services(execution)[1]:
+            if service.id in self.placements:
+                if service.status != service.RUNNABLE_STATUS:
+                    service.set_runnable()
+            elif service.status == service.RUNNABLE_STATUS:
+                service.set_inactive()
 
     def aggregated_free_memory(self):
         """Return the amount of free memory across all nodes"""
-        total = 0
-        for node_id_, node in self.nodes.items():
-            total += node.node_free_memory()
-        return total
+        return self.free_memory
 
     def get_service_allocation(self):
         """Return a map of service IDs to nodes where they have been allocated."""
-        placements = {}
-        for node_id, node in self.nodes.items():
-            for service in node.services:
-                placements[service.id] = node_id
-        return placements
+        return dict(self.placements)
 
     def __repr__(self):
         out = ''
@@ -0,0 +1,296 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Replay of workload traces against the elastic scheduler.
+
+The trace is replayed in virtual time, using the simulated back-end and an in-memory state instead of a cluster and a
+database. Executions are submitted at their arrival time and terminated once their essential services have been running
+for their duration. The scheduler runs one pass after each group of simultaneous events.
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import time
+
+import zoe_lib.config as config
+from zoe_lib.applications import app_validate
+from zoe_lib.configargparse import Namespace
+from zoe_lib.exceptions import ZoeLibException, InvalidApplicationDescription
+from zoe_lib.state import Execution
+from zoe_master.backends.interface import register_backend
+from zoe_master.backends.simulated.backend import SimulatedBackend, SimulatedCluster, set_cluster
+from zoe_master.exceptions import ZoeException
+from zoe_master.preprocessing import execution_submit, execution_terminate
+from zoe_master.scheduler import ZoeElasticScheduler
+from zoe_master.scheduler.placement import PLACEMENT_STRATEGIES
+from zoe_master.simulator.state import MemoryStateManager
+
+log = logging.getLogger(__name__)
+
+ARRIVAL_EVENT = 'arrival'
+END_EVENT = 'end'
+
+
+def load_trace(path):
+    """
+    Read a trace file.
+
+    Each line is a JSON object with the arrival time and the duration in seconds, the ZApp description inline
+    (``description``) or as a path relative to the trace file (``zapp``) and optionally the ``user`` submitting it.
+    Empty lines and lines starting with # are ignored. ZApp files used more than once are loaded only once.
+    """
+    descriptions = {}
+    trace = []
+    with open(path, 'r') as trace_file:
+        for line_number, line in enumerate(trace_file, 1):
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            try:
+                entry = json.loads(line)
+                if 'zapp' in entry:
+                    zapp_path = os.path.join(os.path.dirname(path), entry['zapp'])
+                    if zapp_path not in descriptions:
+                        with open(zapp_path, 'r') as zapp_file:
+                            descriptions[zapp_path] = json.load(zapp_file)
+                    entry['description'] = descriptions[zapp_path]
+                trace.append({
+                    'arrival': float(entry['arrival']),
+                    'duration': float(entry['duration']),
+                    'description': entry['description'],
+                    'user': entry.get('user', 'simulation')
+                })
+            except (ValueError, KeyError, OSError) as e:
+                raise ZoeException('{}, line {}: invalid trace entry: {}'.format(path, line_number, e)) from e
+    trace.sort(key=lambda trace_entry: trace_entry['arrival'])
+    return trace
+
+
+def simulation_configuration(policy, placement_strategy, max_memory_limit, max_core_limit, preemption=False, preemption_budget=8):
+    """The configuration used while replaying a trace, memory limit is in GiB."""
+    return Namespace(
+        debug=False, deployment_name='simulation', backend='Simulated', scheduler_class='ZoeElasticScheduler',
+        scheduler_policy=policy, placement_strategy=placement_strategy, kairosdb_enable=False, proxy_path='',
+        additional_volumes=[], workspace_base_path='/mnt/zoe-workspaces', workspace_deployment_path='simulation',
+        service_logs_base_path='/var/lib/zoe/service-logs', max_memory_limit=max_memory_limit, max_core_limit=max_core_limit,
+        service_startup_workers=8, scheduler_preemption=preemption, scheduler_preemption_budget=preemption_budget,
+        scheduler_fairshare_half_life=86400, scheduler_fairshare_weights={}
+    )
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile, 0 for an empty list."""
+    if len(values) == 0:
+        return 0
+    ordered = sorted(values)
+    return ordered[max(0, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+class SimulatedStats:
+    """Stands in for the StatsManager, the scheduler receives the current state of the simulated cluster at each pass."""
+    @property
+    def current_stats(self):
+        """The platform state."""
+        return SimulatedBackend(config.get_conf()).platform_state()
+
+
+class TraceReplay:
+    """Replays a trace against the elastic scheduler and collects the results, the Simulated back-end must be registered first."""
+    def __init__(self, trace, cluster: SimulatedCluster, policy):
+        self.trace = trace
+        self.cluster = cluster
+        self.policy = policy
+        self.state = MemoryStateManager()
+        self.scheduler = None
+        self.now = 0
+        self.events = []  # heap of (time, sequence number, event type, trace entry or execution)
+        self._sequence = itertools.count()
+        self.executions = {}  # execution ID -> Execution
+        self.arrivals = {}  # execution ID -> arrival time
+        self.durations = {}  # execution ID -> duration
+        self.starts = {}  # execution ID -> time the essential services started
+        self.ends = {}  # execution ID -> termination time
+        self.waiting = set()  # IDs of the submitted executions that have not started yet
+        self.failed = set()
+        self.pass_times = []  # CPU time of each scheduler pass
+        self.memory_time = 0  # integral over time of the reserved memory
+        self.cores_time = 0
+
+    def _push(self, event_time, event_type, item):
+        heapq.heappush(self.events, (event_time, next(self._sequence), event_type, item))
+
+    def _advance(self, event_time):
+        """Move the clock forward, accounting for the resources reserved meanwhile."""
+        memory, cores = self.cluster.total_reserved()
+        self.memory_time += memory * (event_time - self.now)
+        self.cores_time += cores * (event_time - self.now)
+        self.now = event_time
+
+    def _submit(self, entry):
+        execution_id = self.state.executions.insert(entry['description']['name'], entry['user'], entry['description'])
+        execution = self.state.executions.records[execution_id]
+        self.executions[execution_id] = execution
+        self.arrivals[execution_id] = self.now
+        self.durations[execution_id] = entry['duration']
+        execution_submit(self.state, self.scheduler, execution)
+        if execution.status == Execution.SCHEDULED_STATUS:
+            self.waiting.add(execution_id)
+        else:
+            log.warning('Execution {} was not accepted: {}'.format(execution_id, execution.error_message))
+            self.failed.add(execution_id)
+
+    def _terminate(self, execution: Execution):
+        execution_terminate(self.scheduler, execution)
+        for th in self.scheduler.async_threads:
+            th.join()
+        self.scheduler.async_threads.clear()
+        self.ends[execution.id] = self.now
+
+    def _schedule(self):
+        time_start = time.process_time()
+        self.scheduler.schedule()
+        self.pass_times.append(time.process_time() - time_start)
+
+        for execution_id in list(self.waiting):
+            execution = self.executions[execution_id]
+            if execution.is_running:
+                self.waiting.remove(execution_id)
+                self.starts[execution_id] = self.now
+                self._push(self.now + self.durations[execution_id], END_EVENT, execution)
+            elif execution.status == Execution.ERROR_STATUS:
+                self.waiting.remove(execution_id)
+                self.failed.add(execution_id)
+
+    def run(self):
+        """Replay the whole trace, returns the report."""
+        set_cluster(self.cluster)
+        self.scheduler = ZoeElasticScheduler(self.state, self.policy, SimulatedStats(), threaded=False, clock=lambda: self.now)
+        for entry in self.trace:
+            self._push(entry['arrival'], ARRIVAL_EVENT, entry)
+        if len(self.events) > 0:
+            self.now = self.events[0][0]
+
+        while len(self.events) > 0:
+            event_time = self.events[0][0]
+            self._advance(event_time)
+            while len(self.events) > 0 and self.events[0][0] == event_time:
+                event_type, item = heapq.heappop(self.events)[2:]
+                if event_type == ARRIVAL_EVENT:
+                    self._submit(item)
+                else:
+                    self._terminate(item)
+            self._schedule()
+
+        self.scheduler.quit()
+        return self.report()
+
+    def report(self):
+        """Makespan, queue waits, utilization and scheduler CPU time, times are in seconds."""
+        waits = [self.starts[execution_id] - self.arrivals[execution_id] for execution_id in self.starts]
+        user_waits = {}
+        for execution_id in self.starts:
+            user_waits.setdefault(self.executions[execution_id].user_id, []).append(self.starts[execution_id] - self.arrivals[execution_id])
+        first_arrival = self.trace[0]['arrival'] if len(self.trace) > 0 else 0
+        makespan = self.now - first_arrival
+        memory_total, cores_total = self.cluster.total_capacity()
+        return {
+            'policy': self.policy,
+            'placement_strategy': config.get_conf().placement_strategy,
+            'executions': len(self.trace),
+            'completed': len(self.ends),
+            'failed': len(self.failed),
+            'never_started': len(self.waiting),
+            'makespan': makespan,
+            'wait_p50': percentile(waits, 0.5),
+            'wait_p90': percentile(waits, 0.9),
+            'wait_p99': percentile(waits, 0.99),
+            'wait_max': max(waits) if len(waits) > 0 else 0,
+            'user_wait_p50': dict((user_id, percentile(values, 0.5)) for user_id, values in user_waits.items()),
+            'memory_utilization': self.memory_time / (memory_total * makespan) if makespan > 0 and memory_total > 0 else 0,
+            'cores_utilization': self.cores_time / (cores_total * makespan) if makespan > 0 and cores_total > 0 else 0,
+            'preemption': config.get_conf().scheduler_preemption,
+            'preempted_services': self.scheduler.preempted_services,
+            'scheduler_passes': len(self.pass_times),
+            'pass_cpu_avg': sum(self.pass_times) / len(self.pass_times) if len(self.pass_times) > 0 else 0,
+            'pass_cpu_p99': percentile(self.pass_times, 0.99),
+            'pass_cpu_max': max(self.pass_times) if len(self.pass_times) > 0 else 0,
+            'pass_cpu_total': sum(self.pass_times)
+        }
+
+
+def _build_cluster(args, trace):
+    images = set(service['image'] for entry in trace for service in entry['description']['services'])
+    cluster = SimulatedCluster(images)
+    labels = [label for label in args.node_labels.split(',') if len(label) > 0]
+    for node_number in range(args.nodes):
+        cluster.add_node('node{}'.format(node_number), args.node_cores, args.node_memory * (1024 ** 3), labels)
+    return cluster
+
+
+def _print_reports(reports):
+    print('{:<9} {:>10} {:>9} {:>12} {:>10} {:>10} {:>10} {:>8} {:>8} {:>8} {:>12} {:>12}'.format(
+        'policy', 'completed', 'failed', 'makespan s', 'wait p50', 'wait p90', 'wait p99', 'mem %', 'cores %', 'passes', 'pass avg ms', 'pass max ms'))
+    for report in reports:
+        print('{:<9} {:>10} {:>9} {:>12.0f} {:>10.0f} {:>10.0f} {:>10.0f} {:>8.1f} {:>8.1f} {:>8} {:>12.2f} {:>12.2f}'.format(
+            report['policy'], report['completed'], report['failed'] + report['never_started'], report['makespan'], report['wait_p50'],
+            report['wait_p90'], report['wait_p99'], report['memory_utilization'] * 100, report['cores_utilization'] * 100,
+            report['scheduler_passes'], report['pass_cpu_avg'] * 1000, report['pass_cpu_max'] * 1000))
+
+
+def main():
+    """Entrypoint of the trace replay script."""
+    argparser = argparse.ArgumentParser(description='Replay a workload trace against the Zoe elastic scheduler, on a simulated cluster')
+    argparser.add_argument('trace', help='trace file, one JSON object per line')
+    argparser.add_argument('--policy', nargs='+', choices=['FIFO', 'SIZE', 'BACKFILL', 'FAIRSHARE'], default=['FIFO', 'SIZE'], help='scheduler policies to compare')
+    argparser.add_argument('--placement-strategy', choices=sorted(PLACEMENT_STRATEGIES.keys()), default='spread', help='placement strategy')
+    argparser.add_argument('--nodes', type=int, default=10, help='number of nodes in the simulated cluster')
+    argparser.add_argument('--node-cores', type=int, default=16, help='cores of each node')
+    argparser.add_argument('--node-memory', type=int, default=64, help='memory of each node, in GiB')
+    argparser.add_argument('--node-labels', default='', help='comma-separated labels assigned to all nodes')
+    argparser.add_argument('--preemption', action='store_true', help='enable the preemption of elastic services')
+    argparser.add_argument('--preemption-budget', type=int, default=8, help='elastic services that can be preempted in one scheduler pass')
+    argparser.add_argument('--json', action='store_true', help='print the full reports in JSON')
+    argparser.add_argument('--debug', action='store_true', help='enable debug output')
+    args = argparser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    register_backend('Simulated', SimulatedBackend)
+
+    reports = []
+    try:
+        trace = load_trace(args.trace)
+        validated = set()
+        for policy in args.policy:
+            config.load_configuration(simulation_configuration(policy, args.placement_strategy, args.node_memory, args.node_cores, args.preemption, args.preemption_budget))
+            for entry in trace:
+                if id(entry['description']) not in validated:
+                    app_validate(entry['description'])
+                    validated.add(id(entry['description']))
+            reports.append(TraceReplay(trace, _build_cluster(args, trace), policy).run())
+    except (ZoeException, ZoeLibException, InvalidApplicationDescription) as e:
+        print(str(e))
+        return 1
+
+    if args.json:
+        print(json.dumps(reports, indent=4))
+    else:
+        _print_reports(reports)
+    return 0
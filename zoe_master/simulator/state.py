@@ -0,0 +1,163 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-memory replacement for the SQL state, used by the offline scheduler simulator."""
+
+import contextlib
+import datetime
+import itertools
+import operator
+from collections import OrderedDict, defaultdict
+
+from zoe_lib.state import Execution, Service, Port
+from zoe_lib.state.base import BaseRecord
+
+
+class MemoryTable:
+    """
+    A table whose records are kept only in memory.
+
+    Each ID maps to a single record object, selects return the stored objects and updates are applied to them, like
+    the state cache does in the master. Records are indexed by ID and by parent ID, other filters scan the table.
+    """
+    record_class = BaseRecord
+    parent_key = None
+
+    def __init__(self, state):
+        self.state = state
+        self.records = OrderedDict()  # ID -> record
+        self.children = defaultdict(list)  # parent ID -> records
+        self._next_id = itertools.count(1)
+
+    def _insert(self, row):
+        row['id'] = next(self._next_id)
+        record = self.record_class(row, self.state)
+        self.records[row['id']] = record
+        if self.parent_key is not None:
+            self.children[row[self.parent_key]].append(record)
+        return row['id']
+
+    def update(self, record_id, **kwargs):
+        """Update the state of an existing record."""
+        record = self.records.get(record_id)
+        if record is not None:
+            record.apply_update(kwargs)
+
+    def delete(self, record_id):
+        """Delete a record."""
+        record = self.records.pop(record_id, None)
+        if record is not None and self.parent_key is not None:
+            self.children[getattr(record, self.parent_key)].remove(record)
+
+    def select(self, only_one=False, limit=-1, **kwargs):
+        """Return the records whose attributes match all the filters."""
+        if 'id' in kwargs:
+            candidates = [self.records[kwargs['id']]] if kwargs['id'] in self.records else []
+        elif self.parent_key is not None and self.parent_key in kwargs:
+            candidates = self.children.get(kwargs[self.parent_key], [])
+        else:
+            candidates = self.records.values()
+        ret = [record for record in candidates if all(getattr(record, key) == value for key, value in kwargs.items())]
+        if only_one:
+            return ret[0] if len(ret) > 0 else None
+        if limit > 0:
+            ret = ret[:limit]
+        return ret
+
+    def select_by_parents(self, parent_ids):
+        """Return the records belonging to any of the given parents."""
+        return [record for parent_id in parent_ids for record in self.children.get(parent_id, [])]
+
+
+class MemoryExecutionTable(MemoryTable):
+    """Executions."""
+    record_class = Execution
+    time_filters = {
+        'earlier_than_submit': ('time_submit', operator.le),
+        'earlier_than_start': ('time_start', operator.le),
+        'earlier_than_end': ('time_end', operator.le),
+        'later_than_submit': ('time_submit', operator.ge),
+        'later_than_start': ('time_start', operator.ge),
+        'later_than_end': ('time_end', operator.ge)
+    }
+
+    def select(self, only_one=False, limit=-1, **kwargs):
+        """Like the SQL table, time filters take a number of seconds since the epoch."""
+        time_filters = [(self.time_filters[key], datetime.datetime.utcfromtimestamp(kwargs.pop(key))) for key in list(kwargs) if key in self.time_filters]
+        if len(time_filters) == 0:
+            return super().select(only_one, limit, **kwargs)
+        ret = [record for record in super().select(**kwargs)
+               if all(getattr(record, field) is not None and compare(getattr(record, field), value) for (field, compare), value in time_filters)]
+        if only_one:
+            return ret[0] if len(ret) > 0 else None
+        if limit > 0:
+            ret = ret[:limit]
+        return ret
+
+    def insert(self, name, user_id, description):
+        """Create a new execution in the state."""
+        return self._insert({
+            'name': name, 'user_id': user_id, 'description': description, 'status': Execution.SUBMIT_STATUS,
+            'execution_manager_id': None, 'time_submit': datetime.datetime.utcnow(), 'time_start': None, 'time_end': None,
+            'error_message': None
+        })
+
+
+class MemoryServiceTable(MemoryTable):
+    """Services."""
+    record_class = Service
+    parent_key = 'execution_id'
+
+    def insert_many(self, execution_id, services):
+        """Adds many services of the same execution, services is a list of (name, service_group, description, is_essential) tuples."""
+        return [self._insert({
+            'name': name, 'status': Service.CREATED_STATUS, 'error_message': None, 'execution_id': execution_id,
+            'description': description, 'service_group': service_group, 'backend_id': None,
+            'backend_status': Service.BACKEND_UNDEFINED_STATUS, 'backend_host': None, 'restart_count': 0, 'ip_address': None,
+            'essential': is_essential
+        }) for name, service_group, description, is_essential in services]
+
+
+class MemoryPortTable(MemoryTable):
+    """Ports."""
+    record_class = Port
+    parent_key = 'service_id'
+
+    def insert_many(self, ports):
+        """Adds many ports, ports is a list of (service_id, internal_name, description) tuples."""
+        return [self._insert({
+            'service_id': service_id, 'internal_name': internal_name, 'external_ip': None, 'external_port': None,
+            'description': description
+        }) for service_id, internal_name, description in ports]
+
+
+class MemoryStateManager:
+    """Keeps the Zoe state in memory, exposing the parts of the SQLManager interface used by the master."""
+    def __init__(self):
+        self.executions = MemoryExecutionTable(self)
+        self.services = MemoryServiceTable(self)
+        self.ports = MemoryPortTable(self)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Writes are applied immediately, there is nothing to group."""
+        yield
+
+    def in_transaction(self) -> bool:
+        """Never in a transaction."""
+        return False
+
+    def commit(self):
+        """Nothing to commit."""
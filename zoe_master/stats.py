@@ -44,6 +44,7 @@ class NodeStats(Stats):
         self.labels = []
         self.status = 'offline'
         self.service_stats = {}
+        self.images = None  # frozenset of the image names available on the node, None if the back-end does not track them
 
     def serialize(self):
         """Convert the object into a dict."""
@@ -66,14 +67,21 @@ class NodeStats(Stats):
 
 
 class ClusterStats(Stats):
-    """Stats related to the whole cluster."""
+    """
+    Stats related to the whole cluster.
+
+    Once published by the StatsManager a ClusterStats object and its nodes are never modified, new data is published in new
+    objects with a higher version number.
+    """
     def __init__(self):
         super().__init__()
         self.nodes = []
+        self.version = 0
 
     def serialize(self):
         """Convert the object into a dict."""
         return {
+            'version': self.version,
             'container_count': self.container_count,
             'memory_total': self.memory_total,
             'cores_total': self.cores_total,
@@ -0,0 +1,92 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the EASY backfilling of the BACKFILL policy."""
+
+import pytest
+
+from zoe_lib.config import load_configuration
+from zoe_lib.state import Execution
+from zoe_lib.tests.config_mock import zoe_configuration  # pylint: disable=unused-import
+from zoe_master.scheduler.elastic_scheduler import ExecutionProgress, ZoeElasticScheduler
+from zoe_master.simulator.state import MemoryStateManager
+from zoe_master.tests.scheduler_mock import GiB, make_execution, make_platform
+
+
+class TestBackfill:
+    """Reservation of the first execution that does not fit and choice of the executions that can be backfilled."""
+
+    @pytest.fixture(autouse=True)
+    def mock_config(self, zoe_configuration):  # pylint: disable=redefined-outer-name
+        """Fixture for mock config method."""
+        load_configuration(zoe_configuration)
+
+    @pytest.fixture
+    def busy_platform(self):
+        """
+        A scheduler and a platform snapshot with two nodes with 8 GiB each, where two executions are running and 4 GiB are free.
+
+        The first execution uses 6 GiB and ends in 60 seconds, the second one 6 GiB and ends in 300 seconds.
+        """
+        now = 1000000
+        state = MemoryStateManager()
+        scheduler = ZoeElasticScheduler(state, 'BACKFILL', None, threaded=False, clock=lambda: now)
+        platform = make_platform([('node0', 8, 8, ()), ('node1', 8, 8, ())])
+        for size, elapsed in [(100, 40), (300, 0)]:
+            execution = make_execution(state, [(3, 1, True), (3, 1, True)], size=size)
+            execution.apply_update({'status': Execution.RUNNING_STATUS})
+            assert platform.allocate_essential(execution)
+            scheduler.additional_exec_state[execution.id] = ExecutionProgress(execution)
+            scheduler.additional_exec_state[execution.id].start_time = now - elapsed
+            scheduler.queue_running.append(execution)
+        return scheduler, platform
+
+    @staticmethod
+    def _queued(scheduler, services, size):
+        execution = make_execution(scheduler.state, services, size=size)
+        scheduler.additional_exec_state[execution.id] = ExecutionProgress(execution)
+        return execution
+
+    def test_reservation(self, busy_platform):
+        """The reserved execution starts when the first running execution ends, 2 GiB will be left over."""
+        scheduler, platform = busy_platform
+        reserved = self._queued(scheduler, [(4, 1, True), (4, 1, True)], 1000)
+        assert scheduler._backfill_reservation(reserved, platform, []) == (60, 2 * GiB)  # pylint: disable=protected-access
+
+    def test_reservation_never_fits(self, busy_platform):
+        """An execution larger than the platform does not hold back the others."""
+        scheduler, platform = busy_platform
+        reserved = self._queued(scheduler, [(10, 1, True), (10, 1, True)], 1000)
+        assert scheduler._backfill_reservation(reserved, platform, []) == (float('inf'), 0)  # pylint: disable=protected-access
+
+    def test_ends_in_time(self, busy_platform):
+        """An execution expected to end before the shadow time can use any free memory."""
+        scheduler, platform = busy_platform
+        job = self._queued(scheduler, [(1, 1, True), (1, 1, True)], 50)
+        assert scheduler._try_backfill(job, platform, 60, 0) == 0  # pylint: disable=protected-access
+        placements = platform.get_service_allocation()
+        assert all(service.id in placements for service in job.services)
+
+    def test_spare_memory(self, busy_platform):
+        """Longer executions are backfilled only in the memory the reserved execution does not need, without their elastic services."""
+        scheduler, platform = busy_platform
+        too_large = self._queued(scheduler, [(1, 1, True), (1, 1, True)], 1000)
+        assert scheduler._try_backfill(too_large, platform, 60, GiB) is None  # pylint: disable=protected-access
+        assert platform.get_service_allocation().keys().isdisjoint(service.id for service in too_large.services)
+        job = self._queued(scheduler, [(1, 1, True), (1, 1, False)], 1000)
+        assert scheduler._try_backfill(job, platform, 60, GiB) == GiB  # pylint: disable=protected-access
+        placements = platform.get_service_allocation()
+        assert job.essential_services[0].id in placements
+        assert job.elastic_services[0].id not in placements
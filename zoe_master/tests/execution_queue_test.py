@@ -0,0 +1,145 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the execution queues of the elastic scheduler."""
+
+import pytest
+
+from zoe_master.scheduler.execution_queue import ExecutionQueue, FairShareQueue
+
+
+class MockExecution:
+    """The attributes of an execution used by the queues."""
+    def __init__(self, execution_id, size=0, user_id='user'):
+        self.id = execution_id
+        self.size = size
+        self.user_id = user_id
+
+
+def _ids(executions):
+    return [execution.id for execution in executions]
+
+
+class TestExecutionQueue:
+    """Ordering and indexed operations of the FIFO and SIZE queues."""
+
+    def test_fifo(self):
+        """Executions come out in arrival order, the ones put back go first."""
+        queue = ExecutionQueue('FIFO')
+        executions = [MockExecution(execution_id, size=10 - execution_id) for execution_id in range(5)]
+        for execution in executions:
+            queue.push(execution)
+        assert [queue.pop() for _ in range(3)] == executions[:3]
+        queue.push_front(executions[0])
+        queue.push_front_all([executions[1], executions[2]])
+        assert _ids(queue.ordered()) == [1, 2, 0, 3, 4]
+        assert _ids(queue.pop_all()) == [1, 2, 0, 3, 4]
+        assert len(queue) == 0
+        with pytest.raises(IndexError):
+            queue.pop()
+
+    def test_size(self):
+        """Smaller executions go first, executions with the same size in arrival order."""
+        queue = ExecutionQueue('SIZE')
+        sizes = [5, 3, 5, 1, 3]
+        executions = [MockExecution(execution_id, size) for execution_id, size in enumerate(sizes)]
+        for execution in executions:
+            queue.push(execution)
+        assert _ids(queue.ordered()) == [3, 1, 4, 0, 2]
+        executions[2].size = 0
+        queue.update(executions[2])
+        assert _ids(queue.ordered()) == [2, 3, 1, 4, 0]
+        queue.refresh(lambda execution: 10 - execution.id)
+        assert _ids(queue.ordered()) == [4, 3, 2, 1, 0]
+
+    def test_remove(self):
+        """Any execution can be removed, the heap stays ordered."""
+        queue = ExecutionQueue('SIZE')
+        executions = [MockExecution(execution_id, size=(execution_id * 7) % 11) for execution_id in range(11)]
+        for execution in executions:
+            queue.push(execution)
+        for execution_id in [0, 5, 10, 3]:
+            queue.remove(executions[execution_id])
+            assert executions[execution_id] not in queue
+        with pytest.raises(ValueError):
+            queue.remove(executions[5])
+        expected = sorted([execution for execution in executions if execution.id not in [0, 5, 10, 3]], key=lambda execution: execution.size)
+        assert _ids([queue.pop() for _ in range(len(queue))]) == _ids(expected)
+
+    def test_refresh_keeps_index(self):
+        """After the heap is rebuilt executions can still be moved and removed, reading the order does not change the queue."""
+        queue = ExecutionQueue('SIZE')
+        executions = [MockExecution(execution_id, size=execution_id) for execution_id in range(9)]
+        for execution in executions:
+            queue.push(execution)
+        queue.refresh(lambda execution: (execution.id * 4) % 9)
+        assert _ids(queue.ordered()) == [0, 7, 5, 3, 1, 8, 6, 4, 2]
+        assert len(queue) == 9
+        queue.remove(executions[3])
+        executions[2].size = 0
+        queue.update(executions[2])
+        assert _ids(queue.pop_all()) == [0, 2, 7, 5, 1, 8, 6, 4]
+
+    def test_duplicates(self):
+        """An execution cannot be queued twice."""
+        queue = ExecutionQueue('FIFO')
+        execution = MockExecution(1)
+        queue.push(execution)
+        with pytest.raises(ValueError):
+            queue.push(execution)
+        with pytest.raises(ValueError):
+            queue.push_front_all([execution])
+
+
+class TestFairShareQueue:
+    """Ordering of the FAIRSHARE queue."""
+
+    def test_users_interleaved(self):
+        """The user with the lowest usage goes first, and is charged the expected usage of each execution taken."""
+        usages = {'alice': 0, 'bob': 15}
+        queue = FairShareQueue(usages.get, lambda execution: 10)
+        for execution in [MockExecution(1, user_id='alice'), MockExecution(2, user_id='alice'), MockExecution(3, user_id='bob'), MockExecution(4, user_id='alice')]:
+            queue.push(execution)
+        assert len(queue) == 4
+        assert _ids(queue.ordered()) == [1, 2, 3, 4]
+        assert _ids([queue.pop() for _ in range(4)]) == [1, 2, 3, 4]
+        assert len(queue) == 0
+
+    def test_refresh_and_remove(self):
+        """refresh() reorders the users with their current usage, removing the last execution of a user drops the user."""
+        usages = {'alice': 0, 'bob': 5}
+        queue = FairShareQueue(usages.get, lambda execution: 0)
+        alice = MockExecution(1, user_id='alice')
+        bob = MockExecution(2, user_id='bob')
+        queue.push(alice)
+        queue.push(bob)
+        assert _ids(queue.ordered()) == [1, 2]
+        usages['alice'] = 10
+        queue.refresh(lambda execution: execution.size)
+        assert _ids(queue.ordered()) == [2, 1]
+        queue.remove(bob)
+        assert bob not in queue
+        assert _ids(queue.pop_all()) == [1]
+        with pytest.raises(ValueError):
+            queue.remove(bob)
+
+    def test_push_front(self):
+        """Executions put back go ahead of the other executions of the same user."""
+        queue = FairShareQueue(lambda user_id: 0, lambda execution: 1)
+        first = MockExecution(1)
+        second = MockExecution(2)
+        queue.push(second)
+        queue.push_front_all([first])
+        assert _ids(queue.pop_all()) == [1, 2]
@@ -0,0 +1,68 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the remaining size of the executions queued by the elastic scheduler."""
+
+import json
+
+from zoe_lib.config import load_configuration
+from zoe_master.backends.interface import register_backend
+from zoe_master.backends.simulated.backend import SimulatedBackend, SimulatedCluster, set_cluster
+from zoe_master.preprocessing import execution_submit
+from zoe_master.scheduler.elastic_scheduler import ZoeElasticScheduler
+from zoe_master.simulator.replay import SimulatedStats, simulation_configuration
+from zoe_master.simulator.state import MemoryStateManager
+from zoe_master.tests.scheduler_mock import GiB
+
+
+class MockClock:
+    """A clock that moves only when told to."""
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestExecutionSize:
+    """Progress of executions that run with only some of their services."""
+
+    def test_progress(self):
+        """An execution with 3 of its 4 services running shrinks at 3/4 of the rate it would with all of them."""
+        with open('contrib/zapp-shop-sample/zapp-spark/spark-jupyter.json', 'r') as zapp_file:
+            description = json.load(zapp_file)
+        cluster = SimulatedCluster(set(service['image'] for service in description['services']))
+        cluster.add_node('node0', 16, 32 * GiB)  # room for the essential services, not for the second worker
+        set_cluster(cluster)
+        register_backend('Simulated', SimulatedBackend)
+        load_configuration(simulation_configuration('SIZE', 'spread', 64, 16))
+        state = MemoryStateManager()
+        clock = MockClock()
+        scheduler = ZoeElasticScheduler(state, 'SIZE', SimulatedStats(), threaded=False, clock=clock)
+
+        execution = state.executions.records[state.executions.insert('spark', 'user', description)]
+        execution_submit(state, scheduler, execution)
+        scheduler.schedule()
+        assert execution.is_running
+        assert execution.running_services_count == 3
+        assert execution.size == 512 * 4
+
+        clock.now = 128
+        scheduler.schedule()
+        assert execution.size == (1 - 128 * 3 / (4 * 512)) * 512 * 4
+        clock.now = 256
+        scheduler.schedule()
+        assert execution.size == (1 - 256 * 3 / (4 * 512)) * 512 * 4
+        scheduler.quit()
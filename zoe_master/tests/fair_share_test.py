@@ -0,0 +1,103 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the decayed usage of the FAIRSHARE policy."""
+
+import datetime
+import math
+
+import pytest
+
+from zoe_lib.state import Execution
+from zoe_master.scheduler.fair_share import FairShareUsage, HISTORY_HALF_LIVES
+from zoe_master.simulator.state import MemoryStateManager
+from zoe_master.tests.scheduler_mock import GiB, make_execution
+
+HALF_LIFE = 3600
+
+
+class MockClock:
+    """A clock that moves only when told to."""
+    def __init__(self):
+        self.now = 1000000
+
+    def __call__(self):
+        return self.now
+
+
+class MockExecution:
+    """The attributes of an execution used to account its usage."""
+    def __init__(self, execution_id, user_id):
+        self.id = execution_id
+        self.user_id = user_id
+
+
+class TestFairShareUsage:
+    """Exponential decay of the usage."""
+
+    def test_decay(self):
+        """Usage grows with the reserved memory while the execution runs and halves every half-life after it ends."""
+        clock = MockClock()
+        fair_share = FairShareUsage(HALF_LIFE, {}, clock)
+        execution = MockExecution(1, 'alice')
+        fair_share.set_reservation(execution, 100)
+        assert fair_share.usage('alice') == 0
+        clock.now += HALF_LIFE
+        expected = 100 * HALF_LIFE / math.log(2) * (1 - 0.5)
+        assert fair_share.usage('alice') == pytest.approx(expected)
+        fair_share.set_reservation(execution, 0)
+        clock.now += HALF_LIFE
+        assert fair_share.usage('alice') == pytest.approx(expected / 2)
+        clock.now += 2 * HALF_LIFE
+        assert fair_share.usages() == {'alice': pytest.approx(expected / 8)}
+
+    def test_update_points(self):
+        """The usage does not depend on how often it is computed."""
+        clock = MockClock()
+        sampled = FairShareUsage(HALF_LIFE, {}, clock)
+        unsampled = FairShareUsage(HALF_LIFE, {}, clock)
+        for fair_share in [sampled, unsampled]:
+            fair_share.set_reservation(MockExecution(1, 'alice'), 100)
+        for step_ in range(10):
+            clock.now += HALF_LIFE / 4
+            sampled.usage('alice')
+        assert sampled.usage('alice') == pytest.approx(unsampled.usage('alice'))
+
+    def test_weights(self):
+        """Usages are divided by the weight of the user."""
+        clock = MockClock()
+        fair_share = FairShareUsage(HALF_LIFE, {'alice': 2}, clock)
+        fair_share.set_reservation(MockExecution(1, 'alice'), 100)
+        fair_share.set_reservation(MockExecution(2, 'bob'), 100)
+        clock.now += HALF_LIFE
+        assert fair_share.weight('bob') == 1
+        assert fair_share.usage('alice') == pytest.approx(fair_share.usage('bob') / 2)
+
+    def test_load(self):
+        """Past usage is loaded from the executions that ended recently and the running ones."""
+        state = MemoryStateManager()
+        utc_now = datetime.datetime.utcnow()
+        recent = make_execution(state, [(1, 1, True)], user_id='alice')
+        recent.apply_update({'status': Execution.TERMINATED_STATUS, 'time_start': utc_now - datetime.timedelta(seconds=2 * HALF_LIFE), 'time_end': utc_now - datetime.timedelta(seconds=HALF_LIFE)})
+        old = make_execution(state, [(1, 1, True)], user_id='bob')
+        old.apply_update({'status': Execution.TERMINATED_STATUS, 'time_start': utc_now - datetime.timedelta(seconds=(HISTORY_HALF_LIVES + 2) * HALF_LIFE), 'time_end': utc_now - datetime.timedelta(seconds=(HISTORY_HALF_LIVES + 1) * HALF_LIFE)})
+        running = make_execution(state, [(2, 1, True)], user_id='carol')
+        running.apply_update({'status': Execution.RUNNING_STATUS, 'time_start': utc_now - datetime.timedelta(seconds=HALF_LIFE)})
+        fair_share = FairShareUsage(HALF_LIFE, {}, MockClock())
+        fair_share.load(state)
+        usages = fair_share.usages()
+        assert 'bob' not in usages
+        assert usages['alice'] == pytest.approx(GiB * HALF_LIFE / math.log(2) * (0.5 - 0.25), rel=1e-3)
+        assert usages['carol'] == pytest.approx(2 * GiB * HALF_LIFE / math.log(2) * (1 - 0.5), rel=1e-3)
@@ -0,0 +1,93 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the placement strategies of the elastic scheduler."""
+
+from zoe_master.simulator.state import MemoryStateManager
+from zoe_master.tests.scheduler_mock import make_execution, make_platform
+
+
+def _placements(platform, execution):
+    """The node of each service of execution, in service order."""
+    placements = platform.get_service_allocation()
+    return [placements.get(service.id) for service in execution.services]
+
+
+class TestPlacementStrategies:
+    """Node choice of each strategy, also after the free resources of the nodes have changed."""
+
+    def test_spread(self):
+        """Services go to the node with the fewest containers, the first node in platform order on ties."""
+        state = MemoryStateManager()
+        platform = make_platform([('node0', 16, 8, ()), ('node1', 16, 8, ()), ('node2', 16, 8, ())], 'spread')
+        first = make_execution(state, [(1, 1, True)] * 4)
+        assert platform.allocate_essential(first)
+        assert _placements(platform, first) == ['node0', 'node1', 'node2', 'node0']
+        platform.deallocate_essential(first)
+        second = make_execution(state, [(1, 1, True)] * 2)
+        assert platform.allocate_essential(second)
+        assert _placements(platform, second) == ['node0', 'node1']
+
+    def test_best_fit(self):
+        """Services go to the node with the least free memory that can hold them."""
+        state = MemoryStateManager()
+        platform = make_platform([('large', 16, 8, ()), ('small', 4, 8, ()), ('medium', 8, 8, ())], 'best-fit')
+        execution = make_execution(state, [(3, 1, True), (5, 1, True), (2, 1, True)])
+        assert platform.allocate_essential(execution)
+        assert _placements(platform, execution) == ['small', 'medium', 'medium']
+
+    def test_worst_fit(self):
+        """Services go to the node with the most free memory."""
+        state = MemoryStateManager()
+        platform = make_platform([('small', 4, 8, ()), ('large', 16, 8, ()), ('medium', 8, 8, ())], 'worst-fit')
+        execution = make_execution(state, [(10, 1, True), (3, 1, True), (3, 1, True)])
+        assert platform.allocate_essential(execution)
+        assert _placements(platform, execution) == ['large', 'medium', 'large']
+
+    def test_first_fit_decreasing(self):
+        """The largest services are placed first, each on the first node where it fits."""
+        state = MemoryStateManager()
+        platform = make_platform([('node0', 8, 8, ()), ('node1', 8, 8, ())], 'first-fit-decreasing')
+        execution = make_execution(state, [(1, 1, True), (6, 1, True), (3, 1, True)])
+        assert platform.allocate_essential(execution)
+        assert _placements(platform, execution) == ['node0', 'node0', 'node1']
+
+    def test_dot_product(self):
+        """Memory heavy services go to the nodes with more free memory, core heavy services to the nodes with more free cores."""
+        state = MemoryStateManager()
+        platform = make_platform([('memory', 32, 4, ()), ('cores', 8, 32, ())], 'dot-product')
+        execution = make_execution(state, [(4, 1, True), (1, 8, True)])
+        assert platform.allocate_essential(execution)
+        assert _placements(platform, execution) == ['memory', 'cores']
+
+    def test_labels(self):
+        """Only the nodes having all the labels of a service are eligible, with every strategy."""
+        for strategy in ['spread', 'best-fit', 'worst-fit', 'first-fit-decreasing', 'dot-product']:
+            state = MemoryStateManager()
+            platform = make_platform([('plain', 64, 32, ()), ('gpu', 8, 8, ('gpu',))], strategy)
+            execution = make_execution(state, [(2, 1, True), (2, 1, True)], labels=('gpu',))
+            assert platform.allocate_essential(execution)
+            assert _placements(platform, execution) == ['gpu', 'gpu']
+
+    def test_does_not_fit(self):
+        """When one essential service does not fit, the ones already placed are removed."""
+        for strategy in ['spread', 'best-fit', 'worst-fit', 'first-fit-decreasing', 'dot-product']:
+            state = MemoryStateManager()
+            platform = make_platform([('node0', 8, 8, ()), ('node1', 8, 8, ())], strategy)
+            execution = make_execution(state, [(4, 1, True), (4, 1, True), (12, 1, True)])
+            free_memory = platform.aggregated_free_memory()
+            assert not platform.allocate_essential(execution)
+            assert len(platform.get_service_allocation()) == 0
+            assert platform.aggregated_free_memory() == free_memory
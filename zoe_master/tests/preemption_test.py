@@ -0,0 +1,128 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the preemption of elastic services by the elastic scheduler."""
+
+import pytest
+
+from zoe_lib.config import load_configuration
+from zoe_lib.state import Execution, Service
+from zoe_lib.tests.config_mock import zoe_configuration  # pylint: disable=unused-import
+from zoe_master.backends.base import BaseBackend
+from zoe_master.backends.interface import register_backend
+from zoe_master.scheduler.elastic_scheduler import ExecutionProgress, ZoeElasticScheduler
+from zoe_master.simulator.state import MemoryStateManager
+from zoe_master.tests.scheduler_mock import make_execution, make_platform
+
+
+class StubBackend(BaseBackend):  # pylint: disable=abstract-method
+    """A back-end that only records the services it terminates."""
+    terminated = []
+
+    def terminate_service(self, service):
+        self.terminated.append(service.id)
+
+
+class TestPreemption:
+    """Choice of the elastic services to preempt and requeue of the executions that lose them."""
+
+    @pytest.fixture(autouse=True)
+    def mock_config(self, zoe_configuration):  # pylint: disable=redefined-outer-name
+        """Fixture for mock config method."""
+        zoe_configuration.scheduler_preemption = True
+        zoe_configuration.backend = 'Stub'
+        register_backend('Stub', StubBackend)
+        load_configuration(zoe_configuration)
+
+    @pytest.fixture
+    def full_platform(self):
+        """
+        A SIZE scheduler and a platform snapshot with one node with 8 GiB, all used by two running executions.
+
+        Each execution has one essential service with 2 GiB and two elastic services with 1 GiB, the first one has size 100
+        and the second one size 500.
+        """
+        state = MemoryStateManager()
+        scheduler = ZoeElasticScheduler(state, 'SIZE', None, threaded=False)
+        platform = make_platform([('node0', 8, 8, ())])
+        for size in [100, 500]:
+            execution = make_execution(state, [(2, 1, True), (1, 1, False), (1, 1, False)], size=size)
+            execution.apply_update({'status': Execution.RUNNING_STATUS})
+            for service in execution.services:
+                service.apply_update({'status': Service.ACTIVE_STATUS, 'backend_status': Service.BACKEND_START_STATUS, 'backend_host': 'node0'})
+                platform.restore(service)  # the service is running on the node
+            scheduler.additional_exec_state[execution.id] = ExecutionProgress(execution)
+            scheduler.queue_running.append(execution)
+        return scheduler, platform
+
+    @staticmethod
+    def _queued(scheduler, size):
+        execution = make_execution(scheduler.state, [(1, 1, True)], size=size)
+        scheduler.additional_exec_state[execution.id] = ExecutionProgress(execution)
+        return execution
+
+    def test_lowest_priority_first(self, full_platform):
+        """The elastic services of the execution with the lowest priority are preempted first, only as many as needed."""
+        scheduler, platform = full_platform
+        small, large = scheduler.queue_running
+        job = self._queued(scheduler, 50)
+        released = scheduler._simulate_preemption(job, platform, [], 8)  # pylint: disable=protected-access
+        assert released == list(reversed(large.elastic_services))
+        assert all(service.id in platform.get_service_allocation() for service in job.services)
+        assert all(service not in released for service in small.services)
+
+    def test_only_lower_priority(self, full_platform):
+        """Executions with a higher priority keep their services, the snapshot is left unchanged if the job does not fit."""
+        scheduler, platform = full_platform
+        job = self._queued(scheduler, 1000)
+        assert scheduler._simulate_preemption(job, platform, [], 8) == []  # pylint: disable=protected-access
+        job = self._queued(scheduler, 50)
+        assert scheduler._simulate_preemption(job, platform, [], 1) == []  # pylint: disable=protected-access
+        assert platform.free_memory == 0
+
+    def test_requeue(self, full_platform):
+        """The execution that loses its elastic services goes back to the queue."""
+        scheduler, platform = full_platform
+        large = scheduler.queue_running[1]
+        job = self._queued(scheduler, 50)
+        released = scheduler._simulate_preemption(job, platform, [], 8)  # pylint: disable=protected-access
+        StubBackend.terminated = []
+        assert scheduler._preempt(released)  # pylint: disable=protected-access
+        assert large not in scheduler.queue_running
+        assert large in scheduler.queue
+        assert sorted(StubBackend.terminated) == sorted(service.id for service in released)
+        assert all(service.status == Service.INACTIVE_STATUS for service in released)
+        assert scheduler.preempted_services == 2
+
+    def test_abort_if_terminating(self, full_platform):
+        """Nothing is preempted while the execution that would lose its services is being terminated."""
+        scheduler, platform = full_platform
+        large = scheduler.queue_running[1]
+        job = self._queued(scheduler, 50)
+        released = scheduler._simulate_preemption(job, platform, [], 8)  # pylint: disable=protected-access
+        large.termination_lock.acquire()
+        try:
+            assert not scheduler._preempt(released)  # pylint: disable=protected-access
+        finally:
+            large.termination_lock.release()
+        assert large in scheduler.queue_running
+        assert large not in scheduler.queue
+        assert all(service.status == Service.ACTIVE_STATUS for service in released)
+
+    def test_disabled_by_arrival_order(self):
+        """With the FIFO and BACKFILL policies no queued execution has priority over a running one."""
+        for policy in ['FIFO', 'BACKFILL']:
+            assert not ZoeElasticScheduler(MemoryStateManager(), policy, None, threaded=False).preemption
+        assert ZoeElasticScheduler(MemoryStateManager(), 'SIZE', None, threaded=False).preemption
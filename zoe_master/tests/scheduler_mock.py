@@ -0,0 +1,46 @@
+# Copyright (c) 2017, Daniele Venzano
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Simulated platforms and in-memory executions for the scheduler unit tests."""
+
+from zoe_master.scheduler.simulated_platform import SimulatedPlatform
+from zoe_master.stats import ClusterStats, NodeStats
+
+GiB = 1024 ** 3
+
+
+def make_platform(nodes, placement_strategy='spread') -> SimulatedPlatform:
+    """A platform snapshot with no services running, nodes is a list of (name, memory in GiB, cores, labels) tuples."""
+    platform_status = ClusterStats()
+    for name, memory, cores, labels in nodes:
+        node = NodeStats(name)
+        node.status = 'online'
+        node.memory_total = memory * GiB
+        node.cores_total = cores
+        node.labels = set(labels)
+        platform_status.nodes.append(node)
+    return SimulatedPlatform(platform_status, placement_strategy)
+
+
+def make_execution(state, services, user_id='user', size=100, labels=()):
+    """Add an execution to an in-memory state, services is a list of (memory in GiB, cores, essential) tuples."""
+    description = {'name': 'test', 'size': size, 'services': []}
+    execution_id = state.executions.insert('test', user_id, description)
+    service_description = []
+    for count, (memory, cores, essential) in enumerate(services):
+        resources = {'memory': {'min': memory * GiB, 'max': memory * GiB}, 'cores': {'min': cores, 'max': cores}}
+        service_description.append(('service{}'.format(count), 'service', {'image': 'test', 'resources': resources, 'labels': list(labels)}, essential))
+    state.services.insert_many(execution_id, service_description)
+    return state.executions.records[execution_id]